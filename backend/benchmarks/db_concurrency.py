@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter
+
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base, EngineProfile, make_engine
+from backend.models import MaintenanceEvent, User, UserVehicle
+from backend.schemas import MaintenanceInput, TripCalcRequest, VehicleInput
+from backend.services.calc import compute_maintenance, load_calc_context
+from backend.services.maintenance_aggregates import apply_maintenance_event
+
+VEHICLES = 20
+
+
+@dataclass
+class BenchResult:
+    profile: str
+    reads: int = 0
+    writes: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    read_ms: list[float] = field(default_factory=list)
+
+    def summary(self) -> str:
+        p95 = quantiles(self.read_ms, n=20)[-1] if len(self.read_ms) > 1 else 0.0
+        worst = max(self.read_ms, default=0.0)
+        return (
+            f"{self.profile:>6}: {self.reads / self.seconds:8.0f} reads/s  "
+            f"{self.writes / self.seconds:6.0f} writes/s  read p95 {p95:6.2f} ms  max {worst:7.2f} ms  "
+            f"{self.errors} locked errors"
+        )
+
+
+def _seed(engine: Engine) -> None:
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        user = User(name="bench")
+        session.add(user)
+        session.flush()
+        session.add_all(
+            UserVehicle(user_id=user.id, powertrain_type="gasoline", segment="compact") for _ in range(VEHICLES)
+        )
+        session.commit()
+
+
+def _write_loop(factory: sessionmaker, index: int, deadline: float) -> tuple[int, int, list[float]]:
+    # Mismo trabajo que POST /api/maintenance-events: alta + agregado + commit.
+    done = errors = 0
+    while perf_counter() < deadline:
+        try:
+            with factory() as session:
+                event = MaintenanceEvent(
+                    vehicle_id=1 + index % VEHICLES,
+                    category="service",
+                    event_date=date.today(),
+                    odometer_km=10000.0,
+                    cost_eur=120.0,
+                )
+                session.add(event)
+                session.flush()
+                apply_maintenance_event(session, event)
+                session.commit()
+            done += 1
+        except OperationalError:
+            errors += 1
+    return done, errors, []
+
+
+def _read_loop(factory: sessionmaker, index: int, deadline: float) -> tuple[int, int, list[float]]:
+    # Lectura de POST /api/calc/trip con costes reales de mantenimiento.
+    payload = TripCalcRequest(
+        trip_km=300,
+        trip_days=2,
+        vehicle_id=1 + index % VEHICLES,
+        vehicle=VehicleInput(powertrain_type="gasoline"),
+        maintenance=MaintenanceInput(use_real_costs=True),
+    )
+    done = errors = 0
+    latencies: list[float] = []
+    while (started := perf_counter()) < deadline:
+        try:
+            with factory() as session:
+                compute_maintenance(load_calc_context(session, payload), payload)
+            done += 1
+            latencies.append((perf_counter() - started) * 1000)
+        except OperationalError:
+            errors += 1
+    return done, errors, latencies
+
+
+def _client(
+    kind: str, url: str, profile: EngineProfile | None, index: int, seconds: float
+) -> tuple[str, int, int, list[float]]:
+    """
+    Un proceso por cliente (como varios workers de uvicorn): sin GIL compartido, solo compiten por el fichero.
+    """
+
+    engine = make_engine(url, profile, read_only=kind == "read" and profile is not None)
+    loop = _read_loop if kind == "read" else _write_loop
+    done, errors, latencies = loop(sessionmaker(bind=engine), index, perf_counter() + seconds)
+    engine.dispose()
+    return kind, done, errors, latencies
+
+
+def run_profile(
+    path: Path, name: str, profile: EngineProfile | None, readers: int, writers: int, seconds: float
+) -> BenchResult:
+    url = f"sqlite:///{path}"
+    seed_engine = make_engine(url, profile)
+    _seed(seed_engine)
+    seed_engine.dispose()
+    result = BenchResult(profile=name, seconds=seconds)
+    clients = [("write", index) for index in range(writers)] + [("read", index) for index in range(readers)]
+    with ProcessPoolExecutor(max_workers=len(clients)) as pool:
+        futures = [pool.submit(_client, kind, url, profile, index, seconds) for kind, index in clients]
+        for future in futures:
+            kind, done, errors, latencies = future.result()
+            result.read_ms.extend(latencies)
+            if kind == "read":
+                result.reads += done
+            else:
+                result.writes += done
+            result.errors += errors
+    return result
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent read/write throughput: bare SQLite engine vs tuned profile.")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, profile in (("bare", None), ("tuned", EngineProfile())):
+            result = run_profile(
+                Path(workdir) / f"{name}.db", name, profile, args.readers, args.writers, args.seconds
+            )
+            print(result.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from time import perf_counter
+
+from backend.services.kernel import (
+    ROUTE_MULTIPLIERS,
+    DepreciationRates,
+    InsuranceParams,
+    TripParams,
+    VehicleParams,
+    quote,
+)
+
+RATES = DepreciationRates(base_value_eur=25000, annual_rate=0.12, km_rate=0.02, min_residual_pct=0.2)
+
+
+def make_inputs(count: int, seed: int = 7) -> list[tuple[VehicleParams, TripParams]]:
+    """
+    Mezcla de powertrains, rutas y seguros con valores plausibles (mismo resultado para la misma semilla).
+    """
+
+    rng = random.Random(seed)
+    year = datetime.utcnow().year
+    inputs = []
+    for _ in range(count):
+        powertrain = rng.choice(("gasoline", "diesel", "bev", "phev"))
+        vehicle = VehicleParams(
+            powertrain_type=powertrain,
+            consumption_l_per_100km=rng.uniform(4.0, 9.0) if powertrain != "bev" else None,
+            consumption_kwh_per_100km=rng.uniform(13.0, 22.0) if powertrain in {"bev", "phev"} else None,
+            phev_electric_share=rng.uniform(0.2, 0.8) if powertrain == "phev" else None,
+            market_value_eur=rng.choice((None, rng.uniform(5000, 30000))),
+            year=rng.randint(year - 15, year),
+            current_km=rng.uniform(0, 250000),
+            annual_km=rng.uniform(5000, 30000),
+        )
+        insurance = None
+        if rng.random() < 0.7:
+            insurance = InsuranceParams(annual_cost_eur=rng.uniform(250, 900), per_km=rng.random() < 0.5)
+        trip = TripParams(
+            trip_km=rng.uniform(5, 1200),
+            trip_days=rng.randint(1, 10),
+            year=year,
+            maintenance_per_km=rng.uniform(0.02, 0.08),
+            depreciation=RATES,
+            route_multiplier=ROUTE_MULTIPLIERS[rng.choice(tuple(ROUTE_MULTIPLIERS))],
+            fuel_price_eur_per_l=rng.uniform(1.3, 1.9),
+            electricity_price_eur_per_kwh=rng.uniform(0.1, 0.45),
+            insurance=insurance,
+        )
+        inputs.append((vehicle, trip))
+    return inputs
+
+
+def quote_all(inputs: list[tuple[VehicleParams, TripParams]]) -> float:
+    # Suma de totales para que el resultado se use.
+    return sum(quote(vehicle, trip).total_eur for vehicle, trip in inputs)
+
+
+def bench_single(inputs: list[tuple[VehicleParams, TripParams]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        quote_all(inputs)
+        best = min(best, perf_counter() - started)
+    return len(inputs) / best
+
+
+_BARRIER = None
+
+
+def _init_worker(barrier) -> None:
+    global _BARRIER
+    _BARRIER = barrier
+
+
+def _worker_span(count: int, seed: int) -> tuple[float, float]:
+    # Cada proceso genera sus entradas (solo viajan count y seed) y espera a los demas antes de medir.
+    inputs = make_inputs(count, seed)
+    _BARRIER.wait()
+    started = perf_counter()
+    quote_all(inputs)
+    return started, perf_counter()
+
+
+def bench_processes(count: int, processes: int) -> float:
+    """
+    `count` cotizaciones repartidas en `processes` procesos: total / (ultimo fin - primer inicio).
+    perf_counter es el reloj monotono del sistema, comparable entre procesos en Linux.
+    """
+
+    share = max(count // processes, 1)
+    barrier = multiprocessing.Barrier(processes)
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(barrier,)) as pool:
+        spans = list(pool.map(_worker_span, [share] * processes, range(processes)))
+    return share * processes / (max(end for _, end in spans) - min(start for start, _ in spans))
+
+
+def bench_service(inputs: list[tuple[VehicleParams, TripParams]], repeat: int) -> float:
+    """
+    Misma carga por `calc.compute_*` (TripCalcRequest + textos de supuestos) sobre un contexto en memoria.
+    """
+
+    from backend.schemas import TripCalcRequest
+    from backend.services.calc import (
+        CalcContext,
+        compute_depreciation,
+        compute_energy,
+        compute_insurance,
+        compute_maintenance,
+    )
+    from backend.services.fuel_snapshot import FuelPriceEntry, FuelPriceSnapshot
+    from backend.services.rate_tables import RateEntry, RateTables
+
+    now = datetime.utcnow()
+    fuel = FuelPriceSnapshot(
+        version=1,
+        prices={
+            fuel_type: FuelPriceEntry(
+                id=index, fuel_type=fuel_type, price_eur_per_unit=1.6, unit="eur/l", source="bench", fetched_at=now
+            )
+            for index, fuel_type in enumerate(("gasoline", "diesel"))
+        },
+    )
+    rates = RateTables(version=1, entries={(p, None): RateEntry(0.05, RATES) for p in ("gasoline", "diesel", "bev", "phev")})
+    context = CalcContext(fuel=fuel, rates=rates, year=now.year)
+    routes = {value: name for name, value in ROUTE_MULTIPLIERS.items()}
+    payloads = [
+        TripCalcRequest(
+            trip_km=trip.trip_km,
+            trip_days=trip.trip_days,
+            route_type=routes[trip.route_multiplier],
+            electricity_price_eur_per_kwh=trip.electricity_price_eur_per_kwh,
+            vehicle={
+                "powertrain_type": vehicle.powertrain_type,
+                "consumption_l_per_100km": vehicle.consumption_l_per_100km,
+                "consumption_kwh_per_100km": vehicle.consumption_kwh_per_100km,
+                "phev_electric_share": vehicle.phev_electric_share,
+                "market_value_eur": vehicle.market_value_eur,
+                "year": vehicle.year,
+                "current_km": vehicle.current_km,
+                "annual_km": vehicle.annual_km,
+            },
+            insurance=(
+                {
+                    "cost_amount": trip.insurance.annual_cost_eur,
+                    "cost_period": "annual",
+                    "mode": "per_km" if trip.insurance.per_km else "per_day",
+                }
+                if trip.insurance
+                else None
+            ),
+        )
+        for vehicle, trip in inputs
+    ]
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        for payload in payloads:
+            compute_energy(context, payload)
+            compute_maintenance(context, payload)
+            compute_insurance(payload)
+            compute_depreciation(context, payload)
+        best = min(best, perf_counter() - started)
+    return len(payloads) / best
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Quotes per second of the pure calculation kernel.")
+    parser.add_argument("--quotes", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=0, help="Also shard the quotes over N worker processes")
+    parser.add_argument("--service", action="store_true", help="Also time the calc.compute_* path for reference")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.quotes)
+    print(f"kernel, 1 process:            {bench_single(inputs, args.repeat):>12,.0f} quotes/s")
+    if args.processes:
+        rate = bench_processes(args.quotes, args.processes)
+        label = f"kernel, {args.processes} processes:"
+        print(f"{label:<30}{rate:>12,.0f} quotes/s  ({os.cpu_count()} CPUs)")
+    if args.service:
+        sample = inputs[: min(len(inputs), 50_000)]
+        print(f"calc.compute_*, 1 process:    {bench_service(sample, args.repeat):>12,.0f} quotes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter, sleep
+from typing import Iterator
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+TRIP = {
+    "trip_km": 320,
+    "trip_days": 2,
+    "vehicle_id": 1,
+    "vehicle": {"powertrain_type": "gasoline", "consumption_l_per_100km": 6.4, "segment": "compact"},
+    "maintenance": {"use_real_costs": True},
+}
+# Peticiones del escenario: (metodo, ruta, cuerpo JSON).
+SCENARIOS = {
+    "calc": [("POST", "/api/calc/trip", TRIP)],
+    "uncertainty": [("POST", "/api/calc/trip", {**TRIP, "uncertainty": {"samples": 20000}})],
+    "search": [("GET", "/api/catalog/vehicles?query=seat%20leon&limit=20", None)],
+    "mix": [
+        ("POST", "/api/calc/trip", TRIP),
+        ("GET", "/api/catalog/vehicles?query=seat%20leon&limit=20", None),
+        ("GET", "/api/maintenance-events?vehicle_id=1", None),
+    ],
+}
+
+
+@dataclass
+class LoadResult:
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    latencies_ms: dict[str, list[float]] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.requests} requests in {self.seconds:.1f}s: {self.requests / self.seconds:,.0f} req/s, "
+            f"{self.errors} errors"
+        ]
+        for path, values in sorted(self.latencies_ms.items()):
+            cuts = quantiles(values, n=100) if len(values) > 1 else values * 99
+            lines.append(
+                f"  {path:<45} p50 {cuts[49]:7.1f} ms  p95 {cuts[94]:7.1f} ms  p99 {cuts[98]:7.1f} ms"
+            )
+        return "\n".join(lines)
+
+
+async def run_load(base_url: str, scenario: str, concurrency: int, total: int) -> LoadResult:
+    requests = SCENARIOS[scenario]
+    result = LoadResult()
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+
+        async def worker() -> None:
+            for index in counter:
+                method, path, body = requests[index % len(requests)]
+                started = perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                elapsed = (perf_counter() - started) * 1000
+                result.requests += 1
+                if not ok:
+                    result.errors += 1
+                result.latencies_ms.setdefault(f"{method} {path.split('?')[0]}", []).append(elapsed)
+
+        started = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.seconds = perf_counter() - started
+    return result
+
+
+@contextmanager
+def local_server(port: int, workers: int) -> Iterator[str]:
+    """
+    Arranca la API con uvicorn sobre una base temporal con los datos del seed.
+    """
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**os.environ, "PYTHONPATH": str(ROOT)}
+        subprocess.run([sys.executable, "-m", "backend.seed"], cwd=workdir, env=env, check=True)
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "backend.main:app",
+                "--port",
+                str(port),
+                "--workers",
+                str(workers),
+                "--log-level",
+                "warning",
+            ],
+            cwd=workdir,
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    httpx.get(f"{base_url}/api/health", timeout=1.0)
+                    break
+                except httpx.HTTPError:
+                    sleep(0.2)
+            yield base_url
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent load test for the trip-cost API.")
+    parser.add_argument("--url", default=None, help="Running API base URL (default: start a local one)")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mix")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(run_load(args.url, args.scenario, args.concurrency, args.requests))
+    else:
+        with local_server(args.port, args.workers) as base_url:
+            asyncio.run(run_load(base_url, args.scenario, args.concurrency, min(args.requests, 100)))  # calentamiento
+            result = asyncio.run(run_load(base_url, args.scenario, args.concurrency, args.requests))
+    print(result.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import sys
+
+from backend.tests.conftest import check_plans, hot_paths, scratch_database
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Fail if a hot query path does a full table scan in SQLite or runs more SELECTs than budgeted."
+    )
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per large table in the scratch database")
+    args = parser.parse_args()
+
+    with scratch_database(args.rows) as factory:
+        checks = check_plans(factory, hot_paths())
+
+    failed = False
+    for check in checks:
+        status = "FULL SCAN" if check.full_scans else "OVER" if check.over_budget else "ok"
+        budget = f", budget {check.budget}" if check.budget is not None else ""
+        print(f"{status:>9}  {check.name} ({check.statements} statements{budget})")
+        for detail in check.full_scans:
+            print(f"           {detail}")
+        failed = failed or bool(check.full_scans) or check.over_budget
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from backend.db import SessionLocal, init_db
+from backend.services.maintenance_aggregates import rebuild_maintenance_aggregates
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild per-vehicle maintenance aggregates from maintenance events.")
+    parser.add_argument("--vehicle-id", type=int, action="append", help="Only rebuild these vehicles (repeatable)")
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as session:
+        count = rebuild_maintenance_aggregates(session, args.vehicle_id)
+        session.commit()
+    print(f"Rebuilt maintenance aggregates for {count} vehicles.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.db import SessionLocal, init_db
+from backend.models import UserVehicle, VehicleMaintenanceAggregate
+from backend.schemas import TripCalcRequest, VehicleInput
+from backend.services.bulk_load import batched
+from backend.services.calc import (
+    CalcContext,
+    compute_depreciation,
+    compute_energy,
+    compute_insurance,
+    compute_maintenance,
+)
+from backend.services.fuel_snapshot import FuelPriceSnapshot, load_fuel_snapshot
+from backend.services.rate_tables import RateTables, build_rate_tables
+from backend.services.tabular_io import (
+    COMPRESSION_SUFFIXES,
+    iter_parquet_rows,
+    missing_dependency,
+    write_csv,
+    write_parquet,
+)
+
+COST_CHUNK_SIZE = 2000
+# Columnas planas de entrada: las de TripCalcRequest, las de VehicleInput y las del seguro con prefijo.
+TRIP_COLUMNS = (
+    "trip_km",
+    "trip_days",
+    "route_type",
+    "vehicle_id",
+    "province",
+    "municipality",
+    "electricity_price_eur_per_kwh",
+)
+VEHICLE_COLUMNS = tuple(VehicleInput.model_fields)
+INSURANCE_COLUMNS = {
+    "insurance_cost_amount": "cost_amount",
+    "insurance_cost_period": "cost_period",
+    "insurance_mode": "mode",
+    "insurance_annual_km": "annual_km",
+    "insurance_start_date": "start_date",
+}
+MAINTENANCE_COLUMNS = ("use_real_costs", "force_estimates")
+OUTPUT_COLUMNS = (
+    "row",
+    "trip_id",
+    "ok",
+    "error",
+    "total_eur",
+    "per_km_eur",
+    "energy_eur",
+    "energy_per_km_eur",
+    "fuel_liters",
+    "electric_kwh",
+    "energy_source",
+    "maintenance_eur",
+    "maintenance_per_km_eur",
+    "maintenance_source",
+    "insurance_eur",
+    "insurance_per_km_eur",
+    "insurance_source",
+    "depreciation_eur",
+    "depreciation_per_km_eur",
+    "residual_value_eur",
+    "depreciation_source",
+)
+# Tipos Arrow de la salida Parquet; el resto de columnas son importes (float64).
+OUTPUT_TYPES = {
+    "row": "int64",
+    "trip_id": "string",
+    "ok": "bool",
+    "error": "string",
+    **{name: "string" for name in OUTPUT_COLUMNS if name.endswith("_source")},
+}
+_EMPTY_RESULT = (None,) * (len(OUTPUT_COLUMNS) - 4)
+_VEHICLE_FIELDS = (
+    "id",
+    "powertrain_type",
+    "segment",
+    "current_km",
+    "annual_km",
+    "market_value_eur",
+    "consumption_l_per_100km",
+    "consumption_kwh_per_100km",
+    "phev_electric_share",
+)
+_AGGREGATE_FIELDS = (
+    "vehicle_id",
+    "total_cost_eur",
+    "event_count",
+    "odometer_count",
+    "min_odometer_km",
+    "max_odometer_km",
+)
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """
+    Todo lo que consulta el calculo, leido una vez y enviado a cada proceso al arrancar.
+
+    Vehiculos y agregados van como dicts de columnas (se envian con pickle) y cada proceso crea
+    objetos transitorios al usarlos.
+    """
+
+    fuel: FuelPriceSnapshot
+    rates: RateTables
+    year: int
+    vehicles: dict[int, dict]
+    aggregates: dict[int, dict]
+
+
+@dataclass
+class CostingReport:
+    rows: int = 0
+    errors: int = 0
+    processes: int = 0
+    load_s: float = 0.0
+    read_s: float = 0.0
+    compute_s: float = 0.0
+    wait_s: float = 0.0
+    write_s: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        workers = f"{self.processes} processes" if self.processes else "inline"
+        return (
+            f"Costed {self.rows} trips ({self.errors} errors) in {self.seconds:.2f}s "
+            f"({self.rows_per_s:,.0f} trips/s, {workers})\n"
+            f"  load reference {self.load_s:7.2f}s\n"
+            f"  read input     {self.read_s:7.2f}s\n"
+            f"  compute        {self.compute_s:7.2f}s (sum over workers)\n"
+            f"  wait workers   {self.wait_s:7.2f}s\n"
+            f"  write output   {self.write_s:7.2f}s"
+        )
+
+
+def load_reference(session: Session) -> ReferenceData:
+    def rows(model: type, names: tuple[str, ...], key: str) -> dict[int, dict]:
+        stmt = select(*(getattr(model, name) for name in names))
+        return {values[key]: values for values in (dict(zip(names, row)) for row in session.execute(stmt))}
+
+    return ReferenceData(
+        fuel=load_fuel_snapshot(session),
+        rates=build_rate_tables(session),
+        year=datetime.utcnow().year,
+        vehicles=rows(UserVehicle, _VEHICLE_FIELDS, "id"),
+        aggregates=rows(VehicleMaintenanceAggregate, _AGGREGATE_FIELDS, "vehicle_id"),
+    )
+
+
+def iter_trip_chunks(path: Path, chunk_size: int = COST_CHUNK_SIZE) -> Iterator[list[dict]]:
+    """
+    Lee el fichero de viajes (CSV, CSV .gz o Parquet) en bloques de dicts sin cargarlo entero.
+    """
+
+    if path.suffix == ".parquet":
+        yield from iter_parquet_rows(path, chunk_size)
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", newline="", encoding="utf-8") as handle:
+        yield from batched(csv.DictReader(handle), chunk_size)
+
+
+def trip_request(row: dict) -> TripCalcRequest:
+    """
+    Fila plana -> TripCalcRequest, con la misma validacion que `POST /api/calc/trip`.
+    """
+
+    values = {name: value for name, value in row.items() if value is not None and value != ""}
+    body: dict[str, object] = {name: values[name] for name in TRIP_COLUMNS if name in values}
+    body["vehicle"] = {name: values[name] for name in VEHICLE_COLUMNS if name in values}
+    # Sin importe no hay seguro, aunque el fichero traiga periodo o modo para todas las filas.
+    if "insurance_cost_amount" in values:
+        insurance = {field: values[column] for column, field in INSURANCE_COLUMNS.items() if column in values}
+        insurance.setdefault("cost_period", "annual")
+        body["insurance"] = insurance
+    body["maintenance"] = {name: values[name] for name in MAINTENANCE_COLUMNS if name in values}
+    return TripCalcRequest.model_validate(body)
+
+
+# Estado de cada proceso de trabajo (lo fija `init_worker`).
+_REFERENCE: ReferenceData | None = None
+_CONTEXTS: dict[int | None, CalcContext] = {}
+
+
+def init_worker(reference: ReferenceData) -> None:
+    global _REFERENCE
+    _REFERENCE = reference
+    _CONTEXTS.clear()
+
+
+def _context(vehicle_id: int | None) -> CalcContext:
+    context = _CONTEXTS.get(vehicle_id)
+    if context is None:
+        reference = _REFERENCE
+        vehicle = reference.vehicles.get(vehicle_id) if vehicle_id else None
+        aggregate = reference.aggregates.get(vehicle_id) if vehicle else None
+        context = CalcContext(
+            fuel=reference.fuel,
+            rates=reference.rates,
+            year=reference.year,
+            vehicle=UserVehicle(**vehicle) if vehicle else None,
+            aggregate=VehicleMaintenanceAggregate(**aggregate) if aggregate else None,
+        )
+        _CONTEXTS[vehicle_id] = context
+    return context
+
+
+def cost_row(index: int, row: dict) -> tuple:
+    trip_id = row.get("trip_id")
+    trip_id = str(trip_id) if trip_id not in (None, "") else None
+    try:
+        payload = trip_request(row)
+        if payload.trip_km <= 0:
+            raise ValueError("trip_km must be positive")
+        context = _context(payload.vehicle_id)
+        energy = compute_energy(context, payload)
+        maintenance = compute_maintenance(context, payload)
+        insurance = compute_insurance(payload)
+        depreciation = compute_depreciation(context, payload)
+    except ValidationError as exc:
+        error = "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in exc.errors())
+        return (index, trip_id, False, error) + _EMPTY_RESULT
+    except ValueError as exc:
+        return (index, trip_id, False, str(exc)) + _EMPTY_RESULT
+
+    total = energy.total_eur + maintenance.amount_eur + insurance.amount_eur + depreciation.amount_eur
+    fuel_liters = sum(value for key, value in energy.detail.items() if key.endswith("_liters"))
+    return (
+        index,
+        trip_id,
+        True,
+        None,
+        total,
+        total / payload.trip_km,
+        energy.total_eur,
+        energy.per_km_eur,
+        fuel_liters,
+        energy.detail.get("electric_kwh", 0.0),
+        energy.source,
+        maintenance.amount_eur,
+        maintenance.per_km_eur,
+        maintenance.source,
+        insurance.amount_eur,
+        insurance.per_km_eur,
+        insurance.source,
+        depreciation.amount_eur,
+        depreciation.per_km_eur,
+        depreciation.residual_value_eur,
+        depreciation.source,
+    )
+
+
+def cost_chunk(start: int, rows: list[dict]) -> tuple[list[tuple], int, float]:
+    """
+    Calcula un bloque en el proceso actual. Devuelve (filas de salida, errores, segundos de calculo).
+    """
+
+    started = perf_counter()
+    results = [cost_row(start + offset, row) for offset, row in enumerate(rows)]
+    errors = sum(1 for result in results if not result[2])
+    return results, errors, perf_counter() - started
+
+
+def cost_batches(
+    chunks: Iterator[list[dict]], reference: ReferenceData, processes: int, report: CostingReport
+) -> Iterator[list[tuple]]:
+    """
+    Reparte los bloques entre `processes` procesos y devuelve los resultados en el orden de entrada.
+
+    Como mucho hay 2 bloques por proceso en vuelo, asi que la memoria no crece con el fichero.
+    `processes=0` calcula en el proceso actual. El tiempo que el consumidor tarda en volver a
+    pedir un lote se cuenta como escritura.
+    """
+
+    def record(outcome: tuple[list[tuple], int, float]) -> list[tuple]:
+        results, errors, seconds = outcome
+        report.rows += len(results)
+        report.errors += errors
+        report.compute_s += seconds
+        return results
+
+    def wait(future: Future) -> tuple[list[tuple], int, float]:
+        started = perf_counter()
+        outcome = future.result()
+        report.wait_s += perf_counter() - started
+        return outcome
+
+    def emit(results: list[tuple]) -> Iterator[list[tuple]]:
+        started = perf_counter()
+        yield results
+        report.write_s += perf_counter() - started
+
+    def read() -> Iterator[list[dict]]:
+        while True:
+            started = perf_counter()
+            chunk = next(chunks, None)
+            report.read_s += perf_counter() - started
+            if chunk is None:
+                return
+            yield chunk
+
+    report.processes = processes
+    start = 0
+    if processes <= 0:
+        init_worker(reference)
+        for chunk in read():
+            outcome = cost_chunk(start, chunk)
+            start += len(chunk)
+            yield from emit(record(outcome))
+        return
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(reference,)) as pool:
+        pending: deque[Future] = deque()
+        for chunk in read():
+            pending.append(pool.submit(cost_chunk, start, chunk))
+            start += len(chunk)
+            if len(pending) >= processes * 2:
+                yield from emit(record(wait(pending.popleft())))
+        while pending:
+            yield from emit(record(wait(pending.popleft())))
+
+
+def default_out(path: Path, fmt: str, compression: str) -> Path:
+    stem = path.name.split(".")[0]
+    if fmt == "parquet":
+        return path.with_name(f"{stem}.costs.parquet")
+    return path.with_name(f"{stem}.costs.csv{COMPRESSION_SUFFIXES.get(compression, '')}")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cost a CSV/Parquet file of trips offline with a process pool.")
+    parser.add_argument("--file", type=Path, required=True, help="Trips as CSV, CSV.gz or Parquet (one trip per row)")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--compress", choices=("none", "gzip", "zstd"), default="none")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="0 = compute in this process")
+    parser.add_argument("--chunk-size", type=int, default=COST_CHUNK_SIZE)
+    args = parser.parse_args()
+    problem = missing_dependency(args.format, args.compress, reads_parquet=args.file.suffix == ".parquet")
+    if problem:
+        parser.error(problem)
+    out = args.out or default_out(args.file, args.format, args.compress)
+
+    report = CostingReport()
+    started = perf_counter()
+    init_db()
+    with SessionLocal() as session:
+        reference = load_reference(session)
+    report.load_s = perf_counter() - started
+
+    batches = cost_batches(iter_trip_chunks(args.file, args.chunk_size), reference, args.processes, report)
+    if args.format == "parquet":
+        write_parquet(batches, out, OUTPUT_COLUMNS, OUTPUT_TYPES, args.compress, default_type="float64")
+    else:
+        write_csv(batches, out, OUTPUT_COLUMNS, args.compress)
+    report.seconds = perf_counter() - started
+    print(report.summary())
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
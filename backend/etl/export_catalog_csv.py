@@ -1,66 +1,110 @@
 from __future__ import annotations
 
-import csv
 from pathlib import Path
+from time import perf_counter
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 
 from backend.db import SessionLocal, init_db
 from backend.models import VehicleCatalog
+from backend.services import tabular_io
+from backend.services.tabular_io import COMPRESSION_SUFFIXES, missing_dependency
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = (
+    "id",
+    "brand",
+    "model",
+    "variant",
+    "fuel_type",
+    "category",
+    "segment",
+    "engine_cc",
+    "classification",
+    "consumption_min",
+    "consumption_max",
+    "emissions_min",
+    "emissions_max",
+    "source",
+    "updated_at",
+)
+# Tipos Arrow de las columnas que no son texto.
+EXPORT_TYPES = {
+    "id": "int64",
+    "engine_cc": "float64",
+    "consumption_min": "float64",
+    "consumption_max": "float64",
+    "emissions_min": "float64",
+    "emissions_max": "float64",
+    "updated_at": "timestamp[us]",
+}
+
+
+def iter_catalog_batches(session: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list[tuple]]:
+    """
+    Filas vivas del catalogo en lotes de tuplas, con cursor en streaming (`yield_per`) y sin objetos ORM.
+    """
+
+    stmt = (
+        select(*(getattr(VehicleCatalog, name) for name in EXPORT_COLUMNS))
+        .where(VehicleCatalog.deleted_at.is_(None))
+        .order_by(VehicleCatalog.brand.asc(), VehicleCatalog.id.asc())
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in session.execute(stmt).partitions():
+        yield [tuple(row) for row in partition]
+
+
+def write_csv(batches: Iterator[list[tuple]], path: Path, compression: str = "none") -> int:
+    return tabular_io.write_csv(batches, path, EXPORT_COLUMNS, compression)
+
+
+def write_parquet(batches: Iterator[list[tuple]], path: Path, compression: str = "none") -> int:
+    """
+    Escribe un row group de Parquet por lote, sin acumular el catalogo en memoria.
+    """
+
+    return tabular_io.write_parquet(batches, path, EXPORT_COLUMNS, EXPORT_TYPES, compression)
+
+
+def default_out(fmt: str, compression: str) -> Path:
+    if fmt == "parquet":
+        return Path("data") / "idae_catalog.parquet"
+    return Path("data") / f"idae_catalog.csv{COMPRESSION_SUFFIXES.get(compression, '')}"
 
 
 def main() -> None:
     import argparse
 
-    parser = argparse.ArgumentParser(description="Export vehicle catalog to CSV.")
-    parser.add_argument("--out", type=Path, default=Path("data") / "idae_catalog.csv")
+    parser = argparse.ArgumentParser(description="Export vehicle catalog to CSV or Parquet.")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument(
+        "--compress",
+        choices=("none", "gzip", "zstd"),
+        default="none",
+        help="CSV: compress the file. Parquet: column codec (default snappy)",
+    )
     args = parser.parse_args()
+    problem = missing_dependency(args.format, args.compress)
+    if problem:
+        parser.error(problem)
+    out = args.out or default_out(args.format, args.compress)
 
     init_db()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    started = perf_counter()
     with SessionLocal() as session:
-        rows = session.query(VehicleCatalog).order_by(VehicleCatalog.brand.asc()).all()
-
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    with args.out.open("w", newline="", encoding="utf-8") as handle:
-        writer = csv.writer(handle)
-        writer.writerow(
-            [
-                "id",
-                "brand",
-                "model",
-                "variant",
-                "fuel_type",
-                "category",
-                "segment",
-                "engine_cc",
-                "classification",
-                "consumption_min",
-                "consumption_max",
-                "emissions_min",
-                "emissions_max",
-                "source",
-                "updated_at",
-            ]
-        )
-        for row in rows:
-            writer.writerow(
-                [
-                    row.id,
-                    row.brand,
-                    row.model,
-                    row.variant,
-                    row.fuel_type,
-                    row.category,
-                    row.segment,
-                    row.engine_cc,
-                    row.classification,
-                    row.consumption_min,
-                    row.consumption_max,
-                    row.emissions_min,
-                    row.emissions_max,
-                    row.source,
-                    row.updated_at,
-                ]
-            )
-    print(f"Exported {len(rows)} rows to {args.out}")
+        batches = iter_catalog_batches(session)
+        if args.format == "parquet":
+            written = write_parquet(batches, out, args.compress)
+        else:
+            written = write_csv(batches, out, args.compress)
+    elapsed = perf_counter() - started
+    rate = written / elapsed if elapsed else 0.0
+    print(f"Exported {written} rows to {out} in {elapsed:.1f}s ({rate:,.0f} rows/s)")
 
 
 if __name__ == "__main__":
@@ -7,8 +7,17 @@ from backend.services.fuel_prices import fetch_and_store_fuel_prices
 def main() -> None:
     init_db()
     with SessionLocal() as session:
-        fetch_and_store_fuel_prices(session)
-    print("Fuel prices refreshed.")
+        report = fetch_and_store_fuel_prices(session)
+    print(f"Fuel prices refreshed from {report.stations} stations ({report.source_date or 'unknown date'}).")
+    for column, stats in sorted(report.stats.items()):
+        print(
+            f"  {column}: n={stats.count} mean={stats.mean:.3f} median={stats.median:.3f} "
+            f"p10={stats.p10:.3f} p90={stats.p90:.3f}"
+        )
+    print(f"Stored {report.stations_written} stations and {report.prices_written} changed station prices.")
+    print(f"Stored {report.aggregates_written} province/municipality aggregates in {report.aggregate_seconds:.2f}s.")
+    peak = f"+{report.peak_rss_delta_mb:.1f} MB" if report.peak_rss_delta_mb is not None else "n/a"
+    print(f"Parse {report.parse_seconds:.2f}s, download {report.download_seconds:.2f}s, peak RSS growth {peak}")
 
 
 if __name__ == "__main__":
@@ -1,30 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import os
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Iterable
+from time import monotonic
+from typing import AsyncIterator, Callable
 from urllib.parse import urlencode
 
-import requests
-
 from backend.db import SessionLocal, init_db
-from backend.models import VehicleCatalog
+from backend.services.bulk_load import sqlite_load_pragmas
+from backend.services.catalog_search import ensure_catalog_fts
+from backend.services.catalog_sync import sync_catalog
+from backend.services.http_client import AsyncHttpClient, HttpConfig, run_sync
 
-BASE_URL = "https://coches.idae.es/base-datos/marca-y-modelo"
-AJAX_URL = "https://coches.idae.es/ajax"
+IDAE_HOST = os.getenv("IDAE_HOST", "https://coches.idae.es").rstrip("/")
+BASE_URL = f"{IDAE_HOST}/base-datos/marca-y-modelo"
+AJAX_URL = f"{IDAE_HOST}/ajax"
 
 
 @dataclass
 class IdAeSession:
-    session: requests.Session
+    # Cliente propio (no el compartido): el token CSRF va ligado a la cookie de sesion.
+    client: AsyncHttpClient
     token: str
     brands: list[str]
 
 
-def _fetch_html() -> str:
-    response = requests.get(BASE_URL, timeout=30)
-    response.raise_for_status()
+async def _fetch_html(client: AsyncHttpClient) -> str:
+    response = await client.get(BASE_URL, timeout=30)
     return response.text
 
 
@@ -45,12 +50,11 @@ def _extract_brands(html: str) -> list[str]:
     return brands
 
 
-def _bootstrap_session() -> IdAeSession:
-    session = requests.Session()
-    html = session.get(BASE_URL, timeout=30).text
+async def _bootstrap_session(client: AsyncHttpClient) -> IdAeSession:
+    html = await _fetch_html(client)
     token = _extract_token(html)
     brands = _extract_brands(html)
-    return IdAeSession(session=session, token=token, brands=brands)
+    return IdAeSession(client=client, token=token, brands=brands)
 
 
 def _classification_from_html(html: str) -> str | None:
@@ -103,15 +107,10 @@ def _map_segment(category: str | None) -> str | None:
     return "generic"
 
 
-def _fetch_listado(
-    client: IdAeSession,
-    *,
-    ciclo: str,
-    start: int,
-    length: int,
-    filtros: dict[str, str],
-) -> dict:
-    payload = {
+def _fetch_listado_payload(
+    client: IdAeSession, *, ciclo: str, start: int, length: int, filtros: dict[str, str]
+) -> dict[str, object]:
+    return {
         "draw": 1,
         "start": start,
         "length": length,
@@ -120,31 +119,204 @@ def _fetch_listado(
         "ciclo": ciclo,
         "filtros": urlencode(filtros),
     }
-    response = client.session.post(AJAX_URL, data=payload, timeout=60)
-    response.raise_for_status()
-    return response.json()
-
-
-def _iter_rows(client: IdAeSession, ciclo: str, filtros: dict[str, str]) -> Iterable[list]:
-    first = _fetch_listado(client, ciclo=ciclo, start=0, length=1, filtros=filtros)
-    total = int(first.get("recordsFiltered") or 0)
-    if total == 0:
-        return
-    page_size = 500
-    for start in range(0, total, page_size):
-        payload = _fetch_listado(client, ciclo=ciclo, start=start, length=page_size, filtros=filtros)
-        for row in payload.get("data", []):
-            yield row
-
-
-def build_catalog() -> list[VehicleCatalog]:
-    client = _bootstrap_session()
-    client.session.headers.update(
-        {
-            "User-Agent": "VehicleAnalytics/1.0 (+https://github.com/pietrusj-data/calculo-de-costes-viaje)",
-            "Accept": "application/json,text/json,*/*",
-        }
+
+
+class RateLimiter:
+    """
+    Espacia el inicio de las peticiones para no superar `rate_per_s` (0 = sin limite).
+    """
+
+    def __init__(self, rate_per_s: float) -> None:
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass(frozen=True)
+class CrawlConfig:
+    concurrency: int = 4
+    rate_per_s: float = 4.0
+    page_size: int = 500
+
+
+@dataclass(frozen=True)
+class PageResult:
+    ciclo: str
+    start: int
+    payload: dict
+    seconds: float
+    attempts: int
+
+    @property
+    def rows(self) -> list:
+        return self.payload.get("data", [])
+
+
+@dataclass
+class CrawlReport:
+    pages: int = 0
+    rows: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+async def _fetch_listado(
+    client: IdAeSession,
+    limiter: RateLimiter,
+    *,
+    ciclo: str,
+    start: int,
+    length: int,
+    filtros: dict[str, str],
+) -> PageResult:
+    data = _fetch_listado_payload(client, ciclo=ciclo, start=start, length=length, filtros=filtros)
+    attempts = 0
+    started = monotonic()
+
+    async def attempt():
+        nonlocal attempts
+        attempts += 1
+        await limiter.wait()
+        return await client.client.request_once("POST", AJAX_URL, data=data, timeout=60)
+
+    response = await client.client.retrying(attempt)
+    return PageResult(ciclo=ciclo, start=start, payload=response.json(), seconds=monotonic() - started, attempts=attempts)
+
+
+async def _crawl_pages(
+    client: IdAeSession, filtros: dict[str, str], config: CrawlConfig
+) -> AsyncIterator[tuple[PageResult, int]]:
+    """
+    Pide las paginas de ambos ciclos en paralelo y las entrega segun llegan, como (pagina, total de paginas).
+    """
+
+    limiter = RateLimiter(config.rate_per_s)
+    cycles = ("wltp", "elec")
+    firsts = await asyncio.gather(
+        *(_fetch_listado(client, limiter, ciclo=ciclo, start=0, length=1, filtros=filtros) for ciclo in cycles)
     )
+    tasks = [
+        asyncio.ensure_future(
+            _fetch_listado(client, limiter, ciclo=first.ciclo, start=start, length=config.page_size, filtros=filtros)
+        )
+        for first in firsts
+        for start in range(0, int(first.payload.get("recordsFiltered") or 0), config.page_size)
+    ]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            yield await next_page, len(tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _wltp_record(row: list, brands: list[str]) -> dict | None:
+    if len(row) < 7:
+        return None
+    variant = re.sub(r"<[^>]+>", "", row[0]).strip()
+    brand, model = _split_brand_model(variant, brands)
+    return {
+        "id": int(row[6]),
+        "variant": variant,
+        "brand": brand,
+        "model": model,
+        "classification": _classification_from_html(row[1] or ""),
+        "consumption_min": _parse_float(row[2]),
+        "consumption_max": _parse_float(row[3]),
+        "emissions_min": _parse_float(row[4]),
+        "emissions_max": _parse_float(row[5]),
+    }
+
+
+def _elec_record(row: list, brands: list[str]) -> dict | None:
+    if len(row) < 10:
+        return None
+    variant = re.sub(r"<[^>]+>", "", row[0]).strip()
+    fuel_type = re.sub(r"<[^>]+>", "", str(row[2])).strip()
+    category = re.sub(r"<[^>]+>", "", str(row[3])).strip()
+    brand, model = _split_brand_model(variant, brands)
+    return {
+        "id": int(row[-1]),
+        "variant": variant,
+        "brand": brand,
+        "model": model,
+        "classification": _classification_from_html(row[1] or ""),
+        "fuel_type": fuel_type or None,
+        "category": category or None,
+        "segment": _map_segment(category),
+        "engine_cc": _parse_float(row[4]),
+    }
+
+
+@dataclass
+class CatalogMerger:
+    """
+    Junta WLTP y electricos por id segun llegan las paginas, en cualquier orden.
+    """
+
+    brands: list[str]
+    wltp: dict[int, dict] = field(default_factory=dict)
+    elec: dict[int, dict] = field(default_factory=dict)
+
+    def add_page(self, page: PageResult) -> None:
+        parse, target = (_wltp_record, self.wltp) if page.ciclo == "wltp" else (_elec_record, self.elec)
+        for row in page.rows:
+            record = parse(row, self.brands)
+            if record is not None:
+                target[record["id"]] = record
+
+    def build(self, updated_at: datetime) -> list[dict]:
+        catalog: list[dict] = []
+        for item_id, wltp in self.wltp.items():
+            elec = self.elec.get(item_id, {})
+            catalog.append(
+                {
+                    "id": item_id,
+                    "brand": wltp.get("brand") or elec.get("brand"),
+                    "model": wltp.get("model") or elec.get("model"),
+                    "variant": wltp.get("variant") or elec.get("variant"),
+                    "fuel_type": elec.get("fuel_type"),
+                    "category": elec.get("category"),
+                    "segment": elec.get("segment"),
+                    "engine_cc": elec.get("engine_cc"),
+                    "classification": wltp.get("classification") or elec.get("classification"),
+                    "consumption_min": wltp.get("consumption_min"),
+                    "consumption_max": wltp.get("consumption_max"),
+                    "emissions_min": wltp.get("emissions_min"),
+                    "emissions_max": wltp.get("emissions_max"),
+                    "source": "idae",
+                    "updated_at": updated_at,
+                }
+            )
+        return catalog
+
+
+def _print_page(page: PageResult, done: int, total: int) -> None:
+    retries = f", {page.attempts - 1} retries" if page.attempts > 1 else ""
+    print(f"  [{done}/{total}] {page.ciclo} start={page.start}: {len(page.rows)} rows in {page.seconds:.2f}s{retries}")
+
+
+async def build_catalog(
+    http: AsyncHttpClient,
+    config: CrawlConfig = CrawlConfig(),
+    on_page: Callable[[PageResult, int, int], None] | None = _print_page,
+) -> tuple[list[dict], CrawlReport]:
+    started = monotonic()
+    client = await _bootstrap_session(http)
     filtros = {
         "_token": client.token,
         "tipo": "marca-y-modelo",
@@ -154,87 +326,42 @@ def build_catalog() -> list[VehicleCatalog]:
         "segmento": "",
     }
 
-    wltp_data: dict[int, dict] = {}
-    for row in _iter_rows(client, "wltp", filtros):
-        if len(row) < 7:
-            continue
-        variant = re.sub(r"<[^>]+>", "", row[0]).strip()
-        classification = _classification_from_html(row[1] or "")
-        consumption_min = _parse_float(row[2])
-        consumption_max = _parse_float(row[3])
-        emissions_min = _parse_float(row[4])
-        emissions_max = _parse_float(row[5])
-        item_id = int(row[6])
-        brand, model = _split_brand_model(variant, client.brands)
-        wltp_data[item_id] = {
-            "id": item_id,
-            "variant": variant,
-            "brand": brand,
-            "model": model,
-            "classification": classification,
-            "consumption_min": consumption_min,
-            "consumption_max": consumption_max,
-            "emissions_min": emissions_min,
-            "emissions_max": emissions_max,
-        }
-
-    elec_data: dict[int, dict] = {}
-    for row in _iter_rows(client, "elec", filtros):
-        if len(row) < 10:
-            continue
-        variant = re.sub(r"<[^>]+>", "", row[0]).strip()
-        classification = _classification_from_html(row[1] or "")
-        fuel_type = re.sub(r"<[^>]+>", "", str(row[2])).strip()
-        category = re.sub(r"<[^>]+>", "", str(row[3])).strip()
-        engine_cc = _parse_float(row[4])
-        item_id = int(row[-1])
-        brand, model = _split_brand_model(variant, client.brands)
-        elec_data[item_id] = {
-            "id": item_id,
-            "variant": variant,
-            "brand": brand,
-            "model": model,
-            "classification": classification,
-            "fuel_type": fuel_type or None,
-            "category": category or None,
-            "segment": _map_segment(category),
-            "engine_cc": engine_cc,
-        }
-
-    catalog: list[VehicleCatalog] = []
-    updated_at = datetime.utcnow()
-    for item_id, wltp in wltp_data.items():
-        elec = elec_data.get(item_id, {})
-        catalog.append(
-            VehicleCatalog(
-                id=item_id,
-                brand=wltp.get("brand") or elec.get("brand"),
-                model=wltp.get("model") or elec.get("model"),
-                variant=wltp.get("variant") or elec.get("variant"),
-                fuel_type=elec.get("fuel_type"),
-                category=elec.get("category"),
-                segment=elec.get("segment"),
-                engine_cc=elec.get("engine_cc"),
-                classification=wltp.get("classification") or elec.get("classification"),
-                consumption_min=wltp.get("consumption_min"),
-                consumption_max=wltp.get("consumption_max"),
-                emissions_min=wltp.get("emissions_min"),
-                emissions_max=wltp.get("emissions_max"),
-                source="idae",
-                updated_at=updated_at,
-            )
-        )
-    return catalog
+    merger = CatalogMerger(brands=client.brands)
+    report = CrawlReport()
+    async for page, total in _crawl_pages(client, filtros, config):
+        merger.add_page(page)
+        report.pages += 1
+        report.rows += len(page.rows)
+        report.retries += page.attempts - 1
+        if on_page is not None:
+            on_page(page, report.pages, total)
+    report.seconds = monotonic() - started
+    return merger.build(datetime.utcnow()), report
 
 
 def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download the IDAE WLTP catalog into vehicle_catalog.")
+    parser.add_argument("--concurrency", type=int, default=CrawlConfig.concurrency, help="Max pages in flight")
+    parser.add_argument("--rate", type=float, default=CrawlConfig.rate_per_s, help="Max requests per second (0 = no limit)")
+    parser.add_argument("--page-size", type=int, default=CrawlConfig.page_size, help="Rows per listing page")
+    args = parser.parse_args()
+
     init_db()
-    items = build_catalog()
+    config = CrawlConfig(concurrency=args.concurrency, rate_per_s=args.rate, page_size=args.page_size)
+    http = AsyncHttpClient(HttpConfig(max_concurrency=config.concurrency))
+    items, crawl = run_sync(lambda: build_catalog(http, config), http)
+    print(
+        f"Crawled {crawl.pages} pages ({crawl.rows} rows) in {crawl.seconds:.1f}s: "
+        f"{crawl.rows_per_s:.0f} rows/s, {crawl.retries} retries."
+    )
     with SessionLocal() as session:
-        session.query(VehicleCatalog).delete()
-        session.add_all(items)
-        session.commit()
-    print(f"Imported {len(items)} vehicles from IDAE.")
+        with sqlite_load_pragmas(session):
+            report = sync_catalog(session, items, match_on="id", tombstone_missing=True)
+            session.commit()
+        ensure_catalog_fts(session)
+    print(f"Synced {len(items)} vehicles from IDAE: {report.summary()}.")
 
 
 if __name__ == "__main__":
@@ -2,39 +2,40 @@ from __future__ import annotations
 
 import csv
 from pathlib import Path
+from typing import Iterator
 
 from backend.db import SessionLocal, init_db
 from backend.models import DepreciationModel, MaintenanceTemplate
+from backend.services.bulk_load import bulk_insert, sqlite_load_pragmas
+from backend.services.data_versions import RATE_TABLES, bump_data_version
 
 
-def import_maintenance(path: Path):
+def import_maintenance(path: Path) -> Iterator[dict]:
     with path.open(newline="", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
-            item = MaintenanceTemplate(
-                powertrain_type=row.get("powertrain_type", "gasoline"),
-                segment=row.get("segment", "generic"),
-                category=row.get("category", "other"),
-                cost_eur=float(row.get("cost_eur", "0") or 0),
-                every_km=float(row.get("every_km", "0") or 0) or None,
-                every_months=int(row.get("every_months", "0") or 0) or None,
-            )
-            yield item
-
-
-def import_depreciation(path: Path):
+            yield {
+                "powertrain_type": row.get("powertrain_type", "gasoline"),
+                "segment": row.get("segment", "generic"),
+                "category": row.get("category", "other"),
+                "cost_eur": float(row.get("cost_eur", "0") or 0),
+                "every_km": float(row.get("every_km", "0") or 0) or None,
+                "every_months": int(row.get("every_months", "0") or 0) or None,
+            }
+
+
+def import_depreciation(path: Path) -> Iterator[dict]:
     with path.open(newline="", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
-            item = DepreciationModel(
-                powertrain_type=row.get("powertrain_type", "gasoline"),
-                segment=row.get("segment", "generic"),
-                base_value_eur=float(row.get("base_value_eur", "0") or 0),
-                annual_rate=float(row.get("annual_rate", "0.12") or 0.12),
-                km_rate=float(row.get("km_rate", "0.02") or 0.02),
-                min_residual_pct=float(row.get("min_residual_pct", "0.2") or 0.2),
-            )
-            yield item
+            yield {
+                "powertrain_type": row.get("powertrain_type", "gasoline"),
+                "segment": row.get("segment", "generic"),
+                "base_value_eur": float(row.get("base_value_eur", "0") or 0),
+                "annual_rate": float(row.get("annual_rate", "0.12") or 0.12),
+                "km_rate": float(row.get("km_rate", "0.02") or 0.02),
+                "min_residual_pct": float(row.get("min_residual_pct", "0.2") or 0.2),
+            }
 
 
 def main() -> None:
@@ -47,15 +48,17 @@ def main() -> None:
 
     init_db()
     with SessionLocal() as session:
-        if args.maintenance:
-            items = list(import_maintenance(args.maintenance))
-            session.add_all(items)
-            print(f"Imported maintenance templates: {len(items)}")
-        if args.depreciation:
-            items = list(import_depreciation(args.depreciation))
-            session.add_all(items)
-            print(f"Imported depreciation models: {len(items)}")
-        session.commit()
+        with sqlite_load_pragmas(session):
+            if args.maintenance:
+                report = bulk_insert(session, MaintenanceTemplate, import_maintenance(args.maintenance))
+                print(f"Imported maintenance templates: {report.summary()}")
+            if args.depreciation:
+                report = bulk_insert(session, DepreciationModel, import_depreciation(args.depreciation))
+                print(f"Imported depreciation models: {report.summary()}")
+            if args.maintenance or args.depreciation:
+                # La API recompila su tabla de tarifas al ver la version nueva (DATA_VERSION_CHECK_S).
+                bump_data_version(session, RATE_TABLES)
+            session.commit()
 
 
 if __name__ == "__main__":
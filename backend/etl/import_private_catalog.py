@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import csv
 from pathlib import Path
+from typing import Iterator
 
 from backend.db import SessionLocal, init_db
 from backend.etl.idae_catalog import _map_segment
-from backend.models import VehicleCatalog
+from backend.services.bulk_load import sqlite_load_pragmas
+from backend.services.catalog_search import ensure_catalog_fts
+from backend.services.catalog_sync import sync_catalog
 
 
 def _to_float(value: str) -> float | None:
@@ -20,31 +23,27 @@ def _to_float(value: str) -> float | None:
         return None
 
 
-def import_catalog(path: Path, source: str) -> list[VehicleCatalog]:
-    items: list[VehicleCatalog] = []
+def import_catalog(path: Path, source: str) -> Iterator[dict]:
     with path.open(newline="", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
             category = row.get("category") or None
             segment = row.get("segment") or _map_segment(category)
-            items.append(
-                VehicleCatalog(
-                    brand=row.get("brand") or None,
-                    model=row.get("model") or None,
-                    variant=row.get("variant") or None,
-                    fuel_type=row.get("fuel_type") or None,
-                    category=category,
-                    segment=segment,
-                    engine_cc=_to_float(row.get("engine_cc")),
-                    classification=row.get("classification") or None,
-                    consumption_min=_to_float(row.get("consumption_min")),
-                    consumption_max=_to_float(row.get("consumption_max")),
-                    emissions_min=_to_float(row.get("emissions_min")),
-                    emissions_max=_to_float(row.get("emissions_max")),
-                    source=source,
-                )
-            )
-    return items
+            yield {
+                "brand": row.get("brand") or None,
+                "model": row.get("model") or None,
+                "variant": row.get("variant") or None,
+                "fuel_type": row.get("fuel_type") or None,
+                "category": category,
+                "segment": segment,
+                "engine_cc": _to_float(row.get("engine_cc")),
+                "classification": row.get("classification") or None,
+                "consumption_min": _to_float(row.get("consumption_min")),
+                "consumption_max": _to_float(row.get("consumption_max")),
+                "emissions_min": _to_float(row.get("emissions_min")),
+                "emissions_max": _to_float(row.get("emissions_max")),
+                "source": source,
+            }
 
 
 def main() -> None:
@@ -53,17 +52,20 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Import private vehicle catalog CSV.")
     parser.add_argument("--file", type=Path, required=True)
     parser.add_argument("--source", type=str, default="private")
-    parser.add_argument("--replace", action="store_true", help="Replace catalog before import")
+    parser.add_argument(
+        "--replace", action="store_true", help="Tombstone catalog rows that are not in the file"
+    )
     args = parser.parse_args()
 
     init_db()
-    items = import_catalog(args.file, args.source)
     with SessionLocal() as session:
-        if args.replace:
-            session.query(VehicleCatalog).delete()
-        session.add_all(items)
-        session.commit()
-    print(f"Imported {len(items)} catalog rows from {args.file}")
+        with sqlite_load_pragmas(session):
+            report = sync_catalog(
+                session, import_catalog(args.file, args.source), match_on="natural", tombstone_missing=args.replace
+            )
+            session.commit()
+        ensure_catalog_fts(session)
+    print(f"Synced catalog rows from {args.file}: {report.summary()}.")
 
 
 if __name__ == "__main__":
@@ -1,30 +1,64 @@
 from __future__ import annotations
 
+from dataclasses import asdict
 from datetime import datetime
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .db import SessionLocal, init_db
-from sqlalchemy import or_
-
-from .models import FuelPrice, InsurancePolicy, MaintenanceEvent, UserVehicle, VehicleCatalog
+from .db import ReadSessionLocal, SessionLocal, async_read_sessions, close_async_engines, init_db
+from .models import InsurancePolicy, MaintenanceEvent, UserVehicle
 from .schemas import (
     FuelNearbyResponse,
+    FuelNearestResponse,
     FuelPriceResponse,
     InsuranceCreate,
     InsuranceResponse,
     MaintenanceEventCreate,
     MaintenanceEventResponse,
+    QuoteCacheStatsResponse,
+    TripBatchItem,
+    TripBatchRequest,
+    TripBatchResponse,
     TripCalcRequest,
     TripCalcResponse,
     VehicleCreate,
     VehicleResponse,
+    CatalogSuggestResponse,
+    CatalogSuggestStatsResponse,
     CatalogVehicleResponse,
 )
-from .services.calc import compute_depreciation, compute_energy, compute_insurance, compute_maintenance
-from .services.fuel_prices import fetch_and_store_fuel_prices, fetch_stations_by_postal_code
+from .services.batch_calc import calculate_trips_batch
+from .services.calc import (
+    CalcContext,
+    DepreciationResult,
+    EnergyResult,
+    MaintenanceResult,
+    compute_depreciation,
+    compute_energy,
+    compute_insurance,
+    compute_maintenance,
+    load_calc_context,
+)
+from .services.catalog_search import ensure_catalog_fts, find_catalog_vehicles
+from .services.catalog_suggest import get_catalog_suggest, load_catalog_suggest
+from .services.fuel_prices import (
+    download_station_report,
+    fetch_cheapest_stations,
+    fetch_stations_by_postal_code,
+    store_fuel_report,
+)
+from .services.fuel_snapshot import get_fuel_snapshot, load_fuel_snapshot
+from .services.http_client import HTTP_CLIENT
+from .services.maintenance_aggregates import apply_maintenance_event
+from .services.quote_cache import QUOTE_CACHE, cacheable, quote_key
+from .services.rate_tables import build_rate_tables
+from .services.station_snapshot import STATION_CACHE
+from .services.station_store import load_station_snapshot_from_db
+from .services.uncertainty import UncertaintyResult, simulate_trip
 
 app = FastAPI(title="Trip Cost API", version="0.1.0")
 
@@ -44,9 +78,36 @@ def get_db() -> Session:
         db.close()
 
 
+def get_read_db() -> Session:
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db() -> AsyncSession:
+    async with async_read_sessions()() as db:
+        yield db
+
+
 @app.on_event("startup")
 def startup() -> None:
     init_db()
+    with SessionLocal() as session:
+        load_fuel_snapshot(session)
+        build_rate_tables(session)
+        ensure_catalog_fts(session)
+        load_catalog_suggest(session)
+        stations = load_station_snapshot_from_db(session)
+        if stations:
+            STATION_CACHE.publish(stations)
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await HTTP_CLIENT.aclose()
+    await close_async_engines()
 
 
 @app.get("/api/health")
@@ -55,13 +116,9 @@ def health() -> dict[str, str]:
 
 
 @app.get("/api/fuel-prices/latest", response_model=FuelPriceResponse)
-def latest_fuel_prices(db: Session = Depends(get_db)) -> FuelPriceResponse:
-    items = (
-        db.query(FuelPrice)
-        .order_by(FuelPrice.fetched_at.desc())
-        .limit(10)
-        .all()
-    )
+def latest_fuel_prices(db: Session = Depends(get_read_db)) -> FuelPriceResponse:
+    snapshot = get_fuel_snapshot(db)
+    items = sorted(snapshot.prices.values(), key=lambda item: item.fetched_at, reverse=True)
     if not items:
         raise HTTPException(status_code=404, detail="No fuel prices found. Run refresh first.")
     return FuelPriceResponse(
@@ -80,7 +137,7 @@ def latest_fuel_prices(db: Session = Depends(get_db)) -> FuelPriceResponse:
 
 
 @app.get("/api/vehicles", response_model=list[VehicleResponse])
-def list_vehicles(db: Session = Depends(get_db)) -> list[VehicleResponse]:
+def list_vehicles(db: Session = Depends(get_read_db)) -> list[VehicleResponse]:
     vehicles = db.query(UserVehicle).order_by(UserVehicle.id.asc()).all()
     return [
         VehicleResponse(
@@ -128,18 +185,10 @@ def create_vehicle(payload: VehicleCreate, db: Session = Depends(get_db)) -> Veh
 
 
 @app.get("/api/catalog/vehicles", response_model=list[CatalogVehicleResponse])
-def search_catalog(query: str = "", limit: int = 20, db: Session = Depends(get_db)) -> list[CatalogVehicleResponse]:
-    stmt = db.query(VehicleCatalog)
-    if query:
-        like = f"%{query.lower()}%"
-        stmt = stmt.filter(
-            or_(
-                VehicleCatalog.brand.ilike(like),
-                VehicleCatalog.model.ilike(like),
-                VehicleCatalog.variant.ilike(like),
-            )
-        )
-    results = stmt.order_by(VehicleCatalog.brand.asc()).limit(limit).all()
+async def search_catalog(
+    query: str = "", limit: int = 20, db: AsyncSession = Depends(get_async_read_db)
+) -> list[CatalogVehicleResponse]:
+    results = await db.run_sync(find_catalog_vehicles, query, limit)
     return [
         CatalogVehicleResponse(
             id=item.id,
@@ -161,8 +210,33 @@ def search_catalog(query: str = "", limit: int = 20, db: Session = Depends(get_d
     ]
 
 
+@app.get("/api/catalog/suggest", response_model=CatalogSuggestResponse)
+def suggest_catalog(prefix: str, limit: int = 10, db: Session = Depends(get_read_db)) -> CatalogSuggestResponse:
+    suggestions = get_catalog_suggest(db).suggest(prefix, limit=max(1, min(limit, 50)))
+    return CatalogSuggestResponse(
+        prefix=prefix,
+        suggestions=[
+            {"label": item.label, "brand": item.brand, "model": item.model, "variants": item.variants}
+            for item in suggestions
+        ],
+    )
+
+
+@app.get("/api/catalog/suggest/stats", response_model=CatalogSuggestStatsResponse)
+def suggest_catalog_stats(db: Session = Depends(get_read_db)) -> CatalogSuggestStatsResponse:
+    stats = get_catalog_suggest(db).stats
+    return CatalogSuggestStatsResponse(
+        rows=stats.rows,
+        groups=stats.groups,
+        tokens=stats.tokens,
+        memory_bytes=stats.memory_bytes,
+        bytes_per_row=stats.bytes_per_row,
+        load_ms=stats.load_ms,
+    )
+
+
 @app.get("/api/maintenance-events", response_model=list[MaintenanceEventResponse])
-def list_maintenance_events(vehicle_id: int, db: Session = Depends(get_db)) -> list[MaintenanceEventResponse]:
+def list_maintenance_events(vehicle_id: int, db: Session = Depends(get_read_db)) -> list[MaintenanceEventResponse]:
     events = (
         db.query(MaintenanceEvent)
         .filter(MaintenanceEvent.vehicle_id == vehicle_id)
@@ -188,6 +262,8 @@ def list_maintenance_events(vehicle_id: int, db: Session = Depends(get_db)) -> l
 def create_maintenance_event(payload: MaintenanceEventCreate, db: Session = Depends(get_db)) -> MaintenanceEventResponse:
     event = MaintenanceEvent(**payload.model_dump())
     db.add(event)
+    db.flush()
+    apply_maintenance_event(db, event)
     db.commit()
     db.refresh(event)
     return MaintenanceEventResponse(
@@ -203,7 +279,7 @@ def create_maintenance_event(payload: MaintenanceEventCreate, db: Session = Depe
 
 
 @app.get("/api/insurance-policies", response_model=list[InsuranceResponse])
-def list_insurance(vehicle_id: int, db: Session = Depends(get_db)) -> list[InsuranceResponse]:
+def list_insurance(vehicle_id: int, db: Session = Depends(get_read_db)) -> list[InsuranceResponse]:
     policies = (
         db.query(InsurancePolicy)
         .filter(InsurancePolicy.vehicle_id == vehicle_id)
@@ -242,37 +318,48 @@ def create_insurance(payload: InsuranceCreate, db: Session = Depends(get_db)) ->
 
 
 @app.post("/api/fuel-prices/refresh")
-def refresh_fuel_prices(db: Session = Depends(get_db)) -> dict[str, str]:
+async def refresh_fuel_prices(db: Session = Depends(get_db)) -> dict[str, object]:
     try:
-        fetch_and_store_fuel_prices(db)
+        report = await download_station_report()
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
-    return {"status": "ok", "time": datetime.utcnow().isoformat()}
+    report = await run_in_threadpool(store_fuel_report, db, report)
+    return {
+        "status": "ok",
+        "time": datetime.utcnow().isoformat(),
+        "stations": report.stations,
+        "parse_ms": round(report.parse_seconds * 1000, 1),
+        "download_ms": round(report.download_seconds * 1000, 1),
+        "aggregate_ms": round(report.aggregate_seconds * 1000, 1),
+        "peak_rss_delta_mb": report.peak_rss_delta_mb,
+        "retries": report.retries,
+        "stations_written": report.stations_written,
+        "prices_written": report.prices_written,
+        "aggregates_written": report.aggregates_written,
+    }
 
 
 @app.get("/api/fuel-prices/nearby", response_model=FuelNearbyResponse)
-def fuel_prices_nearby(postal_code: str) -> FuelNearbyResponse:
+async def fuel_prices_nearby(postal_code: str) -> FuelNearbyResponse:
     if not postal_code or len(postal_code.strip()) < 4:
         raise HTTPException(status_code=400, detail="postal_code required")
     try:
-        payload = fetch_stations_by_postal_code(postal_code)
+        payload = await fetch_stations_by_postal_code(postal_code)
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
     return FuelNearbyResponse(**payload)
 
 
-@app.post("/api/calc/trip", response_model=TripCalcResponse)
-def calculate_trip(payload: TripCalcRequest, db: Session = Depends(get_db)) -> TripCalcResponse:
-    try:
-        energy = compute_energy(db, payload)
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
-
-    maintenance = compute_maintenance(db, payload, vehicle_id=payload.vehicle_id)
-    insurance = compute_insurance(payload)
-    depreciation = compute_depreciation(db, payload, vehicle_id=payload.vehicle_id)
+def _trip_response(
+    trip_km: float,
+    energy: EnergyResult,
+    maintenance: MaintenanceResult,
+    insurance: MaintenanceResult,
+    depreciation: DepreciationResult,
+    uncertainty: UncertaintyResult | None = None,
+) -> TripCalcResponse:
     total = energy.total_eur + maintenance.amount_eur + insurance.amount_eur + depreciation.amount_eur
-    per_km = total / payload.trip_km
+    per_km = total / trip_km
 
     return TripCalcResponse(
         total_eur=total,
@@ -303,5 +390,102 @@ def calculate_trip(payload: TripCalcRequest, db: Session = Depends(get_db)) -> T
             "source": depreciation.source,
             "assumptions": depreciation.assumptions,
         },
+        uncertainty=asdict(uncertainty) if uncertainty else None,
         generated_at=datetime.utcnow(),
     )
+
+
+@app.get("/api/fuel-prices/nearest", response_model=FuelNearestResponse)
+async def fuel_prices_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10.0, gt=0, le=200),
+    fuel: str = "gasoline",
+    limit: int = Query(10, ge=1, le=50),
+) -> FuelNearestResponse:
+    try:
+        payload = await fetch_cheapest_stations(lat, lon, radius_km, fuel, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return FuelNearestResponse(**payload)
+
+
+def quote_trip(context: CalcContext, payload: TripCalcRequest) -> TripCalcResponse:
+    """
+    Parte de CPU del calculo sobre un contexto ya cargado: cache, kernel, respuesta y Monte Carlo.
+    """
+
+    key = quote_key(context, payload) if QUOTE_CACHE.enabled and cacheable(payload) else None
+    if key is not None:
+        cached = QUOTE_CACHE.get(key)
+        if cached is not None:
+            return cached.model_copy(update={"generated_at": datetime.utcnow()})
+
+    try:
+        energy = compute_energy(context, payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    maintenance = compute_maintenance(context, payload)
+    insurance = compute_insurance(payload)
+    depreciation = compute_depreciation(context, payload)
+    uncertainty = None
+    if payload.uncertainty:
+        uncertainty = simulate_trip(
+            context, payload, maintenance.amount_eur, insurance.amount_eur, depreciation.amount_eur
+        )
+    response = _trip_response(payload.trip_km, energy, maintenance, insurance, depreciation, uncertainty)
+    if key is not None:
+        QUOTE_CACHE.put(key, response)
+    return response
+
+
+def compute_trip(db: Session, payload: TripCalcRequest) -> TripCalcResponse:
+    # Unica fase de consultas: vehiculo guardado + agregado; precios y tarifas vienen de snapshots.
+    return quote_trip(load_calc_context(db, payload), payload)
+
+
+@app.post("/api/calc/trip", response_model=TripCalcResponse)
+async def calculate_trip(payload: TripCalcRequest, db: AsyncSession = Depends(get_async_read_db)) -> TripCalcResponse:
+    # run_sync ejecuta el codigo sincrono en el hilo del bucle de eventos (solo la E/S de aiosqlite sale
+    # de el), asi que por la sesion asincrona solo va la consulta del contexto. El calculo (pydantic,
+    # kernel y hasta 200k muestras del Monte Carlo) va al threadpool para no bloquear otras peticiones.
+    context = await db.run_sync(load_calc_context, payload)
+    return await run_in_threadpool(quote_trip, context, payload)
+
+
+@app.get("/api/calc/cache/stats", response_model=QuoteCacheStatsResponse)
+def quote_cache_stats() -> QuoteCacheStatsResponse:
+    stats = QUOTE_CACHE.stats()
+    return QuoteCacheStatsResponse(
+        size=stats.size,
+        max_entries=stats.max_entries,
+        ttl_seconds=stats.ttl_seconds,
+        hits=stats.hits,
+        misses=stats.misses,
+        evictions=stats.evictions,
+        expirations=stats.expirations,
+        hit_rate=stats.hit_rate,
+    )
+
+
+@app.post("/api/calc/trips:batch", response_model=TripBatchResponse)
+def calculate_trips(payload: TripBatchRequest, db: Session = Depends(get_read_db)) -> TripBatchResponse:
+    results = calculate_trips_batch(db, payload.items)
+    items = []
+    for index, (trip, result) in enumerate(zip(payload.items, results)):
+        if isinstance(result, str):
+            items.append(TripBatchItem(index=index, ok=False, error=result))
+            continue
+        items.append(
+            TripBatchItem(
+                index=index,
+                ok=True,
+                result=_trip_response(
+                    trip.trip_km, result.energy, result.maintenance, result.insurance, result.depreciation
+                ),
+            )
+        )
+    return TripBatchResponse(items=items, generated_at=datetime.utcnow())
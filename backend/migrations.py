@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Engine, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.engine import Connection
+
+from .db import Base
+
+# Registro de versiones aplicadas; va en su propio MetaData para que create_all no la toque.
+SCHEMA_MIGRATIONS = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+# Clave de pg_advisory_xact_lock: dos procesos que arrancan a la vez no migran en paralelo.
+PG_MIGRATION_LOCK = 4242018
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def add_column_if_missing(connection: Connection, table_name: str, column_name: str) -> bool:
+    """
+    Anade la columna tal y como esta declarada en `backend/models.py` (solo columnas nullable).
+    """
+
+    existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+    if column_name in existing:
+        return False
+    column = Base.metadata.tables[table_name].columns[column_name]
+    if not column.nullable:
+        raise RuntimeError(f"Cannot add NOT NULL column {table_name}.{column_name} without a default")
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+    return True
+
+
+def create_index_if_missing(connection: Connection, table_name: str, index_name: str) -> bool:
+    existing = {index["name"] for index in inspect(connection).get_indexes(table_name)}
+    if index_name in existing:
+        return False
+    index = next(item for item in Base.metadata.tables[table_name].indexes if item.name == index_name)
+    index.create(connection)
+    return True
+
+
+def drop_index_if_exists(connection: Connection, table_name: str, index_name: str) -> bool:
+    existing = {index["name"] for index in inspect(connection).get_indexes(table_name)}
+    if index_name not in existing:
+        return False
+    connection.execute(text(f"DROP INDEX {index_name}"))
+    return True
+
+
+def _legacy_columns(connection: Connection) -> None:
+    # Columnas que antes exigian borrar data/app.db: datos del vehiculo y sincronizacion del catalogo.
+    for column_name in (
+        "current_km",
+        "annual_km",
+        "market_value_eur",
+        "consumption_l_per_100km",
+        "consumption_kwh_per_100km",
+        "phev_electric_share",
+        "catalog_vehicle_id",
+    ):
+        add_column_if_missing(connection, "user_vehicles", column_name)
+    for column_name in ("content_hash", "deleted_at"):
+        add_column_if_missing(connection, "vehicle_catalog", column_name)
+
+
+def _hot_query_indexes(connection: Connection) -> None:
+    create_index_if_missing(connection, "fuel_prices", "ix_fuel_prices_fuel_type_fetched_at")
+    # Ya no esta en los modelos (la migracion 3 lo sustituye); se deja tal cual se publico.
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_maintenance_events_vehicle_id ON maintenance_events (vehicle_id)")
+    )
+    create_index_if_missing(connection, "depreciation_models", "ix_depreciation_models_powertrain_segment")
+
+
+def _list_and_history_indexes(connection: Connection) -> None:
+    # (vehicle_id, fecha) sirve el filtro y el ORDER BY de los listados; sustituye al indice solo por vehicle_id.
+    drop_index_if_exists(connection, "maintenance_events", "ix_maintenance_events_vehicle_id")
+    create_index_if_missing(connection, "maintenance_events", "ix_maintenance_events_vehicle_date")
+    create_index_if_missing(connection, "insurance_policies", "ix_insurance_policies_vehicle_created")
+    create_index_if_missing(connection, "fuel_station_prices", "ix_fuel_station_prices_fetched_at")
+
+
+def _data_versions(connection: Connection) -> None:
+    Base.metadata.tables["data_versions"].create(connection, checkfirst=True)
+
+
+def _station_price_removals(connection: Connection) -> None:
+    # Precio NULL = combustible retirado. SQLite no cambia la nulabilidad con ALTER: se reconstruye la tabla.
+    columns = {column["name"]: column for column in inspect(connection).get_columns("fuel_station_prices")}
+    if not columns["price_eur_per_unit"]["nullable"]:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("ALTER TABLE fuel_station_prices ALTER COLUMN price_eur_per_unit DROP NOT NULL"))
+        else:
+            for index in inspect(connection).get_indexes("fuel_station_prices"):
+                connection.execute(text(f"DROP INDEX {index['name']}"))
+            connection.execute(text("ALTER TABLE fuel_station_prices RENAME TO fuel_station_prices_old"))
+            Base.metadata.tables["fuel_station_prices"].create(connection)
+            names = ", ".join(columns)
+            connection.execute(
+                text(f"INSERT INTO fuel_station_prices ({names}) SELECT {names} FROM fuel_station_prices_old")
+            )
+            connection.execute(text("DROP TABLE fuel_station_prices_old"))
+    create_index_if_missing(connection, "fuel_stations", "ix_fuel_stations_updated_at")
+
+
+# Solo se anaden al final; cada paso es idempotente porque en una base nueva create_all ya creo el esquema.
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "legacy user_vehicles and vehicle_catalog columns", _legacy_columns),
+    Migration(2, "indexes for fuel price, maintenance and depreciation lookups", _hot_query_indexes),
+    Migration(3, "composite indexes for vehicle listings and station price history", _list_and_history_indexes),
+    Migration(4, "data_versions table for reloading in-memory tables after imports", _data_versions),
+    Migration(5, "nullable station prices for removed fuels and station refresh time index", _station_price_removals),
+)
+
+
+def applied_versions(connection: Connection) -> set[int]:
+    if not inspect(connection).has_table(SCHEMA_MIGRATIONS.name):
+        return set()
+    return set(connection.scalars(select(SCHEMA_MIGRATIONS.c.version)))
+
+
+def run_migrations(engine: Engine) -> list[Migration]:
+    """
+    Aplica en orden las migraciones pendientes, todas en una transaccion. Devuelve las aplicadas.
+    """
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_MIGRATION_LOCK})
+        SCHEMA_MIGRATIONS.create(connection, checkfirst=True)
+        done = applied_versions(connection)
+        pending = [migration for migration in MIGRATIONS if migration.version not in done]
+        for migration in pending:
+            migration.upgrade(connection)
+            connection.execute(
+                insert(SCHEMA_MIGRATIONS).values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+                )
+            )
+    return pending
+
+
+def main() -> None:
+    from .db import ENGINE, init_db
+
+    init_db()
+    with ENGINE.connect() as connection:
+        done = applied_versions(connection)
+    print(f"Database: {ENGINE.url.render_as_string(hide_password=True)}")
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version in done else "pending"
+        print(f"  {migration.version:>3} {state:<8} {migration.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, date
 
-from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -44,6 +44,7 @@ class UserVehicle(Base):
 
 class FuelPrice(Base):
     __tablename__ = "fuel_prices"
+    __table_args__ = (Index("ix_fuel_prices_fuel_type_fetched_at", "fuel_type", "fetched_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     fuel_type: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -53,8 +54,57 @@ class FuelPrice(Base):
     fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class FuelStation(Base):
+    __tablename__ = "fuel_stations"
+
+    id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    label: Mapped[str | None] = mapped_column(String(120))
+    address: Mapped[str | None] = mapped_column(String(200))
+    postal_code: Mapped[str | None] = mapped_column(String(10), index=True)
+    municipality: Mapped[str | None] = mapped_column(String(120), index=True)
+    province: Mapped[str | None] = mapped_column(String(80), index=True)
+    schedule: Mapped[str | None] = mapped_column(String(200))
+    latitude: Mapped[float | None] = mapped_column(Float)
+    longitude: Mapped[float | None] = mapped_column(Float)
+    # Hora de la ultima carga que trajo la estacion: las que no tienen la mas reciente ya no existen.
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class FuelStationPrice(Base):
+    __tablename__ = "fuel_station_prices"
+    __table_args__ = (
+        Index("ix_fuel_station_prices_station_fuel_time", "station_id", "fuel", "fetched_at"),
+        Index("ix_fuel_station_prices_fetched_at", "fetched_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    station_id: Mapped[str] = mapped_column(ForeignKey("fuel_stations.id"), nullable=False)
+    fuel: Mapped[str] = mapped_column(String(40), nullable=False)
+    # NULL marca que la estacion dejo de vender ese combustible (o desaparecio) en esa carga.
+    price_eur_per_unit: Mapped[float | None] = mapped_column(Float)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class FuelPriceAggregate(Base):
+    __tablename__ = "fuel_price_aggregates"
+    __table_args__ = (Index("ix_fuel_price_aggregates_region", "level", "province", "municipality", "fuel"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    level: Mapped[str] = mapped_column(String(20), nullable=False)
+    province: Mapped[str | None] = mapped_column(String(80))
+    municipality: Mapped[str | None] = mapped_column(String(120))
+    fuel: Mapped[str] = mapped_column(String(40), nullable=False)
+    station_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    mean: Mapped[float] = mapped_column(Float, nullable=False)
+    median: Mapped[float] = mapped_column(Float, nullable=False)
+    p10: Mapped[float] = mapped_column(Float, nullable=False)
+    p90: Mapped[float] = mapped_column(Float, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class InsurancePolicy(Base):
     __tablename__ = "insurance_policies"
+    __table_args__ = (Index("ix_insurance_policies_vehicle_created", "vehicle_id", "created_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -70,6 +120,7 @@ class InsurancePolicy(Base):
 
 class MaintenanceEvent(Base):
     __tablename__ = "maintenance_events"
+    __table_args__ = (Index("ix_maintenance_events_vehicle_date", "vehicle_id", "event_date"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     vehicle_id: Mapped[int] = mapped_column(ForeignKey("user_vehicles.id"), nullable=False)
@@ -83,6 +134,18 @@ class MaintenanceEvent(Base):
     vehicle: Mapped["UserVehicle"] = relationship(back_populates="maintenance_events")
 
 
+class VehicleMaintenanceAggregate(Base):
+    __tablename__ = "vehicle_maintenance_aggregates"
+
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("user_vehicles.id"), primary_key=True)
+    total_cost_eur: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    odometer_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    min_odometer_km: Mapped[float | None] = mapped_column(Float)
+    max_odometer_km: Mapped[float | None] = mapped_column(Float)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class MaintenanceTemplate(Base):
     __tablename__ = "maintenance_templates"
 
@@ -97,6 +160,7 @@ class MaintenanceTemplate(Base):
 
 class DepreciationModel(Base):
     __tablename__ = "depreciation_models"
+    __table_args__ = (Index("ix_depreciation_models_powertrain_segment", "powertrain_type", "segment"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     powertrain_type: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -125,3 +189,13 @@ class VehicleCatalog(Base):
     emissions_max: Mapped[float | None] = mapped_column(Float)
     source: Mapped[str] = mapped_column(String(40), default="idae")
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    content_hash: Mapped[str | None] = mapped_column(String(40))
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name: Mapped[str] = mapped_column(String(40), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import date, datetime
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 FuelType = Literal["gasoline", "diesel", "electric"]
@@ -51,6 +51,21 @@ class FuelNearbyResponse(BaseModel):
     fetched_at: Optional[datetime] = None
 
 
+class NearestStationItem(StationItem):
+    price_eur_per_unit: float
+    distance_km: float
+
+
+class FuelNearestResponse(BaseModel):
+    latitude: float
+    longitude: float
+    radius_km: float
+    fuel: str
+    stations: list[NearestStationItem]
+    source: str
+    fetched_at: Optional[datetime] = None
+
+
 class VehicleInput(BaseModel):
     powertrain_type: PowertrainType
     consumption_l_per_100km: Optional[float] = None
@@ -103,6 +118,38 @@ class CatalogVehicleResponse(BaseModel):
     source: Optional[str] = None
 
 
+class CatalogSuggestion(BaseModel):
+    label: str
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    variants: int
+
+
+class CatalogSuggestResponse(BaseModel):
+    prefix: str
+    suggestions: list[CatalogSuggestion]
+
+
+class CatalogSuggestStatsResponse(BaseModel):
+    rows: int
+    groups: int
+    tokens: int
+    memory_bytes: int
+    bytes_per_row: float
+    load_ms: float
+
+
+class QuoteCacheStatsResponse(BaseModel):
+    size: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+
 class InsuranceInput(BaseModel):
     cost_amount: float
     cost_period: Literal["annual", "monthly"]
@@ -143,15 +190,23 @@ class MaintenanceEventResponse(MaintenanceEventCreate):
     id: int
 
 
+class UncertaintyInput(BaseModel):
+    samples: int = Field(20000, ge=1000, le=200000)
+    seed: Optional[int] = None
+
+
 class TripCalcRequest(BaseModel):
     trip_km: float
     trip_days: int
     route_type: RouteType = "mixed"
     vehicle_id: Optional[int] = None
     vehicle: VehicleInput
+    province: Optional[str] = None
+    municipality: Optional[str] = None
     electricity_price_eur_per_kwh: Optional[float] = None
     insurance: Optional[InsuranceInput] = None
     maintenance: MaintenanceInput = MaintenanceInput()
+    uncertainty: Optional[UncertaintyInput] = None
 
 
 class ComponentBreakdown(BaseModel):
@@ -177,6 +232,22 @@ class DepreciationBreakdown(BaseModel):
     assumptions: list[str]
 
 
+class PercentileRange(BaseModel):
+    p5: float
+    p50: float
+    p95: float
+
+
+class UncertaintyBreakdown(BaseModel):
+    samples: int
+    energy: PercentileRange
+    maintenance: PercentileRange
+    insurance: PercentileRange
+    depreciation: PercentileRange
+    total: PercentileRange
+    assumptions: list[str]
+
+
 class TripCalcResponse(BaseModel):
     total_eur: float
     per_km_eur: float
@@ -184,4 +255,32 @@ class TripCalcResponse(BaseModel):
     maintenance: ComponentBreakdown
     insurance: ComponentBreakdown
     depreciation: DepreciationBreakdown
+    uncertainty: Optional[UncertaintyBreakdown] = None
+    generated_at: datetime
+
+
+class TripBatchRequest(BaseModel):
+    items: list[TripCalcRequest]
+
+    @field_validator("items")
+    @classmethod
+    def no_uncertainty(cls, items: list[TripCalcRequest]) -> list[TripCalcRequest]:
+        # El lote solo calcula el valor puntual; mejor un 422 que ignorar la opcion en silencio.
+        positions = [index for index, item in enumerate(items) if item.uncertainty is not None]
+        if positions:
+            raise ValueError(
+                f"uncertainty is not supported in batch items (items {positions}); use POST /api/calc/trip"
+            )
+        return items
+
+
+class TripBatchItem(BaseModel):
+    index: int
+    ok: bool
+    result: Optional[TripCalcResponse] = None
+    error: Optional[str] = None
+
+
+class TripBatchResponse(BaseModel):
+    items: list[TripBatchItem]
     generated_at: datetime
@@ -4,6 +4,8 @@ from datetime import date
 
 from backend.db import SessionLocal, init_db
 from backend.models import DepreciationModel, FuelPrice, MaintenanceEvent, MaintenanceTemplate, User, UserVehicle
+from backend.services.maintenance_aggregates import rebuild_maintenance_aggregates
+from backend.services.data_versions import FUEL_PRICES, RATE_TABLES, bump_data_version
 
 
 def main() -> None:
@@ -50,8 +52,12 @@ def main() -> None:
                         ),
                     ]
                 )
+                session.flush()
+                rebuild_maintenance_aggregates(session, [vehicle.id])
 
+        rates_changed = False
         if not session.query(MaintenanceTemplate).first():
+            rates_changed = True
             templates = [
                 MaintenanceTemplate(
                     powertrain_type="gasoline",
@@ -85,6 +91,7 @@ def main() -> None:
             session.add_all(templates)
 
         if not session.query(DepreciationModel).first():
+            rates_changed = True
             session.add_all(
                 [
                     DepreciationModel(
@@ -123,7 +130,10 @@ def main() -> None:
                     ),
                 ]
             )
+            bump_data_version(session, FUEL_PRICES)
 
+        if rates_changed:
+            bump_data_version(session, RATE_TABLES)
         session.commit()
     print("Seeded database with demo data.")
 
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import UserVehicle, VehicleMaintenanceAggregate
+from ..schemas import TripCalcRequest
+from .calc import (
+    CalcContext,
+    DepreciationResult,
+    EnergyResult,
+    MaintenanceResult,
+    compute_insurance,
+    compute_maintenance,
+    depreciation_notes,
+    energy_detail,
+    energy_notes,
+    fuel_price_for,
+    vehicle_params,
+)
+from .fuel_snapshot import FuelPriceSnapshot, get_fuel_snapshot
+from .kernel import (
+    ROUTE_MULTIPLIERS,
+    check_energy_inputs,
+    depreciation_cost_arrays,
+    electric_share,
+    energy_cost_arrays,
+    life_km,
+    vehicle_age_years,
+)
+from .rate_tables import RateTables, get_rate_tables
+
+
+@dataclass
+class TripResult:
+    energy: EnergyResult
+    maintenance: MaintenanceResult
+    insurance: MaintenanceResult
+    depreciation: DepreciationResult
+
+
+@dataclass
+class _SharedInputs:
+    fuel: FuelPriceSnapshot
+    vehicles: dict[int, UserVehicle]
+    aggregates: dict[int, VehicleMaintenanceAggregate]
+    rates: RateTables
+
+
+def _load_shared_inputs(session: Session, items: list[TripCalcRequest]) -> _SharedInputs:
+    fuel = get_fuel_snapshot(session)
+
+    vehicle_ids = {item.vehicle_id for item in items if item.vehicle_id}
+    vehicles: dict[int, UserVehicle] = {}
+    aggregates: dict[int, VehicleMaintenanceAggregate] = {}
+    if vehicle_ids:
+        rows = session.execute(select(UserVehicle).where(UserVehicle.id.in_(vehicle_ids))).scalars()
+        vehicles = {vehicle.id: vehicle for vehicle in rows}
+        real_cost_ids = {
+            item.vehicle_id
+            for item in items
+            if item.vehicle_id and item.maintenance.use_real_costs and not item.maintenance.force_estimates
+        }
+        if real_cost_ids:
+            stmt = select(VehicleMaintenanceAggregate).where(VehicleMaintenanceAggregate.vehicle_id.in_(real_cost_ids))
+            aggregates = {row.vehicle_id: row for row in session.execute(stmt).scalars()}
+
+    rates = get_rate_tables(session)
+
+    return _SharedInputs(
+        fuel=fuel,
+        vehicles=vehicles,
+        aggregates=aggregates,
+        rates=rates,
+    )
+
+
+def calculate_trips_batch(session: Session, items: list[TripCalcRequest]) -> list[TripResult | str]:
+    """
+    Calcula N viajes con una sola carga de datos compartidos.
+
+    La resolucion y validacion de entradas es un bucle Python por item con las mismas funciones de
+    `calc.py` que /trip (vehiculo, mantenimiento y seguro incluidos); solo la aritmetica final de
+    energia y depreciacion va vectorizada, con las versiones `*_arrays` del kernel.
+    Sin modo incertidumbre: `TripBatchRequest` rechaza items con `uncertainty`.
+    Devuelve, en el mismo orden que la entrada, un TripResult o el mensaje de error del item.
+    """
+
+    size = len(items)
+    if size == 0:
+        return []
+    shared = _load_shared_inputs(session, items)
+    now_year = datetime.utcnow().year
+
+    errors: list[str | None] = [None] * size
+    energy_meta: list[tuple[str, list[str], str]] = [("", [], "")] * size
+    maintenance: list[MaintenanceResult | None] = [None] * size
+    insurance: list[MaintenanceResult | None] = [None] * size
+    depreciation_meta: list[list[str]] = [[]] * size
+
+    trip_km = np.ones(size)
+    route = np.ones(size)
+    l_per_100 = np.zeros(size)
+    kwh_per_100 = np.zeros(size)
+    share = np.zeros(size)
+    fuel_price = np.zeros(size)
+    electricity_price = np.zeros(size)
+    base_value = np.zeros(size)
+    annual_rate = np.zeros(size)
+    km_rate = np.zeros(size)
+    min_residual = np.zeros(size)
+    years = np.zeros(size)
+    current_km = np.zeros(size)
+    total_life_km = np.ones(size)
+    market_value = np.full(size, np.nan)
+
+    for index, payload in enumerate(items):
+        if payload.trip_km <= 0:
+            errors[index] = "trip_km must be positive"
+            continue
+        vehicle_id = payload.vehicle_id
+        context = CalcContext(
+            fuel=shared.fuel,
+            rates=shared.rates,
+            year=now_year,
+            vehicle=shared.vehicles.get(vehicle_id) if vehicle_id else None,
+            aggregate=shared.aggregates.get(vehicle_id) if vehicle_id else None,
+        )
+        vehicle, assumptions = vehicle_params(context, payload)
+        powertrain = vehicle.powertrain_type
+        price = fuel_price_for(context, payload, powertrain)
+        try:
+            check_energy_inputs(
+                vehicle, price.price_eur_per_unit if price else None, payload.electricity_price_eur_per_kwh
+            )
+        except ValueError as exc:
+            errors[index] = str(exc)
+            continue
+
+        multiplier = ROUTE_MULTIPLIERS.get(payload.route_type, 1.0)
+        source = energy_notes(powertrain, price, multiplier, assumptions)
+        energy_meta[index] = (powertrain, assumptions, source)
+        trip_km[index] = payload.trip_km
+        route[index] = multiplier
+        l_per_100[index] = vehicle.consumption_l_per_100km or 0.0
+        kwh_per_100[index] = vehicle.consumption_kwh_per_100km or 0.0
+        share[index] = electric_share(vehicle)
+        fuel_price[index] = price.price_eur_per_unit if price else 0.0
+        electricity_price[index] = payload.electricity_price_eur_per_kwh or 0.0
+
+        maintenance[index] = compute_maintenance(context, payload)
+        insurance[index] = compute_insurance(payload)
+
+        model = shared.rates.lookup(powertrain, payload.vehicle.segment or "generic").depreciation
+        base_value[index] = model.base_value_eur
+        annual_rate[index] = model.annual_rate
+        km_rate[index] = model.km_rate
+        min_residual[index] = model.min_residual_pct
+        years[index] = vehicle_age_years(vehicle, now_year)
+        current_km[index] = vehicle.current_km or 0
+        total_life_km[index] = life_km(vehicle)
+        if vehicle.market_value_eur:
+            market_value[index] = vehicle.market_value_eur
+        depreciation_meta[index] = depreciation_notes(model, vehicle.market_value_eur)
+
+    energy_total, liters, kwh = energy_cost_arrays(
+        trip_km, route, l_per_100, kwh_per_100, share, fuel_price, electricity_price
+    )
+    depreciation_per_km, residual_value = depreciation_cost_arrays(
+        base_value, annual_rate, km_rate, min_residual, years, current_km, total_life_km, market_value
+    )
+    depreciation_amount = depreciation_per_km * trip_km
+
+    results: list[TripResult | str] = []
+    for index in range(size):
+        if errors[index]:
+            results.append(errors[index])
+            continue
+        powertrain, energy_assumptions, energy_source = energy_meta[index]
+        results.append(
+            TripResult(
+                energy=EnergyResult(
+                    per_km_eur=float(energy_total[index] / trip_km[index]),
+                    total_eur=float(energy_total[index]),
+                    detail=energy_detail(powertrain, float(liters[index]), float(kwh[index])),
+                    source=energy_source,
+                    assumptions=energy_assumptions,
+                ),
+                maintenance=maintenance[index],
+                insurance=insurance[index],
+                depreciation=DepreciationResult(
+                    per_km_eur=float(depreciation_per_km[index]),
+                    amount_eur=float(depreciation_amount[index]),
+                    residual_value_eur=float(residual_value[index]),
+                    source="depreciation model",
+                    assumptions=depreciation_meta[index],
+                ),
+            )
+        )
+    return results
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, TypeVar
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+BULK_BATCH_SIZE = 5000
+# PRAGMAs de carga masiva para la conexion de la sesion; se restauran al salir.
+# synchronous=OFF solo arriesga la propia carga ante un corte de luz, no la de otras conexiones.
+LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-65536",  # 64 MiB
+}
+
+T = TypeVar("T")
+
+
+def batched(items: Iterable[T], size: int = BULK_BATCH_SIZE) -> Iterator[list[T]]:
+    """
+    Trocea un iterable en listas de `size` elementos sin materializarlo entero.
+    """
+
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def dialect_insert(session: Session, table):
+    """
+    INSERT del dialecto de la sesion, con `on_conflict_do_update` (SQLite y PostgreSQL).
+    """
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    else:
+        raise RuntimeError(f"Upsert not supported for {dialect}")
+    return upsert_insert(table)
+
+
+@dataclass
+class BulkLoadReport:
+    table: str
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return f"{self.rows} rows into {self.table} in {self.seconds:.2f}s ({self.rows_per_s:,.0f} rows/s)"
+
+
+@contextmanager
+def sqlite_load_pragmas(session: Session) -> Iterator[None]:
+    """
+    Aplica LOAD_PRAGMAS a la conexion de la sesion durante la carga (no hace nada fuera de SQLite).
+
+    El commit puede ir dentro del bloque: los valores previos se restauran directamente sobre la
+    conexion DBAPI a la que se aplicaron, aunque la sesion ya la haya devuelto al pool.
+    """
+
+    if session.get_bind().dialect.name != "sqlite":
+        yield
+        return
+    dbapi_connection = session.connection().connection.dbapi_connection
+    previous = {name: dbapi_connection.execute(f"PRAGMA {name}").fetchone()[0] for name in LOAD_PRAGMAS}
+    for name, value in LOAD_PRAGMAS.items():
+        dbapi_connection.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            dbapi_connection.execute(f"PRAGMA {name} = {value}")
+
+
+def bulk_insert(
+    session: Session, model: type, rows: Iterable[dict], *, batch_size: int = BULK_BATCH_SIZE
+) -> BulkLoadReport:
+    """
+    Inserta `rows` (dicts por columna) con executemany de Core en lotes, consumiendo el iterable en streaming.
+
+    No hace commit: toda la carga va en la transaccion de quien llama.
+    """
+
+    table = model.__table__
+    report = BulkLoadReport(table=table.name)
+    started = perf_counter()
+    statement = insert(table)
+    connection = session.connection()
+    for batch in batched(rows, batch_size):
+        connection.execute(statement, batch)
+        report.rows += len(batch)
+        report.batches += 1
+    report.seconds = perf_counter() - started
+    return report
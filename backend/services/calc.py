@@ -3,11 +3,24 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from ..models import DepreciationModel, FuelPrice, MaintenanceEvent, MaintenanceTemplate, UserVehicle
+from ..models import UserVehicle, VehicleCatalog, VehicleMaintenanceAggregate
 from ..schemas import TripCalcRequest
+from .fuel_snapshot import FuelPriceEntry, FuelPriceSnapshot, get_fuel_snapshot
+from .kernel import (
+    ROUTE_MULTIPLIERS,
+    DepreciationRates,
+    InsuranceParams,
+    VehicleParams,
+    depreciation_cost,
+    energy_cost,
+    insurance_cost,
+    maintenance_cost,
+)
+from .maintenance_aggregates import maintenance_rate_from_aggregate
+from .rate_tables import RateTables, get_rate_tables
 
 
 @dataclass
@@ -36,265 +49,243 @@ class EnergyResult:
     assumptions: list[str]
 
 
-def _latest_fuel_price(session: Session, fuel_type: str) -> FuelPrice | None:
-    stmt = select(FuelPrice).where(FuelPrice.fuel_type == fuel_type).order_by(FuelPrice.fetched_at.desc())
-    return session.execute(stmt).scalars().first()
+@dataclass(frozen=True)
+class CalcContext:
+    """
+    Datos que lee el calculo de un viaje, cargados de una vez por `load_calc_context`.
 
+    Precios y tarifas son los snapshots vigentes; el vehiculo guardado y su agregado de
+    mantenimiento salen de una sola consulta. Las funciones `compute_*` solo leen de aqui.
+    `consumption_range` (min y max del catalogo) solo se carga si se pide incertidumbre.
+    """
 
-def compute_energy(session: Session, payload: TripCalcRequest) -> EnergyResult:
-    vehicle = payload.vehicle
-    assumptions: list[str] = []
-    detail: dict[str, float] = {}
-    route_multiplier = {"city": 1.15, "mixed": 1.0, "highway": 0.9}.get(payload.route_type, 1.0)
+    fuel: FuelPriceSnapshot
+    rates: RateTables
+    year: int
+    vehicle: UserVehicle | None = None
+    aggregate: VehicleMaintenanceAggregate | None = None
+    consumption_range: tuple[float, float] | None = None
 
+
+def _consumption_range(consumption_min: float | None, consumption_max: float | None) -> tuple[float, float] | None:
+    if consumption_min is None or consumption_max is None or not 0 < consumption_min <= consumption_max:
+        return None
+    return consumption_min, consumption_max
+
+
+def load_calc_context(session: Session, payload: TripCalcRequest) -> CalcContext:
+    vehicle = aggregate = consumption_range = None
+    catalog_id = payload.vehicle.catalog_vehicle_id
     if payload.vehicle_id:
-        stored_vehicle = session.get(UserVehicle, payload.vehicle_id)
-        if stored_vehicle:
-            if vehicle.consumption_l_per_100km is None and stored_vehicle.consumption_l_per_100km:
-                vehicle.consumption_l_per_100km = stored_vehicle.consumption_l_per_100km
-                assumptions.append("consumption l/100km from saved vehicle")
-            if vehicle.consumption_kwh_per_100km is None and stored_vehicle.consumption_kwh_per_100km:
-                vehicle.consumption_kwh_per_100km = stored_vehicle.consumption_kwh_per_100km
-                assumptions.append("consumption kwh/100km from saved vehicle")
-            if vehicle.phev_electric_share is None and stored_vehicle.phev_electric_share:
-                vehicle.phev_electric_share = stored_vehicle.phev_electric_share
-                assumptions.append("PHEV share from saved vehicle")
-
-    if vehicle.powertrain_type in {"gasoline", "diesel"}:
-        fuel_type = "gasoline" if vehicle.powertrain_type == "gasoline" else "diesel"
-        price = _latest_fuel_price(session, fuel_type)
-        if not price:
-            raise ValueError(f"Missing fuel price for {fuel_type}")
-        if vehicle.consumption_l_per_100km is None:
-            raise ValueError("Missing consumption_l_per_100km")
-
-        liters = payload.trip_km * vehicle.consumption_l_per_100km * route_multiplier / 100
-        total = liters * price.price_eur_per_unit
-        detail[f"{fuel_type}_liters"] = liters
-        assumptions.append(f"price {price.price_eur_per_unit:.3f} eur/l from {price.source}")
-        assumptions.append(f"consumption in l/100km from user, route multiplier {route_multiplier}")
-        return EnergyResult(
-            per_km_eur=total / payload.trip_km,
-            total_eur=total,
-            detail=detail,
-            source=f"{price.source} ({price.fetched_at.date().isoformat()})",
-            assumptions=assumptions,
+        stmt = (
+            select(UserVehicle, VehicleMaintenanceAggregate)
+            .outerjoin(VehicleMaintenanceAggregate, VehicleMaintenanceAggregate.vehicle_id == UserVehicle.id)
+            .where(UserVehicle.id == payload.vehicle_id)
         )
+        if payload.uncertainty:
+            # El catalogo del vehiculo de la peticion o, si no trae, el del guardado; en la misma consulta.
+            stmt = stmt.add_columns(VehicleCatalog.consumption_min, VehicleCatalog.consumption_max).outerjoin(
+                VehicleCatalog, VehicleCatalog.id == func.coalesce(catalog_id, UserVehicle.catalog_vehicle_id)
+            )
+        row = session.execute(stmt).first()
+        if row is not None:
+            vehicle, aggregate = row[:2]
+            if payload.uncertainty:
+                consumption_range = _consumption_range(*row[2:])
+    elif payload.uncertainty and catalog_id:
+        stmt = select(VehicleCatalog.consumption_min, VehicleCatalog.consumption_max)
+        row = session.execute(stmt.where(VehicleCatalog.id == catalog_id)).first()
+        if row is not None:
+            consumption_range = _consumption_range(*row)
+    return CalcContext(
+        fuel=get_fuel_snapshot(session),
+        rates=get_rate_tables(session),
+        year=datetime.utcnow().year,
+        vehicle=vehicle,
+        aggregate=aggregate,
+        consumption_range=consumption_range,
+    )
 
-    if vehicle.powertrain_type == "bev":
-        if vehicle.consumption_kwh_per_100km is None:
-            raise ValueError("Missing consumption_kwh_per_100km")
-        if payload.electricity_price_eur_per_kwh is None:
-            raise ValueError("Missing electricity_price_eur_per_kwh")
-        kwh = payload.trip_km * vehicle.consumption_kwh_per_100km * route_multiplier / 100
-        total = kwh * payload.electricity_price_eur_per_kwh
-        detail["electric_kwh"] = kwh
-        assumptions.append("electricity price from user input")
-        assumptions.append(f"consumption in kwh/100km from user, route multiplier {route_multiplier}")
-        return EnergyResult(
-            per_km_eur=total / payload.trip_km,
-            total_eur=total,
-            detail=detail,
-            source="user input",
-            assumptions=assumptions,
-        )
 
-    if vehicle.powertrain_type == "phev":
-        if vehicle.consumption_kwh_per_100km is None or vehicle.consumption_l_per_100km is None:
-            raise ValueError("Missing PHEV consumption inputs")
-        if vehicle.phev_electric_share is None:
-            raise ValueError("Missing phev_electric_share")
-        if payload.electricity_price_eur_per_kwh is None:
-            raise ValueError("Missing electricity_price_eur_per_kwh")
-
-        electric_km = payload.trip_km * vehicle.phev_electric_share
-        fuel_km = payload.trip_km - electric_km
-        kwh = electric_km * vehicle.consumption_kwh_per_100km * route_multiplier / 100
-        fuel_liters = fuel_km * vehicle.consumption_l_per_100km * route_multiplier / 100
-
-        gasoline_price = _latest_fuel_price(session, "gasoline")
-        if not gasoline_price:
-            raise ValueError("Missing fuel price for gasoline")
-
-        total_electric = kwh * payload.electricity_price_eur_per_kwh
-        total_fuel = fuel_liters * gasoline_price.price_eur_per_unit
-        total = total_electric + total_fuel
-
-        detail["electric_kwh"] = kwh
-        detail["gasoline_liters"] = fuel_liters
-        assumptions.append(f"gasoline price {gasoline_price.price_eur_per_unit:.3f} eur/l from {gasoline_price.source}")
-        assumptions.append("electricity price from user input")
-        assumptions.append("PHEV share from user input")
-        assumptions.append(f"route multiplier {route_multiplier}")
-        return EnergyResult(
-            per_km_eur=total / payload.trip_km,
-            total_eur=total,
-            detail=detail,
-            source=f"{gasoline_price.source} + user input",
-            assumptions=assumptions,
-        )
+def vehicle_params(context: CalcContext, payload: TripCalcRequest) -> tuple[VehicleParams, list[str]]:
+    """
+    Vehiculo de la peticion con los huecos rellenados desde el vehiculo guardado (sin tocar `payload`).
+
+    Devuelve tambien los supuestos de energia que implica cada dato tomado del vehiculo guardado.
+    """
+
+    vehicle = payload.vehicle
+    consumption_l = vehicle.consumption_l_per_100km
+    consumption_kwh = vehicle.consumption_kwh_per_100km
+    electric_share = vehicle.phev_electric_share
+    market_value = vehicle.market_value_eur
+    assumptions: list[str] = []
+    stored_vehicle = context.vehicle
+    if stored_vehicle:
+        if consumption_l is None and stored_vehicle.consumption_l_per_100km:
+            consumption_l = stored_vehicle.consumption_l_per_100km
+            assumptions.append("consumption l/100km from saved vehicle")
+        if consumption_kwh is None and stored_vehicle.consumption_kwh_per_100km:
+            consumption_kwh = stored_vehicle.consumption_kwh_per_100km
+            assumptions.append("consumption kwh/100km from saved vehicle")
+        if electric_share is None and stored_vehicle.phev_electric_share:
+            electric_share = stored_vehicle.phev_electric_share
+            assumptions.append("PHEV share from saved vehicle")
+        if market_value is None and stored_vehicle.market_value_eur:
+            market_value = stored_vehicle.market_value_eur
+    params = VehicleParams(
+        powertrain_type=vehicle.powertrain_type,
+        consumption_l_per_100km=consumption_l,
+        consumption_kwh_per_100km=consumption_kwh,
+        phev_electric_share=electric_share,
+        market_value_eur=market_value,
+        year=vehicle.year,
+        current_km=vehicle.current_km,
+        annual_km=vehicle.annual_km,
+    )
+    return params, assumptions
+
 
-    raise ValueError("Unsupported powertrain type")
+def insurance_params(payload: TripCalcRequest) -> InsuranceParams | None:
+    insurance = payload.insurance
+    if not insurance:
+        return None
+    return InsuranceParams(
+        annual_cost_eur=insurance.cost_amount * (12 if insurance.cost_period == "monthly" else 1),
+        per_km=insurance.mode == "per_km",
+        annual_km=insurance.annual_km,
+    )
 
 
-def _maintenance_from_events(session: Session, vehicle_id: int | None, trip_km: float) -> MaintenanceResult | None:
-    if not vehicle_id:
+def fuel_price_for(context: CalcContext, payload: TripCalcRequest, powertrain: str) -> FuelPriceEntry | None:
+    if powertrain not in {"gasoline", "diesel", "phev"}:
         return None
-    events = (
-        session.execute(select(MaintenanceEvent).where(MaintenanceEvent.vehicle_id == vehicle_id))
-        .scalars()
-        .all()
+    fuel_type = "gasoline" if powertrain == "phev" else powertrain
+    return context.fuel.lookup(fuel_type, payload.province, payload.municipality)
+
+
+def energy_notes(powertrain: str, price: FuelPriceEntry | None, route_multiplier: float, assumptions: list[str]) -> str:
+    """
+    Anade a `assumptions` los supuestos de energia del powertrain y devuelve la fuente.
+    """
+
+    if powertrain in {"gasoline", "diesel"}:
+        assumptions.append(f"price {price.price_eur_per_unit:.3f} eur/l from {price.source}")
+        assumptions.append(f"consumption in l/100km from user, route multiplier {route_multiplier}")
+        return f"{price.source} ({price.fetched_at.date().isoformat()})"
+    if powertrain == "bev":
+        assumptions.append("electricity price from user input")
+        assumptions.append(f"consumption in kwh/100km from user, route multiplier {route_multiplier}")
+        return "user input"
+    assumptions.append(f"gasoline price {price.price_eur_per_unit:.3f} eur/l from {price.source}")
+    assumptions.append("electricity price from user input")
+    assumptions.append("PHEV share from user input")
+    assumptions.append(f"route multiplier {route_multiplier}")
+    return f"{price.source} + user input"
+
+
+def energy_detail(powertrain: str, fuel_liters: float, electric_kwh: float) -> dict[str, float]:
+    if powertrain in {"gasoline", "diesel"}:
+        return {f"{powertrain}_liters": fuel_liters}
+    if powertrain == "bev":
+        return {"electric_kwh": electric_kwh}
+    return {"electric_kwh": electric_kwh, "gasoline_liters": fuel_liters}
+
+
+def compute_energy(context: CalcContext, payload: TripCalcRequest) -> EnergyResult:
+    vehicle, assumptions = vehicle_params(context, payload)
+    powertrain = vehicle.powertrain_type
+    route_multiplier = ROUTE_MULTIPLIERS.get(payload.route_type, 1.0)
+    price = fuel_price_for(context, payload, powertrain)
+    cost = energy_cost(
+        vehicle,
+        payload.trip_km,
+        route_multiplier,
+        price.price_eur_per_unit if price else None,
+        payload.electricity_price_eur_per_kwh,
+    )
+    source = energy_notes(powertrain, price, route_multiplier, assumptions)
+    return EnergyResult(
+        per_km_eur=cost.per_km_eur,
+        total_eur=cost.total_eur,
+        detail=energy_detail(powertrain, cost.fuel_liters, cost.electric_kwh),
+        source=source,
+        assumptions=assumptions,
     )
-    if not events:
+
+
+def _maintenance_from_events(context: CalcContext, trip_km: float) -> MaintenanceResult | None:
+    if context.vehicle is None:
         return None
-    costs = sum(event.cost_eur for event in events)
-    odo_values = [event.odometer_km for event in events if event.odometer_km is not None]
-    if len(odo_values) >= 2:
-        distance = max(odo_values) - min(odo_values)
-    else:
-        vehicle = session.get(UserVehicle, vehicle_id)
-        distance = (vehicle.current_km or 0) - (min(odo_values) if odo_values else 0)
-    if distance <= 0:
+    per_km = maintenance_rate_from_aggregate(context.aggregate, context.vehicle.current_km)
+    if per_km is None:
         return None
-    per_km = costs / distance
+    cost = maintenance_cost(per_km, trip_km)
     return MaintenanceResult(
-        per_km_eur=per_km,
-        amount_eur=per_km * trip_km,
+        per_km_eur=cost.per_km_eur,
+        amount_eur=cost.amount_eur,
         source="user events",
         assumptions=["per km from maintenance event history"],
     )
 
 
-def _maintenance_from_templates(session: Session, powertrain_type: str, segment: str, trip_km: float) -> MaintenanceResult:
-    templates = (
-        session.execute(
-            select(MaintenanceTemplate).where(
-                MaintenanceTemplate.powertrain_type == powertrain_type,
-                MaintenanceTemplate.segment == segment,
-            )
-        )
-        .scalars()
-        .all()
-    )
-    if not templates:
-        templates = (
-            session.execute(
-                select(MaintenanceTemplate).where(MaintenanceTemplate.powertrain_type == powertrain_type)
-            )
-            .scalars()
-            .all()
-        )
-    per_km_total = 0.0
-    for item in templates:
-        if item.every_km and item.every_km > 0:
-            per_km_total += item.cost_eur / item.every_km
-        elif item.every_months and item.every_months > 0:
-            per_km_total += item.cost_eur / 15000
-    if per_km_total == 0:
-        per_km_total = 0.05
+def _maintenance_from_templates(context: CalcContext, powertrain_type: str, segment: str, trip_km: float) -> MaintenanceResult:
+    cost = maintenance_cost(context.rates.lookup(powertrain_type, segment).maintenance_per_km, trip_km)
     return MaintenanceResult(
-        per_km_eur=per_km_total,
-        amount_eur=per_km_total * trip_km,
+        per_km_eur=cost.per_km_eur,
+        amount_eur=cost.amount_eur,
         source="template estimates",
         assumptions=["templates by powertrain and segment"],
     )
 
 
-def compute_maintenance(session: Session, payload: TripCalcRequest, vehicle_id: int | None) -> MaintenanceResult:
+def compute_maintenance(context: CalcContext, payload: TripCalcRequest) -> MaintenanceResult:
     if payload.maintenance.use_real_costs and not payload.maintenance.force_estimates:
-        real = _maintenance_from_events(session, vehicle_id, payload.trip_km)
+        real = _maintenance_from_events(context, payload.trip_km)
         if real:
             return real
-    return _maintenance_from_templates(session, payload.vehicle.powertrain_type, payload.vehicle.segment or "generic", payload.trip_km)
+    return _maintenance_from_templates(context, payload.vehicle.powertrain_type, payload.vehicle.segment or "generic", payload.trip_km)
 
 
 def compute_insurance(payload: TripCalcRequest) -> MaintenanceResult:
-    if not payload.insurance:
+    insurance = insurance_params(payload)
+    if insurance is None:
         return MaintenanceResult(
             per_km_eur=0.0,
             amount_eur=0.0,
             source="not provided",
             assumptions=["insurance not provided"],
         )
-    insurance = payload.insurance
-    annual_cost = insurance.cost_amount * (12 if insurance.cost_period == "monthly" else 1)
-    per_day = annual_cost / 365
-    per_km = annual_cost / (insurance.annual_km or payload.vehicle.annual_km or 15000)
-    if insurance.mode == "per_km":
-        amount = per_km * payload.trip_km
-        mode_assumption = "insurance allocated per km"
-        per_km_value = per_km
-    else:
-        amount = per_day * payload.trip_days
-        mode_assumption = "insurance allocated per day"
-        per_km_value = amount / payload.trip_km
+    vehicle = VehicleParams(powertrain_type=payload.vehicle.powertrain_type, annual_km=payload.vehicle.annual_km)
+    cost = insurance_cost(insurance, vehicle, payload.trip_km, payload.trip_days)
+    mode_assumption = "insurance allocated per km" if insurance.per_km else "insurance allocated per day"
     return MaintenanceResult(
-        per_km_eur=per_km_value,
-        amount_eur=amount,
+        per_km_eur=cost.per_km_eur,
+        amount_eur=cost.amount_eur,
         source="user policy",
-        assumptions=[mode_assumption, f"annual cost {annual_cost:.2f} eur"],
+        assumptions=[mode_assumption, f"annual cost {insurance.annual_cost_eur:.2f} eur"],
     )
 
 
-def compute_depreciation(session: Session, payload: TripCalcRequest, vehicle_id: int | None) -> DepreciationResult:
-    vehicle = payload.vehicle
-    segment = vehicle.segment or "generic"
-    assumptions = [
-        "depreciation model",
-    ]
-    if payload.vehicle_id and vehicle.market_value_eur is None:
-        stored_vehicle = session.get(UserVehicle, payload.vehicle_id)
-        if stored_vehicle and stored_vehicle.market_value_eur:
-            vehicle.market_value_eur = stored_vehicle.market_value_eur
-    model = (
-        session.execute(
-            select(DepreciationModel).where(
-                DepreciationModel.powertrain_type == vehicle.powertrain_type,
-                DepreciationModel.segment == segment,
-            )
-        )
-        .scalars()
-        .first()
-    )
-    if not model:
-        model = (
-            session.execute(select(DepreciationModel).where(DepreciationModel.powertrain_type == vehicle.powertrain_type))
-            .scalars()
-            .first()
-        )
-    if not model:
-        model = DepreciationModel(
-            powertrain_type=vehicle.powertrain_type,
-            segment=segment,
-            base_value_eur=25000,
-            annual_rate=0.12,
-            km_rate=0.02,
-            min_residual_pct=0.2,
-        )
-    years = max(0, (datetime.utcnow().year - (vehicle.year or datetime.utcnow().year)))
-    current_km = vehicle.current_km or 0
-    value = model.base_value_eur * ((1 - model.annual_rate) ** years)
-    value *= (1 - model.km_rate) ** (current_km / 10000)
-    residual_floor = model.base_value_eur * model.min_residual_pct
-    residual_value = max(value, residual_floor)
-    total_life_km = max(vehicle.annual_km or 15000, 1) * 12
-    per_km = (model.base_value_eur - residual_floor) / total_life_km
-    amount = per_km * payload.trip_km
-    if vehicle.market_value_eur:
-        residual_value = vehicle.market_value_eur
-        residual_floor = min(residual_value, model.base_value_eur * model.min_residual_pct)
-        per_km = max((model.base_value_eur - residual_value) / total_life_km, 0)
-        amount = per_km * payload.trip_km
+def depreciation_notes(model: DepreciationRates, market_value_eur: float | None) -> list[str]:
+    assumptions = ["depreciation model"]
+    if market_value_eur:
         assumptions.append("market value provided by user")
+    return assumptions + [
+        f"annual_rate {model.annual_rate:.2f}",
+        f"km_rate {model.km_rate:.2f} per 10k km",
+        f"min_residual_pct {model.min_residual_pct:.2f}",
+    ]
+
+
+def compute_depreciation(context: CalcContext, payload: TripCalcRequest) -> DepreciationResult:
+    vehicle, _ = vehicle_params(context, payload)
+    model = context.rates.lookup(vehicle.powertrain_type, payload.vehicle.segment or "generic").depreciation
+    cost = depreciation_cost(vehicle, model, payload.trip_km, context.year)
     return DepreciationResult(
-        per_km_eur=per_km,
-        amount_eur=amount,
-        residual_value_eur=residual_value,
+        per_km_eur=cost.per_km_eur,
+        amount_eur=cost.amount_eur,
+        residual_value_eur=cost.residual_value_eur,
         source="depreciation model",
-        assumptions=assumptions
-        + [
-            f"annual_rate {model.annual_rate:.2f}",
-            f"km_rate {model.km_rate:.2f} per 10k km",
-            f"min_residual_pct {model.min_residual_pct:.2f}",
-        ],
+        assumptions=depreciation_notes(model, vehicle.market_value_eur),
     )
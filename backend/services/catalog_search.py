@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import bindparam, or_, text
+from sqlalchemy.orm import Session
+
+from ..models import VehicleCatalog
+
+CATALOG_FTS_TABLE = "vehicle_catalog_fts"
+CATALOG_PREFIX_TABLE = "vehicle_catalog_prefix"
+MIN_TRIGRAM_TOKEN = 3
+# Indice por subcadena (trigram) e indice por prefijo de palabra sin acentos para terminos cortos.
+_FTS_TABLES = {
+    CATALOG_FTS_TABLE: "tokenize='trigram'",
+    CATALOG_PREFIX_TABLE: "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'",
+}
+# Peso bm25 por columna (brand, model, variant): coincidir en marca/modelo pesa mas que en la variante.
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+# bm25 cuesta ~2us por fila: con terminos muy comunes solo se puntuan los primeros candidatos.
+MAX_RANKED_CANDIDATES = 2000
+FTS_SYNC_BATCH = 500
+# Por encima de tantas filas cambiadas sale mas barato reindexar todo que fila a fila.
+FTS_FULL_REINDEX_ROWS = 20000
+
+_FTS_READY: bool | None = None
+
+
+def _is_sqlite(session: Session) -> bool:
+    return session.get_bind().dialect.name == "sqlite"
+
+
+def _fts_exists(session: Session) -> bool:
+    rows = session.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (:fts, :prefix)"),
+        {"fts": CATALOG_FTS_TABLE, "prefix": CATALOG_PREFIX_TABLE},
+    ).all()
+    return len(rows) == len(_FTS_TABLES)
+
+
+def _reindex_all(session: Session) -> None:
+    for table in _FTS_TABLES:
+        session.execute(text(f"INSERT INTO {table}({table}) VALUES ('delete-all')"))
+        session.execute(
+            text(
+                f"INSERT INTO {table}(rowid, brand, model, variant) "
+                "SELECT id, brand, model, variant FROM vehicle_catalog WHERE deleted_at IS NULL"
+            )
+        )
+
+
+def rebuild_catalog_fts(session: Session) -> bool:
+    """
+    Crea (si faltan) y reconstruye los indices FTS5 sobre brand/model/variant.
+
+    Solo se indexan las filas vivas (sin `deleted_at`). Devuelve False si el motor no es SQLite
+    o no soporta FTS5, en cuyo caso la busqueda sigue usando ILIKE.
+    """
+
+    global _FTS_READY
+    if not _is_sqlite(session):
+        _FTS_READY = False
+        return False
+    try:
+        for table, options in _FTS_TABLES.items():
+            session.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                    f"brand, model, variant, content='vehicle_catalog', content_rowid='id', {options})"
+                )
+            )
+        _reindex_all(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        _FTS_READY = False
+        return False
+    _FTS_READY = True
+    return True
+
+
+def ensure_catalog_fts(session: Session) -> bool:
+    """
+    Deja el indice listo al arrancar: lo construye solo si aun no existe.
+    """
+
+    global _FTS_READY
+    if _is_sqlite(session) and _fts_exists(session):
+        _FTS_READY = True
+        return True
+    return rebuild_catalog_fts(session)
+
+
+def sync_catalog_fts(
+    session: Session,
+    removed: Iterable[tuple[int, str | None, str | None, str | None]],
+    added_ids: Iterable[int],
+) -> bool:
+    """
+    Aplica a los indices FTS5 solo las filas cambiadas, dentro de la transaccion de quien llama.
+
+    `removed` lleva (id, brand, model, variant) con los valores que estaban indexados; `added_ids`
+    se reindexan desde `vehicle_catalog` si siguen vivas. Devuelve False si no hay indice que mantener.
+    """
+
+    if not _is_sqlite(session) or not _fts_exists(session):
+        return False
+    added = list(added_ids)
+    if len(added) > FTS_FULL_REINDEX_ROWS:
+        _reindex_all(session)
+        return True
+    removed_rows = [
+        {"id": item_id, "brand": brand, "model": model, "variant": variant}
+        for item_id, brand, model, variant in removed
+    ]
+    for table in _FTS_TABLES:
+        if removed_rows:
+            session.execute(
+                text(
+                    f"INSERT INTO {table}({table}, rowid, brand, model, variant) "
+                    "VALUES ('delete', :id, :brand, :model, :variant)"
+                ),
+                removed_rows,
+            )
+        reindex = text(
+            f"INSERT INTO {table}(rowid, brand, model, variant) "
+            "SELECT id, brand, model, variant FROM vehicle_catalog WHERE id IN :ids AND deleted_at IS NULL"
+        ).bindparams(bindparam("ids", expanding=True))
+        for start in range(0, len(added), FTS_SYNC_BATCH):
+            session.execute(reindex, {"ids": added[start : start + FTS_SYNC_BATCH]})
+    return True
+
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+def _prefix_match(tokens: Iterable[str]) -> str:
+    return " ".join(_quote(token) + "*" for token in tokens)
+
+
+def _match_ids(session: Session, table: str, match: str, limit: int, prefix: str | None = None) -> list[int]:
+    """
+    Ids ordenados por bm25 en `table`; con `prefix`, solo los que ademas casan esos terminos por prefijo.
+    """
+
+    weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+    where = f"{table} MATCH :match"
+    params = {"match": match, "candidates": MAX_RANKED_CANDIDATES, "limit": limit}
+    if prefix:
+        where += (
+            f" AND rowid IN (SELECT rowid FROM {CATALOG_PREFIX_TABLE} WHERE {CATALOG_PREFIX_TABLE} MATCH :prefix)"
+        )
+        params["prefix"] = prefix
+    return [
+        row[0]
+        for row in session.execute(
+            text(
+                f"SELECT id FROM (SELECT rowid AS id, bm25({table}, {weights}) AS score FROM {table} "
+                f"WHERE {where} LIMIT :candidates) ORDER BY score LIMIT :limit"
+            ),
+            params,
+        )
+    ]
+
+
+def _search_ilike(session: Session, query: str, limit: int) -> list[VehicleCatalog]:
+    stmt = session.query(VehicleCatalog).filter(VehicleCatalog.deleted_at.is_(None))
+    if query:
+        like = f"%{query.lower()}%"
+        stmt = stmt.filter(
+            or_(
+                VehicleCatalog.brand.ilike(like),
+                VehicleCatalog.model.ilike(like),
+                VehicleCatalog.variant.ilike(like),
+            )
+        )
+    return stmt.order_by(VehicleCatalog.brand.asc()).limit(limit).all()
+
+
+def find_catalog_vehicles(session: Session, query: str, limit: int) -> list[VehicleCatalog]:
+    """
+    Busca en el catalogo ordenando por relevancia (bm25) cuando hay indice FTS5.
+
+    Los terminos de 3+ caracteres buscan por subcadena (trigram) y los mas cortos, que el trigram no
+    indexa, se exigen como prefijo de palabra en el indice unicode61 ("BRAND7 m1" solo da filas con
+    una palabra que empieza por "m1"). Si no hay resultados, o la consulta solo tiene terminos cortos,
+    toda la consulta va por prefijo de palabra ignorando acentos ("citroen" -> "CITROËN").
+    Motores sin FTS5 usan el ILIKE original.
+    """
+
+    query = query.strip()
+    if not query or not _FTS_READY:
+        return _search_ilike(session, query, limit)
+
+    tokens = query.split()
+    long_tokens = [token for token in tokens if len(token) >= MIN_TRIGRAM_TOKEN]
+    short_tokens = [token for token in tokens if len(token) < MIN_TRIGRAM_TOKEN]
+    ids: list[int] = []
+    if long_tokens:
+        match = " ".join(_quote(token) for token in long_tokens)
+        ids = _match_ids(session, CATALOG_FTS_TABLE, match, limit, _prefix_match(short_tokens))
+    if not ids:
+        ids = _match_ids(session, CATALOG_PREFIX_TABLE, _prefix_match(tokens), limit)
+    if not ids:
+        return []
+    rows = {
+        item.id: item
+        for item in session.query(VehicleCatalog).filter(VehicleCatalog.id.in_(ids), VehicleCatalog.deleted_at.is_(None))
+    }
+    return [rows[item_id] for item_id in ids if item_id in rows]
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import re
+import sys
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import VehicleCatalog
+from .data_versions import CATALOG, VersionCheck, read_data_version
+from .text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def _tokens(value: str | None) -> list[str]:
+    return [token for token in _TOKEN_SPLIT.split(normalize_text(value)) if token]
+
+
+@dataclass(frozen=True)
+class SuggestGroup:
+    brand: str | None
+    model: str | None
+    variants: int
+    brand_key: str
+    model_key: str
+
+    @property
+    def label(self) -> str:
+        return " ".join(part for part in (self.brand, self.model) if part)
+
+
+@dataclass(frozen=True)
+class SuggestStats:
+    rows: int
+    groups: int
+    tokens: int
+    memory_bytes: int
+    load_ms: float
+
+    @property
+    def bytes_per_row(self) -> float:
+        return self.memory_bytes / self.rows if self.rows else 0.0
+
+
+@dataclass(frozen=True)
+class SuggestIndex:
+    """
+    Autocompletado por prefijo sobre tokens normalizados de brand/model/variant.
+
+    `keys` es la lista ordenada de tokens y `postings[i]` los grupos (marca + modelo) que lo contienen;
+    un prefijo se resuelve con bisect sobre `keys` y un recorrido del rango contiguo.
+    """
+
+    keys: list[str] = field(default_factory=list)
+    postings: list[tuple[int, ...]] = field(default_factory=list)
+    groups: list[SuggestGroup] = field(default_factory=list)
+    stats: SuggestStats = SuggestStats(rows=0, groups=0, tokens=0, memory_bytes=0, load_ms=0.0)
+
+    def _prefix_groups(self, prefix: str) -> set[int]:
+        found: set[int] = set()
+        start = bisect_left(self.keys, prefix)
+        for position in range(start, len(self.keys)):
+            if not self.keys[position].startswith(prefix):
+                break
+            found.update(self.postings[position])
+        return found
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[SuggestGroup]:
+        terms = _tokens(prefix)
+        if not terms or not self.keys:
+            return []
+        candidates: set[int] | None = None
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._prefix_groups(term)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+        first = terms[0]
+
+        def rank(group_id: int) -> tuple[int, int, str]:
+            group = self.groups[group_id]
+            if group.brand_key.startswith(first):
+                position = 0
+            elif group.model_key.startswith(first):
+                position = 1
+            else:
+                position = 2
+            return position, -group.variants, group.brand_key + " " + group.model_key
+
+        return [self.groups[group_id] for group_id in sorted(candidates, key=rank)[:limit]]
+
+
+_INDEX = SuggestIndex()
+_LOCK = Lock()
+_CHECK = VersionCheck(CATALOG)
+
+
+def _memory_bytes(keys: list[str], postings: list[tuple[int, ...]], groups: list[SuggestGroup]) -> int:
+    total = sys.getsizeof(keys) + sys.getsizeof(postings) + sys.getsizeof(groups)
+    total += sum(sys.getsizeof(key) for key in keys)
+    total += sum(sys.getsizeof(posting) for posting in postings)
+    for group in groups:
+        total += sys.getsizeof(group) + sys.getsizeof(group.brand_key) + sys.getsizeof(group.model_key)
+        total += sys.getsizeof(group.brand or "") + sys.getsizeof(group.model or "")
+    return total
+
+
+def load_catalog_suggest(session: Session) -> SuggestStats:
+    """
+    Construye el indice desde las filas vivas de `vehicle_catalog` y lo publica de forma atomica.
+    """
+
+    global _INDEX
+    started = perf_counter()
+    data_version = read_data_version(session, CATALOG)
+    group_ids: dict[tuple[str | None, str | None], int] = {}
+    variant_counts: list[int] = []
+    token_groups: dict[str, set[int]] = {}
+    rows = 0
+    stmt = select(VehicleCatalog.brand, VehicleCatalog.model, VehicleCatalog.variant).where(
+        VehicleCatalog.deleted_at.is_(None)
+    )
+    for brand, model, variant in session.execute(stmt):
+        rows += 1
+        key = (brand, model)
+        group_id = group_ids.get(key)
+        if group_id is None:
+            group_id = group_ids[key] = len(variant_counts)
+            variant_counts.append(0)
+        variant_counts[group_id] += 1
+        for token in _tokens(brand) + _tokens(model) + _tokens(variant):
+            token_groups.setdefault(token, set()).add(group_id)
+
+    groups = [
+        SuggestGroup(
+            brand=brand,
+            model=model,
+            variants=variant_counts[group_id],
+            brand_key=normalize_text(brand),
+            model_key=normalize_text(model),
+        )
+        for (brand, model), group_id in group_ids.items()
+    ]
+    keys = sorted(token_groups)
+    postings = [tuple(sorted(token_groups[key])) for key in keys]
+    stats = SuggestStats(
+        rows=rows,
+        groups=len(groups),
+        tokens=len(keys),
+        memory_bytes=_memory_bytes(keys, postings, groups),
+        load_ms=(perf_counter() - started) * 1000,
+    )
+    with _LOCK:
+        _INDEX = SuggestIndex(keys=keys, postings=postings, groups=groups, stats=stats)
+    _CHECK.mark(data_version)
+    logger.info(
+        "catalog suggest index: %d rows, %d groups, %d tokens, %.1f bytes/row, %.1f ms",
+        stats.rows,
+        stats.groups,
+        stats.tokens,
+        stats.bytes_per_row,
+        stats.load_ms,
+    )
+    return stats
+
+
+def get_catalog_suggest(session: Session | None = None) -> SuggestIndex:
+    """
+    Indice vigente. Con `session`, cada DATA_VERSION_CHECK_S se compara con la version `catalog`
+    y se reconstruye si un import (`idae_catalog.py`, `import_private_catalog.py`) cambio el catalogo.
+    """
+
+    if session is not None and _CHECK.stale(session):
+        load_catalog_suggest(session)
+    return _INDEX
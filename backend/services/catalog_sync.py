@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from time import perf_counter
+from typing import Iterable, Iterator, Literal
+
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+
+from ..models import VehicleCatalog
+from .bulk_load import batched, bulk_insert
+from .catalog_search import sync_catalog_fts
+from .data_versions import CATALOG, bump_data_version
+from .text import normalize_text
+
+# Campos que definen el contenido de una fila (el hash ignora id y fechas).
+CATALOG_FIELDS = (
+    "brand",
+    "model",
+    "variant",
+    "fuel_type",
+    "category",
+    "segment",
+    "engine_cc",
+    "classification",
+    "consumption_min",
+    "consumption_max",
+    "emissions_min",
+    "emissions_max",
+    "source",
+)
+RECORD_FIELDS = (*CATALOG_FIELDS, "id", "updated_at")
+
+MatchOn = Literal["id", "natural"]
+
+
+@dataclass
+class CatalogSyncReport:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        rows = self.inserted + self.updated + self.unchanged
+        return rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, "
+            f"{self.deleted} tombstoned in {self.seconds:.1f}s ({self.rows_per_s:,.0f} rows/s)"
+        )
+
+
+def content_hash(record: dict) -> str:
+    payload = repr(tuple(record.get(name) for name in CATALOG_FIELDS))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _natural_key(brand: str | None, model: str | None, variant: str | None) -> tuple[str, str, str]:
+    return tuple(" ".join(normalize_text(value).split()) for value in (brand, model, variant))
+
+
+def sync_catalog(
+    session: Session,
+    records: Iterable[dict],
+    *,
+    match_on: MatchOn = "id",
+    tombstone_missing: bool = True,
+) -> CatalogSyncReport:
+    """
+    Sincroniza `vehicle_catalog` con `records` tocando solo lo que cambia.
+
+    Cada registro se casa con una fila existente por `id` (IDAE) o por marca/modelo/variante
+    normalizados (CSV sin id); si su hash de contenido coincide no se escribe. Las filas que ya no
+    llegan se marcan con `deleted_at` (tombstone) si `tombstone_missing`, y una fila borrada que
+    vuelve a llegar se reactiva. Los indices FTS5 y la version `catalog` de `data_versions` se
+    actualizan en la misma transaccion, sin commit: quien llama confirma y los lectores ven el
+    catalogo anterior o el nuevo, nunca uno vacio.
+    """
+
+    started = perf_counter()
+    now = datetime.utcnow()
+    report = CatalogSyncReport()
+    existing = session.execute(
+        select(
+            VehicleCatalog.id,
+            VehicleCatalog.brand,
+            VehicleCatalog.model,
+            VehicleCatalog.variant,
+            VehicleCatalog.content_hash,
+            VehicleCatalog.deleted_at,
+        )
+    ).all()
+    by_id = {row.id: row for row in existing}
+    by_key: dict[tuple[str, str, str], list[int]] = {}
+    if match_on == "natural":
+        # Las filas vivas primero, para no reactivar un duplicado borrado teniendo uno vivo.
+        for row in sorted(existing, key=lambda item: item.deleted_at is not None):
+            by_key.setdefault(_natural_key(row.brand, row.model, row.variant), []).append(row.id)
+
+    max_id_before = max(by_id, default=0)
+    updates: list[dict] = []
+    seen: set[int] = set()
+    explicit_ids: list[int] = []
+    autoincrement_rows = 0
+
+    def new_rows() -> Iterator[dict]:
+        # Casa cada registro y deja aparte cambios y coincidencias; solo salen las filas nuevas.
+        for record in records:
+            record = {name: record.get(name) for name in RECORD_FIELDS if name in record}
+            row_hash = content_hash(record)
+            if match_on == "id":
+                current = by_id.get(record["id"])
+            elif by_key:
+                candidates = by_key.get(_natural_key(record.get("brand"), record.get("model"), record.get("variant")))
+                current = by_id[candidates.pop(0)] if candidates else None
+            else:
+                current = None
+            if current is None:
+                nonlocal autoincrement_rows
+                if record.get("id") is None:
+                    autoincrement_rows += 1
+                else:
+                    explicit_ids.append(record["id"])
+                yield {**record, "updated_at": record.get("updated_at") or now, "content_hash": row_hash}
+                continue
+            if current.id in seen:
+                continue  # id repetido en la entrada: gana el primero
+            seen.add(current.id)
+            if current.content_hash == row_hash and current.deleted_at is None:
+                report.unchanged += 1
+                continue
+            updates.append({**record, "id": current.id, "updated_at": now, "content_hash": row_hash, "deleted_at": None})
+
+    # Las filas nuevas se insertan en lotes segun llegan, sin acumular la entrada en memoria.
+    report.inserted = bulk_insert(session, VehicleCatalog, new_rows()).rows
+    deleted_ids = (
+        [row.id for row in existing if row.id not in seen and row.deleted_at is None] if tombstone_missing else []
+    )
+
+    for batch in batched(updates):
+        session.execute(update(VehicleCatalog), batch)
+    for batch in batched(deleted_ids):
+        session.execute(update(VehicleCatalog).where(VehicleCatalog.id.in_(batch)).values(deleted_at=now))
+
+    # Solo estaban indexadas las filas vivas: se quitan con sus valores anteriores y se reindexan las nuevas.
+    changed_ids = [row["id"] for row in updates]
+    removed = [
+        (row.id, row.brand, row.model, row.variant)
+        for row in (by_id[item_id] for item_id in changed_ids + deleted_ids)
+        if row.deleted_at is None
+    ]
+    # Sin RETURNING: las filas sin id reciben max(id) + 1, asi que son las de id mayor que antes de la carga.
+    inserted_ids = explicit_ids
+    if autoincrement_rows:
+        known = set(explicit_ids)
+        inserted_ids = explicit_ids + [
+            item_id
+            for item_id in session.scalars(select(VehicleCatalog.id).where(VehicleCatalog.id > max_id_before))
+            if item_id not in known
+        ]
+    sync_catalog_fts(session, removed, changed_ids + inserted_ids)
+    if explicit_ids and session.get_bind().dialect.name == "postgresql":
+        # Los ids de IDAE no avanzan la secuencia: se adelanta para que las filas sin id no choquen.
+        session.execute(
+            text("SELECT setval(pg_get_serial_sequence('vehicle_catalog', 'id'), (SELECT max(id) FROM vehicle_catalog))")
+        )
+
+    report.updated = len(updates)
+    report.deleted = len(deleted_ids)
+    if report.inserted or report.updated or report.deleted:
+        # La API reconstruye su indice de autocompletado al ver la version nueva.
+        bump_data_version(session, CATALOG)
+    report.seconds = perf_counter() - started
+    return report
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from ..models import DataVersion
+
+# Cada cuanto la API vuelve a leer `data_versions` para saber si un import cambio los datos.
+DATA_VERSION_CHECK_S = float(os.getenv("DATA_VERSION_CHECK_S", "10"))
+
+RATE_TABLES = "rate_tables"
+CATALOG = "catalog"
+FUEL_PRICES = "fuel_prices"
+
+
+def bump_data_version(session: Session, name: str) -> None:
+    """
+    Sube la version de `name` dentro de la transaccion en curso (sin commit): se confirma junto
+    con los datos que cambia, asi que nadie ve la version nueva con los datos viejos.
+    """
+
+    now = datetime.utcnow()
+    result = session.execute(
+        update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        session.add(DataVersion(name=name, version=1, updated_at=now))
+        session.flush()
+
+
+def read_data_version(session: Session, name: str) -> int:
+    return session.scalar(select(DataVersion.version).where(DataVersion.name == name)) or 0
+
+
+class VersionCheck:
+    """
+    Compara la version publicada en memoria con la de la base, como mucho una vez cada `ttl_seconds`.
+
+    Otro proceso (los scripts de import) puede cambiar los datos; la tabla o indice en memoria de
+    la API se reconstruye en la primera peticion tras el TTL que ve una version distinta.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float = DATA_VERSION_CHECK_S) -> None:
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._version: int | None = None
+        self._checked_at = float("-inf")
+        self._lock = Lock()
+
+    def mark(self, version: int) -> None:
+        """
+        Version con la que se construyo lo publicado (leida antes que los datos).
+        """
+
+        with self._lock:
+            self._version = version
+            self._checked_at = monotonic()
+
+    def stale(self, session: Session) -> bool:
+        with self._lock:
+            if monotonic() - self._checked_at < self.ttl_seconds:
+                return False
+            self._checked_at = monotonic()
+        return read_data_version(session, self.name) != self._version
@@ -1,127 +1,288 @@
 from __future__ import annotations
 
+import codecs
+import json
+import os
+import re
+from contextlib import aclosing
+from dataclasses import dataclass, field
 from datetime import datetime
-from time import sleep
+from time import perf_counter
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
 
-import requests
-from datetime import datetime
+import httpx
 from sqlalchemy.orm import Session
 
 from ..models import FuelPrice
+from .data_versions import FUEL_PRICES, bump_data_version, read_data_version
+from .fuel_snapshot import fuel_price_entry, get_fuel_snapshot, load_regional_prices, publish_fuel_prices
+from .http_client import HTTP_CLIENT, AsyncHttpClient, run_sync
+from .price_aggregates import (
+    PriceSummary,
+    compute_price_aggregates,
+    national_summaries,
+    station_price_frame,
+    store_price_aggregates,
+)
+from .station_snapshot import FUEL_COLUMNS, STATION_CACHE, StationSnapshot, parse_source_date, station_from_record
+from .station_store import persist_stations
 
-FUEL_PRICE_URL = (
-    "https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/"
-    "PreciosCarburantes/EstacionesTerrestres/"
+FUEL_PRICE_URL = os.getenv(
+    "FUEL_PRICE_URL",
+    "https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes/EstacionesTerrestres/",
 )
-DEFAULT_HEADERS = {
-    "User-Agent": "VehicleAnalytics/1.0 (+https://github.com/pietrusj-data/calculo-de-costes-viaje)",
-    "Accept": "application/json,text/json,*/*",
+STATION_LIST_KEY = '"ListaEESSPrecio"'
+CHUNK_SIZE = 64 * 1024
+# Columnas de Minetur (sin el prefijo "Precio ") que alimentan la tabla fuel_prices.
+STORED_FUEL_COLUMNS = {
+    "gasoline": "Gasolina 95 E5",
+    "diesel": "Gasoleo A",
 }
+_HEADER_FIELD = re.compile(r'"(Fecha|ResultadoConsulta)"\s*:\s*"([^"]*)"')
 
 
-def _parse_float(value: str) -> float | None:
-    if not value:
-        return None
+@dataclass
+class FuelRefreshReport:
+    stations: int
+    stats: dict[str, PriceSummary] = field(default_factory=dict)
+    parse_seconds: float = 0.0
+    download_seconds: float = 0.0
+    aggregate_seconds: float = 0.0
+    peak_rss_delta_mb: float | None = None
+    source_date: str | None = None
+    snapshot: StationSnapshot | None = None
+    stations_written: int = 0
+    prices_written: int = 0
+    aggregates_written: int = 0
+    retries: int = 0
+
+
+def _current_rss_mb() -> float | None:
+    """
+    RSS actual del proceso desde /proc (Linux); None en otros sistemas.
+    """
+
     try:
-        return float(value.replace(",", "."))
-    except ValueError:
+        with open("/proc/self/statm", "rb") as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, ValueError, IndexError):
         return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _RssPeak:
+    """
+    Maximo del RSS muestreado durante una descarga, relativo al RSS al empezar.
+
+    `ru_maxrss` es el pico de toda la vida del proceso y no dice nada de un refresco concreto;
+    tracemalloc si, pero multiplica por 5 el tiempo de parseo. Se lee /proc una vez por chunk.
+    """
+
+    def __init__(self) -> None:
+        self.start = _current_rss_mb()
+        self.peak = self.start
+
+    def sample(self) -> None:
+        if self.start is not None:
+            self.peak = max(self.peak, _current_rss_mb() or 0.0)
+
+    @property
+    def delta_mb(self) -> float | None:
+        return None if self.start is None else self.peak - self.start
+
+
+class StationListParser:
+    """
+    Recorre `ListaEESSPrecio` objeto a objeto sobre un flujo de bytes, sin cargar el documento entero.
 
+    Se alimenta con `feed(chunk)`, que devuelve los objetos completos de ese tramo. Los campos de
+    cabecera anteriores a la lista (Fecha, ResultadoConsulta) se copian en `header`.
+    """
 
-def _fetch_fuel_payload() -> dict:
-    last_error: Exception | None = None
-    for attempt in range(3):
+    def __init__(self, header: dict[str, str] | None = None) -> None:
+        self.header = header if header is not None else {}
+        self.done = False
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._in_list = False
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        if self.done:
+            return []
+        buffer = self._buffer + self._text_decoder.decode(chunk)
+        if not self._in_list:
+            key_at = buffer.find(STATION_LIST_KEY)
+            bracket = buffer.find("[", key_at) if key_at >= 0 else -1
+            if bracket < 0:
+                self._buffer = buffer
+                return []
+            self.header.update(_HEADER_FIELD.findall(buffer[:key_at]))
+            buffer = buffer[bracket + 1 :]
+            self._in_list = True
+
+        records: list[dict] = []
+        position = 0
+        size = len(buffer)
+        while True:
+            while position < size and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= size:
+                break
+            if buffer[position] == "]":
+                self.done = True
+                break
+            try:
+                record, position_end = self._json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # objeto partido entre chunks
+            position = position_end
+            records.append(record)
+        self._buffer = "" if self.done else buffer[position:]
+        return records
+
+    def close(self) -> None:
+        if not self.done:
+            raise ValueError("Truncated station payload: ListaEESSPrecio not closed")
+
+
+def iter_station_records(chunks: Iterable[bytes], header: dict[str, str] | None = None) -> Iterator[dict]:
+    parser = StationListParser(header)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    parser.close()
+
+
+class _TimedChunks:
+    """
+    Iterador asincrono de chunks que acumula el tiempo esperando a la red, para separarlo del de parseo.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes]) -> None:
+        self._chunks = aiter(chunks)
+        self.wait_seconds = 0.0
+
+    def __aiter__(self) -> _TimedChunks:
+        return self
+
+    async def __anext__(self) -> bytes:
+        started = perf_counter()
         try:
-            response = requests.get(FUEL_PRICE_URL, timeout=30, headers=DEFAULT_HEADERS)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as exc:
-            last_error = exc
-            sleep(1.5 * (attempt + 1))
-    raise RuntimeError("Failed to reach fuel price service") from last_error
-
-
-def fetch_and_store_fuel_prices(session: Session) -> None:
-    payload = _fetch_fuel_payload()
-    stations = payload.get("ListaEESSPrecio", [])
-
-    gasoline_prices: list[float] = []
-    diesel_prices: list[float] = []
-
-    for station in stations:
-        gas_value = _parse_float(station.get("Precio Gasolina 95 E5", ""))
-        if gas_value:
-            gasoline_prices.append(gas_value)
-        diesel_value = _parse_float(station.get("Precio Gasoleo A", ""))
-        if diesel_value:
-            diesel_prices.append(diesel_value)
-
-    if gasoline_prices:
-        avg_gasoline = sum(gasoline_prices) / len(gasoline_prices)
-        session.add(
-            FuelPrice(
-                fuel_type="gasoline",
-                price_eur_per_unit=avg_gasoline,
-                unit="eur/l",
-                source="minetur-rest",
-                fetched_at=datetime.utcnow(),
-            )
-        )
-    if diesel_prices:
-        avg_diesel = sum(diesel_prices) / len(diesel_prices)
-        session.add(
+            return await anext(self._chunks)
+        finally:
+            self.wait_seconds += perf_counter() - started
+
+
+async def _download_chunks(client: AsyncHttpClient) -> AsyncIterator[bytes]:
+    async with client.stream("GET", FUEL_PRICE_URL) as response:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+
+
+async def _download_stations(client: AsyncHttpClient) -> FuelRefreshReport:
+    """
+    Descarga y parsea todas las estaciones en un `StationSnapshot`, midiendo tiempos y memoria.
+    """
+
+    started = perf_counter()
+    rss = _RssPeak()
+    parser = StationListParser()
+    stations = []
+    async with aclosing(_download_chunks(client)) as download:
+        chunks = _TimedChunks(download)
+        async for chunk in chunks:
+            stations.extend(station_from_record(record) for record in parser.feed(chunk))
+            rss.sample()
+            if parser.done:
+                break
+    parser.close()
+    snapshot = StationSnapshot.build(stations, parse_source_date(parser.header.get("Fecha")))
+    rss.sample()
+    elapsed = perf_counter() - started
+    return FuelRefreshReport(
+        stations=len(stations),
+        parse_seconds=elapsed - chunks.wait_seconds,
+        download_seconds=chunks.wait_seconds,
+        peak_rss_delta_mb=rss.delta_mb,
+        source_date=parser.header.get("Fecha"),
+        snapshot=snapshot,
+    )
+
+
+async def download_station_report(client: AsyncHttpClient = HTTP_CLIENT) -> FuelRefreshReport:
+    """
+    Descarga y parsea las estaciones con el cliente HTTP compartido (reintenta tambien respuestas truncadas).
+    """
+
+    retries_before = client.stats.retries
+    try:
+        report = await client.retrying(lambda: _download_stations(client), retry_on=(ValueError,))
+    except (httpx.HTTPError, ValueError) as exc:
+        raise RuntimeError("Failed to reach fuel price service") from exc
+    report.retries = client.stats.retries - retries_before
+    return report
+
+
+def store_fuel_report(session: Session, report: FuelRefreshReport) -> FuelRefreshReport:
+    """
+    Agrega, guarda y publica una descarga ya parseada (parte sincrona: pandas + base de datos).
+    """
+
+    started = perf_counter()
+    aggregates = compute_price_aggregates(station_price_frame(report.snapshot.stations))
+    report.stats = national_summaries(aggregates)
+    report.aggregate_seconds = perf_counter() - started
+
+    fetched_at = datetime.utcnow()
+    rows: list[FuelPrice] = []
+    for fuel_type, column in STORED_FUEL_COLUMNS.items():
+        stats = report.stats.get(column)
+        if not stats:
+            continue
+        rows.append(
             FuelPrice(
-                fuel_type="diesel",
-                price_eur_per_unit=avg_diesel,
+                fuel_type=fuel_type,
+                price_eur_per_unit=stats.mean,
                 unit="eur/l",
                 source="minetur-rest",
-                fetched_at=datetime.utcnow(),
+                fetched_at=fetched_at,
             )
         )
+    # `publish_fuel_prices` mezcla los precios nuevos sobre el snapshot vigente: se carga (o se
+    # recarga, si otro proceso cambio precios) antes de anadir las filas, para que los combustibles
+    # que esta descarga no trae sigan en el snapshot publicado.
+    get_fuel_snapshot(session)
+    session.add_all(rows)
+    report.stations_written, report.prices_written = persist_stations(session, report.snapshot.stations, fetched_at)
+    report.aggregates_written = store_price_aggregates(session, aggregates, fetched_at)
+    bump_data_version(session, FUEL_PRICES)
+    session.flush()
+    entries = [fuel_price_entry(row) for row in rows]
+    regional = load_regional_prices(session)
+    data_version = read_data_version(session, FUEL_PRICES)
     session.commit()
+    publish_fuel_prices(entries, regional, data_version)
+    STATION_CACHE.publish(report.snapshot)
+    return report
+
+
+def fetch_and_store_fuel_prices(session: Session) -> FuelRefreshReport:
+    return store_fuel_report(session, run_sync(download_station_report))
 
 
-def fetch_stations_by_postal_code(postal_code: str) -> dict[str, object]:
-    payload = _fetch_fuel_payload()
-    stations = payload.get("ListaEESSPrecio", [])
+async def load_station_snapshot() -> StationSnapshot:
+    return (await download_station_report()).snapshot
+
+
+async def fetch_stations_by_postal_code(postal_code: str) -> dict[str, object]:
     postal_code = postal_code.strip()
-    filtered = [s for s in stations if str(s.get("C.P.", "")).strip() == postal_code]
-    fetched_at_raw = payload.get("Fecha")
-    fetched_at = None
-    if fetched_at_raw:
-        try:
-            fetched_at = datetime.strptime(fetched_at_raw, "%d/%m/%Y %H:%M:%S")
-        except ValueError:
-            fetched_at = None
-
-    normalized = []
-    gas_prices = []
-    diesel_prices = []
-    for station in filtered:
-        gas = _parse_float(station.get("Precio Gasolina 95 E5", ""))
-        diesel = _parse_float(station.get("Precio Gasoleo A", ""))
-        if gas is not None:
-            gas_prices.append(gas)
-        if diesel is not None:
-            diesel_prices.append(diesel)
-        normalized.append(
-            {
-                "id": station.get("IDEESS"),
-                "label": station.get("Rótulo"),
-                "address": station.get("Dirección"),
-                "postal_code": station.get("C.P."),
-                "municipality": station.get("Municipio"),
-                "province": station.get("Provincia"),
-                "schedule": station.get("Horario"),
-                "latitude": _parse_float(station.get("Latitud", "")),
-                "longitude": _parse_float(station.get("Longitud (WGS84)", "")),
-                "prices": {
-                    "gasoline_95_e5": gas,
-                    "diesel_a": diesel,
-                },
-            }
-        )
+    snapshot = await STATION_CACHE.get(load_station_snapshot)
+    stations = snapshot.by_postal(postal_code)
 
+    gas_prices = [s.prices["Gasolina 95 E5"] for s in stations if "Gasolina 95 E5" in s.prices]
+    diesel_prices = [s.prices["Gasoleo A"] for s in stations if "Gasoleo A" in s.prices]
     averages = {}
     if gas_prices:
         averages["gasoline_95_e5"] = sum(gas_prices) / len(gas_prices)
@@ -130,8 +291,30 @@ def fetch_stations_by_postal_code(postal_code: str) -> dict[str, object]:
 
     return {
         "postal_code": postal_code,
-        "stations": normalized,
+        "stations": [station.as_item() for station in stations],
         "averages": averages,
         "source": "minetur-rest",
-        "fetched_at": fetched_at,
+        "fetched_at": snapshot.fetched_at,
+    }
+
+
+async def fetch_cheapest_stations(
+    lat: float, lon: float, radius_km: float, fuel: str, limit: int
+) -> dict[str, object]:
+    column = FUEL_COLUMNS.get(fuel)
+    if column is None:
+        raise ValueError(f"Unsupported fuel {fuel}; expected one of {', '.join(FUEL_COLUMNS)}")
+    snapshot = await STATION_CACHE.get(load_station_snapshot)
+    matches = snapshot.cheapest_nearby(lat, lon, radius_km, column, limit)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "radius_km": radius_km,
+        "fuel": fuel,
+        "stations": [
+            {**station.as_item(), "price_eur_per_unit": price, "distance_km": distance}
+            for price, distance, station in matches
+        ],
+        "source": "minetur-rest",
+        "fetched_at": snapshot.fetched_at,
     }
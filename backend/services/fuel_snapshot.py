@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Lock
+from typing import Iterable
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from ..models import FuelPrice, FuelPriceAggregate
+from .data_versions import FUEL_PRICES, VersionCheck, read_data_version
+from .station_snapshot import FUEL_COLUMNS
+from .text import region_keys
+
+
+@dataclass(frozen=True)
+class FuelPriceEntry:
+    id: int
+    fuel_type: str
+    price_eur_per_unit: float
+    unit: str
+    source: str
+    fetched_at: datetime
+    # Percentiles 10 y 90 entre estaciones; solo los tienen las entradas que salen de los agregados.
+    p10: float | None = None
+    p90: float | None = None
+
+
+# (provincia, municipio o "") normalizados -> precios de la zona por tipo de combustible.
+# NATIONAL_AREA guarda el agregado nacional: no lo usa `lookup`, solo `spread`.
+RegionalPrices = dict[tuple[str, str], dict[str, FuelPriceEntry]]
+NATIONAL_AREA = ("", "")
+
+
+@dataclass(frozen=True)
+class FuelPriceSnapshot:
+    version: int
+    prices: dict[str, FuelPriceEntry] = field(default_factory=dict)
+    regional: RegionalPrices = field(default_factory=dict)
+
+    def get(self, fuel_type: str) -> FuelPriceEntry | None:
+        return self.prices.get(fuel_type)
+
+    def lookup(
+        self, fuel_type: str, province: str | None = None, municipality: str | None = None
+    ) -> FuelPriceEntry | None:
+        """
+        Precio del municipio, si no el de la provincia y, en ultimo caso, el nacional.
+
+        El municipio solo se tiene en cuenta junto con la provincia (hay nombres repetidos).
+        """
+
+        if province and self.regional:
+            province_keys = region_keys(province)
+            areas = [(key, name) for key in province_keys for name in region_keys(municipality)]
+            areas += [(key, "") for key in province_keys]
+            for area in areas:
+                entry = self.regional.get(area, {}).get(fuel_type)
+                if entry is not None:
+                    return entry
+        return self.prices.get(fuel_type)
+
+    def spread(
+        self, fuel_type: str, province: str | None = None, municipality: str | None = None
+    ) -> tuple[float, float] | None:
+        """
+        p10 y p90 de la zona que elige `lookup`; si esa entrada no los tiene, los nacionales.
+        """
+
+        for entry in (
+            self.lookup(fuel_type, province, municipality),
+            self.regional.get(NATIONAL_AREA, {}).get(fuel_type),
+        ):
+            if entry is not None and entry.p10 is not None and entry.p90 is not None:
+                return entry.p10, entry.p90
+        return None
+
+
+_SNAPSHOT: FuelPriceSnapshot | None = None
+_LOCK = Lock()
+_CHECK = VersionCheck(FUEL_PRICES)
+
+
+def fuel_price_entry(row: FuelPrice) -> FuelPriceEntry:
+    return FuelPriceEntry(
+        id=row.id,
+        fuel_type=row.fuel_type,
+        price_eur_per_unit=row.price_eur_per_unit,
+        unit=row.unit,
+        source=row.source,
+        fetched_at=row.fetched_at,
+    )
+
+
+def load_fuel_snapshot(session: Session) -> FuelPriceSnapshot:
+    """
+    Reconstruye el snapshot con el ultimo precio por tipo de combustible (una sola consulta).
+
+    La version `fuel_prices` de `data_versions` se lee antes que los precios, como en `build_rate_tables`.
+    """
+
+    data_version = read_data_version(session, FUEL_PRICES)
+    latest = (
+        select(FuelPrice.fuel_type, func.max(FuelPrice.fetched_at).label("fetched_at"))
+        .group_by(FuelPrice.fuel_type)
+        .subquery()
+    )
+    stmt = (
+        select(FuelPrice)
+        .join(latest, and_(FuelPrice.fuel_type == latest.c.fuel_type, FuelPrice.fetched_at == latest.c.fetched_at))
+        .order_by(FuelPrice.id.asc())
+    )
+    prices = {row.fuel_type: fuel_price_entry(row) for row in session.execute(stmt).scalars()}
+    snapshot = _swap(prices, load_regional_prices(session), replace=True)
+    _CHECK.mark(data_version)
+    return snapshot
+
+
+def load_regional_prices(session: Session) -> RegionalPrices:
+    """
+    Lee `fuel_price_aggregates` y lo indexa por nombre normalizado (el nivel nacional en NATIONAL_AREA).
+
+    Se usa la media de la zona, igual que el precio nacional de `fuel_prices`.
+    """
+
+    fuel_types = {column: fuel_type for fuel_type, column in FUEL_COLUMNS.items()}
+    stmt = select(FuelPriceAggregate).where(FuelPriceAggregate.fuel.in_(fuel_types))
+    regional: RegionalPrices = {}
+    for row in session.execute(stmt).scalars():
+        fuel_type = fuel_types[row.fuel]
+        area = row.municipality if row.level == "municipality" else row.province
+        entry = FuelPriceEntry(
+            id=row.id,
+            fuel_type=fuel_type,
+            price_eur_per_unit=row.mean,
+            unit="eur/l",
+            source=f"minetur-rest {row.level} {area}" if area else f"minetur-rest {row.level}",
+            fetched_at=row.fetched_at,
+            p10=row.p10,
+            p90=row.p90,
+        )
+        if row.level == "national":
+            regional.setdefault(NATIONAL_AREA, {})[fuel_type] = entry
+            continue
+        municipality_keys = region_keys(row.municipality) if row.level == "municipality" else {""}
+        for province_key in region_keys(row.province):
+            for municipality_key in municipality_keys:
+                regional.setdefault((province_key, municipality_key), {})[fuel_type] = entry
+    return regional
+
+
+def publish_fuel_prices(
+    entries: Iterable[FuelPriceEntry], regional: RegionalPrices | None = None, data_version: int | None = None
+) -> FuelPriceSnapshot:
+    """
+    Publica precios ya confirmados en la base de datos sobre el snapshot actual.
+
+    Si se pasan precios regionales, sustituyen a los anteriores (cada carga los regenera completos).
+    `data_version` es la version `fuel_prices` confirmada con esos precios: este proceso ya los
+    tiene y no necesita recargarlos en la siguiente comprobacion.
+    """
+
+    snapshot = _swap({entry.fuel_type: entry for entry in entries}, regional, replace=False)
+    if data_version is not None:
+        _CHECK.mark(data_version)
+    return snapshot
+
+
+def _swap(prices: dict[str, FuelPriceEntry], regional: RegionalPrices | None, *, replace: bool) -> FuelPriceSnapshot:
+    global _SNAPSHOT
+    with _LOCK:
+        current = _SNAPSHOT
+        merged = prices if replace or current is None else {**current.prices, **prices}
+        if regional is None:
+            regional = current.regional if current is not None else {}
+        snapshot = FuelPriceSnapshot(
+            version=(current.version + 1 if current else 1), prices=merged, regional=regional
+        )
+        _SNAPSHOT = snapshot
+    return snapshot
+
+
+def get_fuel_snapshot(session: Session | None = None) -> FuelPriceSnapshot:
+    """
+    Devuelve el snapshot vigente; si aun no se ha cargado (p.ej. scripts fuera de la API) lo carga con `session`.
+
+    Con `session`, cada DATA_VERSION_CHECK_S se compara con `data_versions` y se recarga si
+    `etl/fuel_prices_es.py`, `seed.py` u otro worker han guardado precios desde otro proceso.
+    """
+
+    snapshot = _SNAPSHOT
+    if session is None:
+        return snapshot if snapshot is not None else FuelPriceSnapshot(version=0)
+    if snapshot is None or _CHECK.stale(session):
+        return load_fuel_snapshot(session)
+    return snapshot
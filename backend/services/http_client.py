@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import random
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx solo negocia HTTP/2 si esta instalado: pip install "httpx[http2]")
+except ImportError:
+    HTTP2_AVAILABLE = False
+else:
+    HTTP2_AVAILABLE = True
+
+DEFAULT_HEADERS = {
+    "User-Agent": "VehicleAnalytics/1.0 (+https://github.com/pietrusj-data/calculo-de-costes-viaje)",
+    "Accept": "application/json,text/json,*/*",
+    "Accept-Encoding": "gzip, deflate",
+}
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class HttpConfig:
+    connect_timeout_s: float = 10.0
+    read_timeout_s: float = 60.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry_s: float = 30.0
+    # Peticiones en vuelo a la vez por cliente (las demas esperan turno).
+    max_concurrency: int = int(os.getenv("HTTP_MAX_CONCURRENCY", "8"))
+    retries: int = 3
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 10.0
+
+
+@dataclass
+class HttpStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+
+
+class AsyncHttpClient:
+    """
+    Cliente HTTP asincrono compartido: pool keep-alive, HTTP/2 si hay `h2`, gzip, concurrencia
+    acotada, timeouts y reintentos con backoff exponencial con jitter.
+
+    El pool de httpx queda ligado al event loop que lo crea; si se usa desde otro loop
+    (p.ej. varios `asyncio.run` en un script) se abre uno nuevo. `transport` permite apuntar
+    a un servidor local o a un `httpx.MockTransport` en pruebas.
+    """
+
+    def __init__(
+        self,
+        config: HttpConfig | None = None,
+        *,
+        headers: dict[str, str] | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.config = config or HttpConfig()
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.transport = transport
+        self.stats = HttpStats()
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _current(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            config = self.config
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(config.read_timeout_s, connect=config.connect_timeout_s),
+                limits=httpx.Limits(
+                    max_connections=config.max_connections,
+                    max_keepalive_connections=config.max_keepalive,
+                    keepalive_expiry=config.keepalive_expiry_s,
+                ),
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(config.max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    def backoff_seconds(self, attempt: int, response: httpx.Response | None = None) -> float:
+        retry_after = _retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.config.backoff_max_s)
+        # "Full jitter": espera aleatoria entre 0 y el tope exponencial.
+        return random.uniform(0, min(self.config.backoff_max_s, self.config.backoff_base_s * 2**attempt))
+
+    async def retrying(self, call: Callable[[], Awaitable[T]], retry_on: tuple[type[Exception], ...] = ()) -> T:
+        """
+        Ejecuta `call` con la politica de reintentos del cliente.
+
+        Se reintentan errores de red, timeouts, respuestas 429/5xx y las excepciones de `retry_on`.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except (httpx.TransportError, *retry_on) as exc:
+                response = None
+                error = exc
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code not in RETRY_STATUSES:
+                    self.stats.failures += 1
+                    raise
+                response = exc.response
+                error = exc
+            if attempt >= self.config.retries:
+                self.stats.failures += 1
+                raise error
+            self.stats.retries += 1
+            await asyncio.sleep(self.backoff_seconds(attempt, response))
+            attempt += 1
+
+    async def request_once(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Un unico intento (para componer con `retrying`); lanza `httpx.HTTPStatusError` si no es 2xx.
+        """
+
+        client, semaphore = self._current()
+        async with semaphore:
+            self.stats.requests += 1
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Peticion completa (cuerpo leido) con reintentos.
+        """
+
+        return await self.retrying(lambda: self.request_once(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Respuesta en streaming sin reintentos (el cuerpo ya consumido no se puede repetir);
+        quien llama envuelve todo el consumo con `retrying`.
+        """
+
+        client, semaphore = self._current()
+        async with semaphore:
+            self.stats.requests += 1
+            async with client.stream(method, url, **kwargs) as response:
+                response.raise_for_status()
+                yield response
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+HTTP_CLIENT = AsyncHttpClient()
+
+
+def run_sync(call: Callable[[], Awaitable[T]], client: AsyncHttpClient = HTTP_CLIENT) -> T:
+    """
+    Ejecuta una corrutina desde codigo sincrono y cierra el pool al terminar.
+
+    Para scripts de una sola llamada (ETL); quien llama muchas veces usa `SYNC_LOOP`.
+    """
+
+    async def main() -> T:
+        try:
+            return await call()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+class BackgroundLoop:
+    """
+    Event loop propio en un hilo daemon para llamar a clientes asincronos desde codigo sincrono.
+
+    Todas las llamadas van al mismo loop, asi que el pool keep-alive de cada `AsyncHttpClient`
+    se reutiliza entre llamadas (un `asyncio.run` por llamada abriria conexiones nuevas cada vez).
+    El hilo arranca con la primera llamada y se para al salir del proceso.
+    """
+
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _running(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="http-sync-loop", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+                atexit.register(self.close)
+            return self._loop
+
+    def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        return asyncio.run_coroutine_threadsafe(call(), self._running()).result()
+
+    def close(self) -> None:
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+SYNC_LOOP = BackgroundLoop()
@@ -0,0 +1,279 @@
+"""
+Aritmetica del coste de un viaje, sin FastAPI, SQLAlchemy ni Pydantic.
+
+Recibe valores ya resueltos (vehiculo, precios, tarifas) en tipos congelados con __slots__ y
+devuelve resultados con __slots__: se puede importar y enviar con pickle a otros procesos, y
+medir por separado. La resolucion de datos (vehiculo guardado, snapshots) y los textos de
+fuentes y supuestos quedan en `calc.py`.
+
+Las funciones `*_arrays` son las mismas formulas sobre arrays de NumPy para el lote
+(`batch_calc.py`); cualquier cambio de formula se hace aqui en las dos versiones.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+ROUTE_MULTIPLIERS = {"city": 1.15, "mixed": 1.0, "highway": 0.9}
+DEFAULT_ANNUAL_KM = 15000
+LIFE_YEARS = 12
+
+
+@dataclass(frozen=True, slots=True)
+class DepreciationRates:
+    base_value_eur: float
+    annual_rate: float
+    km_rate: float
+    min_residual_pct: float
+
+
+@dataclass(frozen=True, slots=True)
+class VehicleParams:
+    powertrain_type: str
+    consumption_l_per_100km: float | None = None
+    consumption_kwh_per_100km: float | None = None
+    phev_electric_share: float | None = None
+    market_value_eur: float | None = None
+    year: int | None = None
+    current_km: float | None = None
+    annual_km: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class InsuranceParams:
+    annual_cost_eur: float
+    per_km: bool
+    annual_km: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class TripParams:
+    """
+    Viaje con precios y tarifas ya elegidos. `fuel_price_eur_per_l` es el del combustible del
+    vehiculo (gasolina para los PHEV); `year` es el ano de referencia de la depreciacion.
+    """
+
+    trip_km: float
+    trip_days: int
+    year: int
+    maintenance_per_km: float
+    depreciation: DepreciationRates
+    route_multiplier: float = 1.0
+    fuel_price_eur_per_l: float | None = None
+    electricity_price_eur_per_kwh: float | None = None
+    insurance: InsuranceParams | None = None
+
+
+# Los resultados se crean en cada cotizacion: slots sin frozen, cuyo __init__ es unas 4 veces mas lento.
+@dataclass(slots=True)
+class EnergyCost:
+    total_eur: float
+    per_km_eur: float
+    fuel_liters: float
+    electric_kwh: float
+
+
+@dataclass(slots=True)
+class ComponentCost:
+    amount_eur: float
+    per_km_eur: float
+
+
+@dataclass(slots=True)
+class DepreciationCost:
+    amount_eur: float
+    per_km_eur: float
+    residual_value_eur: float
+
+
+@dataclass(slots=True)
+class TripCost:
+    energy: EnergyCost
+    maintenance: ComponentCost
+    insurance: ComponentCost
+    depreciation: DepreciationCost
+
+    @property
+    def total_eur(self) -> float:
+        return (
+            self.energy.total_eur
+            + self.maintenance.amount_eur
+            + self.insurance.amount_eur
+            + self.depreciation.amount_eur
+        )
+
+
+def check_energy_inputs(vehicle: VehicleParams, fuel_price: float | None, electricity_price: float | None) -> None:
+    """
+    Lanza ValueError si al powertrain le falta algun dato para el coste de energia.
+    """
+
+    powertrain = vehicle.powertrain_type
+    if powertrain in {"gasoline", "diesel"}:
+        if fuel_price is None:
+            raise ValueError(f"Missing fuel price for {powertrain}")
+        if vehicle.consumption_l_per_100km is None:
+            raise ValueError("Missing consumption_l_per_100km")
+    elif powertrain == "bev":
+        if vehicle.consumption_kwh_per_100km is None:
+            raise ValueError("Missing consumption_kwh_per_100km")
+        if electricity_price is None:
+            raise ValueError("Missing electricity_price_eur_per_kwh")
+    elif powertrain == "phev":
+        if vehicle.consumption_kwh_per_100km is None or vehicle.consumption_l_per_100km is None:
+            raise ValueError("Missing PHEV consumption inputs")
+        if vehicle.phev_electric_share is None:
+            raise ValueError("Missing phev_electric_share")
+        if electricity_price is None:
+            raise ValueError("Missing electricity_price_eur_per_kwh")
+        if fuel_price is None:
+            raise ValueError("Missing fuel price for gasoline")
+    else:
+        raise ValueError("Unsupported powertrain type")
+
+
+def electric_share(vehicle: VehicleParams) -> float:
+    """
+    Fraccion de km electricos: 0 en combustion, 1 en BEV; asi cada powertrain es un caso del PHEV.
+    """
+
+    if vehicle.powertrain_type == "bev":
+        return 1.0
+    if vehicle.powertrain_type == "phev":
+        return vehicle.phev_electric_share
+    return 0.0
+
+
+def energy_cost(
+    vehicle: VehicleParams,
+    trip_km: float,
+    route_multiplier: float = 1.0,
+    fuel_price: float | None = None,
+    electricity_price: float | None = None,
+) -> EnergyCost:
+    """
+    Coste de energia segun el powertrain (precios en eur/l y eur/kWh). Lanza ValueError si falta algun dato.
+    """
+
+    check_energy_inputs(vehicle, fuel_price, electricity_price)
+    powertrain = vehicle.powertrain_type
+    if powertrain in {"gasoline", "diesel"}:
+        liters = trip_km * vehicle.consumption_l_per_100km * route_multiplier / 100
+        total = liters * fuel_price
+        return EnergyCost(total_eur=total, per_km_eur=total / trip_km, fuel_liters=liters, electric_kwh=0.0)
+
+    if powertrain == "bev":
+        kwh = trip_km * vehicle.consumption_kwh_per_100km * route_multiplier / 100
+        total = kwh * electricity_price
+        return EnergyCost(total_eur=total, per_km_eur=total / trip_km, fuel_liters=0.0, electric_kwh=kwh)
+
+    electric_km = trip_km * vehicle.phev_electric_share
+    fuel_km = trip_km - electric_km
+    kwh = electric_km * vehicle.consumption_kwh_per_100km * route_multiplier / 100
+    liters = fuel_km * vehicle.consumption_l_per_100km * route_multiplier / 100
+    total = kwh * electricity_price + liters * fuel_price
+    return EnergyCost(total_eur=total, per_km_eur=total / trip_km, fuel_liters=liters, electric_kwh=kwh)
+
+
+def energy_cost_arrays(
+    trip_km: np.ndarray,
+    route_multiplier: np.ndarray,
+    l_per_100km: np.ndarray,
+    kwh_per_100km: np.ndarray,
+    share: np.ndarray,
+    fuel_price: np.ndarray,
+    electricity_price: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `energy_cost` para N viajes ya validados (`share` de `electric_share`); devuelve total, litros y kWh.
+    """
+
+    electric_km = trip_km * share
+    kwh = electric_km * kwh_per_100km * route_multiplier / 100
+    liters = (trip_km - electric_km) * l_per_100km * route_multiplier / 100
+    return kwh * electricity_price + liters * fuel_price, liters, kwh
+
+
+def maintenance_cost(per_km_eur: float, trip_km: float) -> ComponentCost:
+    return ComponentCost(amount_eur=per_km_eur * trip_km, per_km_eur=per_km_eur)
+
+
+def insurance_cost(
+    insurance: InsuranceParams | None, vehicle: VehicleParams, trip_km: float, trip_days: int
+) -> ComponentCost:
+    if insurance is None:
+        return ComponentCost(amount_eur=0.0, per_km_eur=0.0)
+    annual_cost = insurance.annual_cost_eur
+    if insurance.per_km:
+        per_km = annual_cost / (insurance.annual_km or vehicle.annual_km or DEFAULT_ANNUAL_KM)
+        return ComponentCost(amount_eur=per_km * trip_km, per_km_eur=per_km)
+    amount = annual_cost / 365 * trip_days
+    return ComponentCost(amount_eur=amount, per_km_eur=amount / trip_km)
+
+
+def vehicle_age_years(vehicle: VehicleParams, year: int) -> int:
+    return max(0, (year - (vehicle.year or year)))
+
+
+def life_km(vehicle: VehicleParams) -> float:
+    return max(vehicle.annual_km or DEFAULT_ANNUAL_KM, 1) * LIFE_YEARS
+
+
+def depreciation_cost(vehicle: VehicleParams, rates: DepreciationRates, trip_km: float, year: int) -> DepreciationCost:
+    """
+    Valor residual por antiguedad y km con suelo `min_residual_pct`; el coste por km reparte la
+    perdida de valor en LIFE_YEARS anos de uso. Un valor de mercado sustituye al residual estimado.
+    """
+
+    years = vehicle_age_years(vehicle, year)
+    current_km = vehicle.current_km or 0
+    value = rates.base_value_eur * ((1 - rates.annual_rate) ** years)
+    value *= (1 - rates.km_rate) ** (current_km / 10000)
+    residual_floor = rates.base_value_eur * rates.min_residual_pct
+    residual_value = max(value, residual_floor)
+    total_life_km = life_km(vehicle)
+    per_km = (rates.base_value_eur - residual_floor) / total_life_km
+    if vehicle.market_value_eur:
+        residual_value = vehicle.market_value_eur
+        per_km = max((rates.base_value_eur - residual_value) / total_life_km, 0)
+    return DepreciationCost(amount_eur=per_km * trip_km, per_km_eur=per_km, residual_value_eur=residual_value)
+
+
+def depreciation_cost_arrays(
+    base_value: np.ndarray,
+    annual_rate: np.ndarray,
+    km_rate: np.ndarray,
+    min_residual_pct: np.ndarray,
+    years: np.ndarray,
+    current_km: np.ndarray,
+    total_life_km: np.ndarray,
+    market_value: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `depreciation_cost` para N viajes (`market_value` NaN donde no hay valor de mercado).
+    Devuelve coste por km y valor residual; `years` y `total_life_km` de `vehicle_age_years` y `life_km`.
+    """
+
+    value = base_value * (1 - annual_rate) ** years * (1 - km_rate) ** (current_km / 10000)
+    residual_floor = base_value * min_residual_pct
+    has_market = ~np.isnan(market_value)
+    residual_value = np.where(has_market, market_value, np.maximum(value, residual_floor))
+    per_km = np.where(
+        has_market,
+        np.maximum((base_value - np.nan_to_num(market_value)) / total_life_km, 0),
+        (base_value - residual_floor) / total_life_km,
+    )
+    return per_km, residual_value
+
+
+def quote(vehicle: VehicleParams, trip: TripParams) -> TripCost:
+    return TripCost(
+        energy=energy_cost(
+            vehicle, trip.trip_km, trip.route_multiplier, trip.fuel_price_eur_per_l, trip.electricity_price_eur_per_kwh
+        ),
+        maintenance=maintenance_cost(trip.maintenance_per_km, trip.trip_km),
+        insurance=insurance_cost(trip.insurance, vehicle, trip.trip_km, trip.trip_days),
+        depreciation=depreciation_cost(vehicle, trip.depreciation, trip.trip_km, trip.year),
+    )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import case, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from ..models import MaintenanceEvent, VehicleMaintenanceAggregate
+from .bulk_load import dialect_insert
+
+
+def apply_maintenance_event(session: Session, event: MaintenanceEvent) -> None:
+    """
+    Suma un evento nuevo al agregado de su vehiculo dentro de la transaccion en curso.
+
+    Es un solo upsert (`ON CONFLICT (vehicle_id) DO UPDATE`) con incrementos relativos a los
+    valores guardados: dos altas concurrentes, incluidas las dos primeras de un vehiculo, no se
+    pisan ni chocan con la clave primaria.
+    """
+
+    agg = VehicleMaintenanceAggregate
+    odometer = event.odometer_km
+    now = datetime.utcnow()
+    values: dict[str, object] = {
+        "total_cost_eur": agg.total_cost_eur + event.cost_eur,
+        "event_count": agg.event_count + 1,
+        "updated_at": now,
+    }
+    if odometer is not None:
+        values["odometer_count"] = agg.odometer_count + 1
+        values["min_odometer_km"] = case(
+            (or_(agg.min_odometer_km.is_(None), agg.min_odometer_km > odometer), odometer),
+            else_=agg.min_odometer_km,
+        )
+        values["max_odometer_km"] = case(
+            (or_(agg.max_odometer_km.is_(None), agg.max_odometer_km < odometer), odometer),
+            else_=agg.max_odometer_km,
+        )
+    stmt = dialect_insert(session, agg.__table__).values(
+        vehicle_id=event.vehicle_id,
+        total_cost_eur=event.cost_eur,
+        event_count=1,
+        odometer_count=1 if odometer is not None else 0,
+        min_odometer_km=odometer,
+        max_odometer_km=odometer,
+        updated_at=now,
+    )
+    session.execute(stmt.on_conflict_do_update(index_elements=[agg.vehicle_id], set_=values))
+
+
+def rebuild_maintenance_aggregates(session: Session, vehicle_ids: Iterable[int] | None = None) -> int:
+    """
+    Recalcula los agregados desde `maintenance_events` (backfill). Devuelve cuantos vehiculos se escriben.
+    """
+
+    agg = VehicleMaintenanceAggregate
+    stmt = select(
+        MaintenanceEvent.vehicle_id,
+        func.coalesce(func.sum(MaintenanceEvent.cost_eur), 0.0),
+        func.count(MaintenanceEvent.id),
+        func.count(MaintenanceEvent.odometer_km),
+        func.min(MaintenanceEvent.odometer_km),
+        func.max(MaintenanceEvent.odometer_km),
+    ).group_by(MaintenanceEvent.vehicle_id)
+    clear = delete(agg)
+    if vehicle_ids is not None:
+        ids = list(vehicle_ids)
+        stmt = stmt.where(MaintenanceEvent.vehicle_id.in_(ids))
+        clear = clear.where(agg.vehicle_id.in_(ids))
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "vehicle_id": vehicle_id,
+            "total_cost_eur": total,
+            "event_count": event_count,
+            "odometer_count": odometer_count,
+            "min_odometer_km": odo_min,
+            "max_odometer_km": odo_max,
+            "updated_at": now,
+        }
+        for vehicle_id, total, event_count, odometer_count, odo_min, odo_max in session.execute(stmt)
+    ]
+    session.execute(clear)
+    if rows:
+        session.execute(insert(agg), rows)
+    return len(rows)
+
+
+def maintenance_rate_from_aggregate(
+    aggregate: VehicleMaintenanceAggregate | None, current_km: float | None
+) -> float | None:
+    """
+    Coste por km del historial real; None si no hay eventos o la distancia no es positiva.
+    """
+
+    if aggregate is None or aggregate.event_count == 0:
+        return None
+    if aggregate.odometer_count >= 2:
+        distance = aggregate.max_odometer_km - aggregate.min_odometer_km
+    else:
+        distance = (current_km or 0) - (aggregate.min_odometer_km or 0)
+    if distance <= 0:
+        return None
+    return aggregate.total_cost_eur / distance
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+import pandas as pd
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from ..models import FuelPriceAggregate
+from .station_snapshot import Station
+
+# Niveles de agregacion, de mas general a mas concreto.
+LEVEL_KEYS = {
+    "national": [],
+    "province": ["province"],
+    "municipality": ["province", "municipality"],
+}
+AGGREGATE_COLUMNS = ["level", "province", "municipality", "fuel", "station_count", "mean", "median", "p10", "p90"]
+
+
+@dataclass(frozen=True)
+class PriceSummary:
+    count: int
+    mean: float
+    median: float
+    p10: float
+    p90: float
+
+
+def station_price_frame(stations: Iterable[Station]) -> pd.DataFrame:
+    """
+    Pasa las estaciones a un DataFrame largo (province, municipality, fuel, price), una fila por precio publicado.
+    """
+
+    stations = list(stations)
+    wide = pd.DataFrame.from_records([station.prices for station in stations])
+    wide["province"] = [station.province for station in stations]
+    wide["municipality"] = [station.municipality for station in stations]
+    frame = wide.melt(id_vars=["province", "municipality"], var_name="fuel", value_name="price")
+    return frame.dropna(subset=["price"]).reset_index(drop=True)
+
+
+def _summarize(frame: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    grouped = frame.groupby(keys + ["fuel"], sort=True)["price"]
+    summary = grouped.agg(station_count="count", mean="mean", median="median")
+    quantiles = grouped.quantile([0.1, 0.9]).unstack()
+    summary["p10"] = quantiles[0.1]
+    summary["p90"] = quantiles[0.9]
+    return summary.reset_index()
+
+
+def compute_price_aggregates(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Media, mediana, p10 y p90 por combustible a nivel nacional, provincial y municipal.
+    """
+
+    if frame.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+    levels = []
+    for level, keys in LEVEL_KEYS.items():
+        summary = _summarize(frame, keys)
+        summary["level"] = level
+        levels.append(summary)
+    aggregates = pd.concat(levels, ignore_index=True)
+    for column in ("province", "municipality"):
+        if column not in aggregates:
+            aggregates[column] = None
+    return aggregates[AGGREGATE_COLUMNS]
+
+
+def national_summaries(aggregates: pd.DataFrame) -> dict[str, PriceSummary]:
+    national = aggregates[aggregates["level"] == "national"]
+    return {
+        row.fuel: PriceSummary(count=int(row.station_count), mean=row.mean, median=row.median, p10=row.p10, p90=row.p90)
+        for row in national.itertuples(index=False)
+    }
+
+
+def store_price_aggregates(session: Session, aggregates: pd.DataFrame, fetched_at: datetime) -> int:
+    """
+    Sustituye la tabla `fuel_price_aggregates` por los agregados de la ultima carga; el commit queda para quien llama.
+    """
+
+    rows = aggregates.astype(object).where(aggregates.notna(), None).to_dict("records")
+    for row in rows:
+        row["fetched_at"] = fetched_at
+    session.execute(delete(FuelPriceAggregate))
+    if rows:
+        session.execute(insert(FuelPriceAggregate), rows)
+    return len(rows)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+from typing import Generic, Hashable, TypeVar
+
+from ..schemas import TripCalcRequest
+from .calc import CalcContext
+
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "4096"))
+QUOTE_CACHE_TTL_S = float(os.getenv("QUOTE_CACHE_TTL_S", "600"))
+
+T = TypeVar("T")
+
+# Columnas del vehiculo guardado y del agregado que pueden cambiar el resultado de un calculo.
+_VEHICLE_FIELDS = (
+    "consumption_l_per_100km",
+    "consumption_kwh_per_100km",
+    "phev_electric_share",
+    "market_value_eur",
+    "current_km",
+)
+_AGGREGATE_FIELDS = (
+    "total_cost_eur",
+    "event_count",
+    "odometer_count",
+    "min_odometer_km",
+    "max_odometer_km",
+    "updated_at",
+)
+
+
+@dataclass(frozen=True)
+class QuoteCacheStats:
+    size: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QuoteCache(Generic[T]):
+    """
+    Cache LRU con TTL para resultados de calculo, protegida con un Lock (se usa desde varios hilos).
+
+    La clave ya incluye la version de los datos, asi que una entrada nunca se invalida: cuando cambian
+    los datos deja de pedirse y sale por LRU o por TTL. `max_entries=0` desactiva la cache.
+    """
+
+    def __init__(self, max_entries: int = QUOTE_CACHE_SIZE, ttl_seconds: float = QUOTE_CACHE_TTL_S) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+        self._lock = Lock()
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> T | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            stored_at, value = entry
+            if monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> QuoteCacheStats:
+        with self._lock:
+            return QuoteCacheStats(
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                ttl_seconds=self.ttl_seconds,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+            )
+
+
+def request_fingerprint(payload: TripCalcRequest) -> str:
+    """
+    Hash canonico de la peticion: claves ordenadas y defaults explicitos, asi que dos cuerpos
+    equivalentes (orden distinto, campo omitido o a null) dan el mismo valor.
+    """
+
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def data_stamp(context: CalcContext) -> tuple[object, ...]:
+    """
+    Version de todos los datos que lee el calculo: la del contexto ya cargado, sin mas consultas.
+
+    Precios y tablas son snapshots en memoria (su `version` cambia en cada publicacion); del vehiculo
+    guardado y su agregado se toman los campos que usa el calculo. El ano entra porque la
+    depreciacion depende de la antiguedad del vehiculo; el rango de consumo del catalogo, porque
+    cambia los percentiles del modo de incertidumbre.
+    """
+
+    vehicle = context.vehicle
+    aggregate = context.aggregate
+    return (
+        context.fuel.version,
+        context.rates.version,
+        context.year,
+        tuple(getattr(vehicle, name) for name in _VEHICLE_FIELDS) if vehicle is not None else None,
+        tuple(getattr(aggregate, name) for name in _AGGREGATE_FIELDS) if aggregate is not None else None,
+        context.consumption_range,
+    )
+
+
+def cacheable(payload: TripCalcRequest) -> bool:
+    """
+    Sin `seed` el Monte Carlo es aleatorio a proposito: cachearlo repetiria la misma muestra.
+    """
+
+    return payload.uncertainty is None or payload.uncertainty.seed is not None
+
+
+def quote_key(context: CalcContext, payload: TripCalcRequest) -> tuple[str, tuple[object, ...]]:
+    return request_fingerprint(payload), data_stamp(context)
+
+
+QUOTE_CACHE: QuoteCache = QuoteCache()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from threading import Lock
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import DepreciationModel, MaintenanceTemplate
+from .data_versions import RATE_TABLES, VersionCheck, read_data_version
+from .kernel import DepreciationRates
+
+DEFAULT_MAINTENANCE_PER_KM = 0.05
+MONTHLY_TEMPLATE_KM = 15000
+
+DEFAULT_DEPRECIATION = DepreciationRates(base_value_eur=25000, annual_rate=0.12, km_rate=0.02, min_residual_pct=0.2)
+
+
+@dataclass(frozen=True)
+class RateEntry:
+    maintenance_per_km: float
+    depreciation: DepreciationRates
+
+
+DEFAULT_RATES = RateEntry(maintenance_per_km=DEFAULT_MAINTENANCE_PER_KM, depreciation=DEFAULT_DEPRECIATION)
+
+
+@dataclass(frozen=True)
+class RateTables:
+    """
+    Tarifas por (powertrain_type, segment) con la cadena de fallback ya resuelta.
+
+    La clave (powertrain_type, None) guarda el fallback por powertrain para segmentos sin datos propios.
+    """
+
+    version: int
+    entries: dict[tuple[str, str | None], RateEntry] = field(default_factory=dict)
+
+    def lookup(self, powertrain_type: str, segment: str) -> RateEntry:
+        entry = self.entries.get((powertrain_type, segment))
+        if entry is None:
+            entry = self.entries.get((powertrain_type, None), DEFAULT_RATES)
+        return entry
+
+
+_TABLES: RateTables | None = None
+_LOCK = Lock()
+_CHECK = VersionCheck(RATE_TABLES)
+
+
+def _template_rate(item: MaintenanceTemplate) -> float:
+    if item.every_km and item.every_km > 0:
+        return item.cost_eur / item.every_km
+    if item.every_months and item.every_months > 0:
+        return item.cost_eur / MONTHLY_TEMPLATE_KM
+    return 0.0
+
+
+def _depreciation_rates(model: DepreciationModel) -> DepreciationRates:
+    return DepreciationRates(
+        base_value_eur=model.base_value_eur,
+        annual_rate=model.annual_rate,
+        km_rate=model.km_rate,
+        min_residual_pct=model.min_residual_pct,
+    )
+
+
+def build_rate_tables(session: Session) -> RateTables:
+    """
+    Lee plantillas y modelos de depreciacion una vez y publica la tabla compilada.
+
+    La version de `data_versions` se lee antes que las tablas: si un import entra entre medias,
+    la siguiente comprobacion vera una version distinta y se vuelve a compilar.
+    """
+
+    data_version = read_data_version(session, RATE_TABLES)
+    maintenance: dict[tuple[str, str | None], float] = {}
+    for item in session.execute(select(MaintenanceTemplate)).scalars():
+        rate = _template_rate(item)
+        for key in ((item.powertrain_type, item.segment), (item.powertrain_type, None)):
+            maintenance[key] = maintenance.get(key, 0.0) + rate
+
+    depreciation: dict[tuple[str, str | None], DepreciationRates] = {}
+    for model in session.execute(select(DepreciationModel).order_by(DepreciationModel.id.asc())).scalars():
+        rates = _depreciation_rates(model)
+        depreciation.setdefault((model.powertrain_type, model.segment), rates)
+        depreciation.setdefault((model.powertrain_type, None), rates)
+
+    entries: dict[tuple[str, str | None], RateEntry] = {}
+    for key in set(maintenance) | set(depreciation):
+        fallback = (key[0], None)
+        per_km = maintenance.get(key) if key in maintenance else maintenance.get(fallback, 0.0)
+        entries[key] = RateEntry(
+            maintenance_per_km=per_km or DEFAULT_MAINTENANCE_PER_KM,
+            depreciation=depreciation.get(key) or depreciation.get(fallback) or DEFAULT_DEPRECIATION,
+        )
+
+    global _TABLES
+    with _LOCK:
+        tables = RateTables(version=(_TABLES.version + 1 if _TABLES else 1), entries=entries)
+        _TABLES = tables
+    _CHECK.mark(data_version)
+    return tables
+
+
+def get_rate_tables(session: Session | None = None) -> RateTables:
+    """
+    Devuelve la tabla vigente; si no se ha compilado aun, la compila con `session`.
+
+    Con `session`, cada DATA_VERSION_CHECK_S se compara con `data_versions` y se recompila si
+    `import_kaggle.py` o `seed.py` han escrito plantillas desde otro proceso.
+    """
+
+    tables = _TABLES
+    if session is None:
+        return tables if tables is not None else RateTables(version=0)
+    if tables is None or _CHECK.stale(session):
+        return build_rate_tables(session)
+    return tables
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import monotonic
+from typing import Awaitable, Callable
+
+STATION_SNAPSHOT_TTL_S = float(os.getenv("STATION_SNAPSHOT_TTL_S", "1800"))
+PRICE_PREFIX = "Precio "
+# Celdas de la rejilla espacial en grados (~5.5 km de latitud).
+GRID_CELL_DEG = 0.05
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+# Nombres de la API -> columna de Minetur (sin "Precio ").
+FUEL_COLUMNS = {
+    "gasoline": "Gasolina 95 E5",
+    "gasoline_98": "Gasolina 98 E5",
+    "diesel": "Gasoleo A",
+    "diesel_premium": "Gasoleo Premium",
+    "lpg": "Gases licuados del petróleo",
+}
+
+
+def _parse_float(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class Station:
+    id: str | None
+    label: str | None
+    address: str | None
+    postal_code: str | None
+    municipality: str | None
+    province: str | None
+    schedule: str | None
+    latitude: float | None
+    longitude: float | None
+    prices: dict[str, float]
+
+    def as_item(self) -> dict[str, object]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "address": self.address,
+            "postal_code": self.postal_code,
+            "municipality": self.municipality,
+            "province": self.province,
+            "schedule": self.schedule,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "prices": {
+                "gasoline_95_e5": self.prices.get("Gasolina 95 E5"),
+                "diesel_a": self.prices.get("Gasoleo A"),
+            },
+        }
+
+
+def station_from_record(record: dict) -> Station:
+    """
+    Convierte un elemento de `ListaEESSPrecio` en un Station compacto (precios por columna sin el prefijo).
+    """
+
+    prices: dict[str, float] = {}
+    for column, raw in record.items():
+        if column.startswith(PRICE_PREFIX):
+            value = _parse_float(raw)
+            if value:
+                prices[column[len(PRICE_PREFIX) :]] = value
+    postal_code = record.get("C.P.")
+    return Station(
+        id=record.get("IDEESS"),
+        label=record.get("Rótulo"),
+        address=record.get("Dirección"),
+        postal_code=str(postal_code).strip() if postal_code is not None else None,
+        municipality=record.get("Municipio"),
+        province=record.get("Provincia"),
+        schedule=record.get("Horario"),
+        latitude=_parse_float(record.get("Latitud")),
+        longitude=_parse_float(record.get("Longitud (WGS84)")),
+        prices=prices,
+    )
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / GRID_CELL_DEG), math.floor(lon / GRID_CELL_DEG)
+
+
+def parse_source_date(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%d/%m/%Y %H:%M:%S")
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class StationSnapshot:
+    stations: tuple[Station, ...]
+    fetched_at: datetime | None
+    loaded_at: float = field(default_factory=monotonic)
+    by_postal_code: dict[str, tuple[Station, ...]] = field(default_factory=dict)
+    grid: dict[tuple[int, int], tuple[Station, ...]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, stations: list[Station], fetched_at: datetime | None, loaded_at: float | None = None) -> StationSnapshot:
+        index: dict[str, list[Station]] = {}
+        grid: dict[tuple[int, int], list[Station]] = {}
+        for station in stations:
+            if station.postal_code:
+                index.setdefault(station.postal_code, []).append(station)
+            if station.latitude is not None and station.longitude is not None:
+                grid.setdefault(_cell(station.latitude, station.longitude), []).append(station)
+        return cls(
+            stations=tuple(stations),
+            fetched_at=fetched_at,
+            loaded_at=monotonic() if loaded_at is None else loaded_at,
+            by_postal_code={key: tuple(value) for key, value in index.items()},
+            grid={key: tuple(value) for key, value in grid.items()},
+        )
+
+    def by_postal(self, postal_code: str) -> tuple[Station, ...]:
+        return self.by_postal_code.get(postal_code.strip(), ())
+
+    def cheapest_nearby(
+        self, lat: float, lon: float, radius_km: float, fuel_column: str, limit: int
+    ) -> list[tuple[float, float, Station]]:
+        """
+        Las `limit` estaciones mas baratas para `fuel_column` dentro del radio, como (precio, km, estacion).
+
+        Solo se recorren las celdas de la rejilla que cubren el rectangulo del radio.
+        """
+
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+        min_row, min_col = _cell(lat - dlat, lon - dlon)
+        max_row, max_col = _cell(lat + dlat, lon + dlon)
+        candidates: list[tuple[float, float, int, Station]] = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for station in self.grid.get((row, col), ()):
+                    price = station.prices.get(fuel_column)
+                    if price is None:
+                        continue
+                    distance = haversine_km(lat, lon, station.latitude, station.longitude)
+                    if distance <= radius_km:
+                        candidates.append((price, distance, len(candidates), station))
+        return [(price, distance, station) for price, distance, _, station in heapq.nsmallest(limit, candidates)]
+
+
+class StationSnapshotCache:
+    """
+    Snapshot compartido de estaciones con TTL y refresco single-flight.
+
+    Solo la primera carga espera; una vez hay datos, las lecturas caducadas devuelven el snapshot
+    anterior y lanzan una unica tarea de refresco en el event loop.
+    """
+
+    def __init__(self, ttl_seconds: float = STATION_SNAPSHOT_TTL_S) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: StationSnapshot | None = None
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+        self._refresh: asyncio.Task | None = None
+
+    def publish(self, snapshot: StationSnapshot) -> None:
+        self._snapshot = snapshot
+
+    def peek(self) -> StationSnapshot | None:
+        return self._snapshot
+
+    def _expired(self, snapshot: StationSnapshot) -> bool:
+        return monotonic() - snapshot.loaded_at > self.ttl_seconds
+
+    def _first_load_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refresh_in_background(self, loader: Callable[[], Awaitable[StationSnapshot]]) -> None:
+        if self._refresh is not None and not self._refresh.done():
+            return
+
+        async def run() -> None:
+            try:
+                self._snapshot = await loader()
+            except RuntimeError:
+                pass  # se mantiene el snapshot anterior
+
+        self._refresh = asyncio.create_task(run(), name="station-snapshot-refresh")
+
+    async def get(self, loader: Callable[[], Awaitable[StationSnapshot]]) -> StationSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            if self._expired(snapshot):
+                self._refresh_in_background(loader)
+            return snapshot
+        async with self._first_load_lock():
+            snapshot = self._snapshot
+            if snapshot is None:
+                snapshot = await loader()
+                self._snapshot = snapshot
+            return snapshot
+
+
+STATION_CACHE = StationSnapshotCache()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from datetime import datetime
+from time import monotonic
+
+from sqlalchemy import Table, and_, func, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import FuelStation, FuelStationPrice
+from .bulk_load import batched, dialect_insert
+from .station_snapshot import Station, StationSnapshot
+
+BATCH_SIZE = 2000
+STATION_COLUMNS = (
+    "label",
+    "address",
+    "postal_code",
+    "municipality",
+    "province",
+    "schedule",
+    "latitude",
+    "longitude",
+    "updated_at",
+)
+
+
+def _upsert_statement(session: Session, table: Table, key: str, columns: tuple[str, ...]):
+    stmt = dialect_insert(session, table)
+    return stmt.on_conflict_do_update(index_elements=[key], set_={name: stmt.excluded[name] for name in columns})
+
+
+def _latest_prices(session: Session) -> dict[tuple[str, str], float | None]:
+    latest = (
+        select(
+            FuelStationPrice.station_id,
+            FuelStationPrice.fuel,
+            func.max(FuelStationPrice.fetched_at).label("fetched_at"),
+        )
+        .group_by(FuelStationPrice.station_id, FuelStationPrice.fuel)
+        .subquery()
+    )
+    stmt = select(FuelStationPrice.station_id, FuelStationPrice.fuel, FuelStationPrice.price_eur_per_unit).join(
+        latest,
+        and_(
+            FuelStationPrice.station_id == latest.c.station_id,
+            FuelStationPrice.fuel == latest.c.fuel,
+            FuelStationPrice.fetched_at == latest.c.fetched_at,
+        ),
+    )
+    return {(station_id, fuel): price for station_id, fuel, price in session.execute(stmt)}
+
+
+def persist_stations(session: Session, stations: tuple[Station, ...], fetched_at: datetime) -> tuple[int, int]:
+    """
+    Guarda estaciones (upsert) y solo los precios que han cambiado desde la ultima carga.
+
+    Un combustible con precio vigente que ya no llega (o cuya estacion desaparecio) se cierra con
+    una fila de precio NULL, para que el historico y el snapshot reconstruido no lo sigan dando.
+    Todo va en lotes de `BATCH_SIZE` filas por executemany; el commit queda para quien llama.
+    Devuelve (estaciones escritas, filas nuevas en el historico, incluidas las de retirada).
+    """
+
+    station_rows = [
+        {
+            "id": station.id,
+            "label": station.label,
+            "address": station.address,
+            "postal_code": station.postal_code,
+            "municipality": station.municipality,
+            "province": station.province,
+            "schedule": station.schedule,
+            "latitude": station.latitude,
+            "longitude": station.longitude,
+            "updated_at": fetched_at,
+        }
+        for station in stations
+        if station.id
+    ]
+    upsert = _upsert_statement(session, FuelStation.__table__, "id", STATION_COLUMNS)
+    for batch in batched(station_rows, BATCH_SIZE):
+        session.execute(upsert, batch)
+
+    previous = _latest_prices(session)
+    price_rows = [
+        {"station_id": station.id, "fuel": fuel, "price_eur_per_unit": price, "fetched_at": fetched_at}
+        for station in stations
+        if station.id
+        for fuel, price in station.prices.items()
+        if previous.get((station.id, fuel)) != price
+    ]
+    current = {(station.id, fuel) for station in stations if station.id for fuel in station.prices}
+    price_rows += [
+        {"station_id": station_id, "fuel": fuel, "price_eur_per_unit": None, "fetched_at": fetched_at}
+        for (station_id, fuel), price in previous.items()
+        if price is not None and (station_id, fuel) not in current
+    ]
+    for batch in batched(price_rows, BATCH_SIZE):
+        session.execute(insert(FuelStationPrice), batch)
+    return len(station_rows), len(price_rows)
+
+
+def load_station_snapshot_from_db(session: Session) -> StationSnapshot | None:
+    """
+    Reconstruye el snapshot desde las tablas locales (ultimo precio por estacion y combustible).
+
+    Solo entran las estaciones de la ultima carga (`updated_at` mas reciente) y los precios no retirados.
+    `loaded_at` se retrasa segun la antiguedad de los datos para que el TTL los trate como tal.
+    """
+
+    fetched_at = session.execute(select(func.max(FuelStation.updated_at))).scalar()
+    if fetched_at is None:
+        return None
+    prices: dict[str, dict[str, float]] = {}
+    for (station_id, fuel), price in _latest_prices(session).items():
+        if price is not None:
+            prices.setdefault(station_id, {})[fuel] = price
+    stations = [
+        Station(
+            id=row.id,
+            label=row.label,
+            address=row.address,
+            postal_code=row.postal_code,
+            municipality=row.municipality,
+            province=row.province,
+            schedule=row.schedule,
+            latitude=row.latitude,
+            longitude=row.longitude,
+            prices=prices.get(row.id, {}),
+        )
+        for row in session.execute(select(FuelStation).where(FuelStation.updated_at == fetched_at)).scalars()
+    ]
+    age = (datetime.utcnow() - fetched_at).total_seconds()
+    return StationSnapshot.build(stations, fetched_at, loaded_at=monotonic() - max(age, 0.0))
@@ -0,0 +1,103 @@
+"""
+Escritura y lectura en streaming de ficheros tabulares (CSV, CSV comprimido, Parquet) para los scripts.
+
+Las filas llegan en lotes de tuplas en el orden de `columns`; nunca se acumula el fichero entero.
+pyarrow y zstandard son opcionales: `missing_dependency` dice que falta antes de empezar.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Mapping, Sequence
+
+try:
+    import zstandard  # pip install zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa  # pip install pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# En Parquet la compresion es el codec de columnas; "none" deja el de por defecto (snappy).
+PARQUET_CODECS = {"none": "snappy", "gzip": "gzip", "zstd": "zstd"}
+
+
+def missing_dependency(fmt: str, compression: str = "none", reads_parquet: bool = False) -> str | None:
+    if (fmt == "parquet" or reads_parquet) and pa is None:
+        return "Parquet files need pyarrow (pip install pyarrow)"
+    if fmt == "csv" and compression == "zstd" and zstandard is None:
+        return "zstd compression needs zstandard (pip install zstandard)"
+    return None
+
+
+@contextmanager
+def open_binary(path: Path, compression: str = "none") -> Iterator[BinaryIO]:
+    if compression == "gzip":
+        with gzip.open(path, "wb", compresslevel=6) as handle:
+            yield handle
+    elif compression == "zstd":
+        with path.open("wb") as raw, zstandard.ZstdCompressor(level=3).stream_writer(raw) as handle:
+            yield handle
+    else:
+        with path.open("wb") as handle:
+            yield handle
+
+
+def write_csv(
+    batches: Iterable[list[tuple]], path: Path, columns: Sequence[str], compression: str = "none"
+) -> int:
+    written = 0
+    with open_binary(path, compression) as raw:
+        handle = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            written += len(batch)
+        handle.flush()
+        handle.detach()
+    return written
+
+
+def arrow_schema(columns: Sequence[str], types: Mapping[str, str], default: str = "string"):
+    """
+    Esquema Arrow a partir de alias de tipo ("int64", "float64", "bool", "timestamp[us]", ...).
+    """
+
+    return pa.schema([(name, pa.type_for_alias(types.get(name, default))) for name in columns])
+
+
+def write_parquet(
+    batches: Iterable[list[tuple]],
+    path: Path,
+    columns: Sequence[str],
+    types: Mapping[str, str],
+    compression: str = "none",
+    default_type: str = "string",
+) -> int:
+    """
+    Escribe un row group de Parquet por lote.
+    """
+
+    schema = arrow_schema(columns, types, default_type)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression=PARQUET_CODECS[compression]) as writer:
+        for batch in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            written += len(batch)
+    return written
+
+
+def iter_parquet_rows(path: Path, batch_size: int) -> Iterator[list[dict]]:
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import unicodedata
+
+
+def normalize_text(value: str | None) -> str:
+    """
+    Minusculas y sin acentos: "Citroën" -> "citroen".
+    """
+
+    if not value:
+        return ""
+    if value.isascii():
+        return value.lower()
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def region_keys(name: str | None) -> set[str]:
+    """
+    Claves normalizadas con las que se puede buscar una provincia o municipio de Minetur.
+
+    Cubre los nombres bilingues ("VALENCIA / VALÈNCIA") y el articulo entre parentesis
+    ("CORUÑA (A)" -> "coruna", "a coruna").
+    """
+
+    keys: set[str] = set()
+    for part in normalize_text(name).split("/"):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        keys.add(part)
+        if part.endswith(")") and "(" in part:
+            base, _, article = part[:-1].partition("(")
+            base = base.strip()
+            article = article.strip()
+            keys.add(base)
+            if article:
+                keys.add(f"{article} {base}" if not article.endswith("'") else f"{article}{base}")
+    return keys
@@ -0,0 +1,143 @@
+"""
+Modo de incertidumbre del calculo de un viaje: Monte Carlo vectorizado con NumPy.
+
+Se muestrean las tres entradas de la energia que mas varian en la practica: el precio del
+combustible (dispersion entre estaciones de la zona), el consumo (rango del catalogo) y el
+multiplicador de ruta. Mantenimiento, seguro y depreciacion no dependen de ellas y se
+devuelven como rangos sin anchura, para que todos los componentes tengan la misma forma.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from ..schemas import TripCalcRequest
+from .calc import CalcContext, vehicle_params
+from .kernel import ROUTE_MULTIPLIERS, energy_cost
+
+PERCENTILES = (5, 50, 95)
+# Sin rango en el catalogo se supone +-10% sobre el consumo indicado.
+DEFAULT_CONSUMPTION_SPREAD = 0.10
+# (min, moda, max) de una triangular por tipo de ruta; la moda es el multiplicador del calculo puntual.
+# Son supuestos fijos, no ajustados a datos guardados: la respuesta lo dice en sus supuestos.
+ROUTE_MULTIPLIER_RANGES = {
+    "city": (1.05, ROUTE_MULTIPLIERS["city"], 1.30),
+    "mixed": (0.92, ROUTE_MULTIPLIERS["mixed"], 1.12),
+    "highway": (0.85, ROUTE_MULTIPLIERS["highway"], 1.0),
+}
+# Entre p10 y p90 de una normal hay 2 * 1.2816 desviaciones tipicas.
+_P10_P90_SIGMAS = 2 * 1.2815515655446004
+
+
+@dataclass(frozen=True)
+class Percentiles:
+    p5: float
+    p50: float
+    p95: float
+
+
+@dataclass
+class UncertaintyResult:
+    samples: int
+    energy: Percentiles
+    maintenance: Percentiles
+    insurance: Percentiles
+    depreciation: Percentiles
+    total: Percentiles
+    assumptions: list[str]
+
+
+def _percentiles(draws: np.ndarray) -> list[Percentiles]:
+    # Una fila por componente; una sola llamada a np.percentile para todas.
+    cuts = np.percentile(draws, PERCENTILES, axis=-1)
+    return [Percentiles(*(float(value) for value in row)) for row in cuts.T]
+
+
+def _fixed(amount: float) -> Percentiles:
+    return Percentiles(amount, amount, amount)
+
+
+def consumption_factor_range(context: CalcContext) -> tuple[float, float, str]:
+    """
+    Factor (min, max) sobre el consumo: el rango del catalogo relativo a su punto medio.
+
+    Se usa la anchura relativa y no los valores, porque las unidades del catalogo no siempre
+    coinciden con las del consumo de la peticion (l/100km frente a kWh/100km en los PHEV).
+    """
+
+    if context.consumption_range is not None:
+        low, high = context.consumption_range
+        if high > low:
+            middle = (low + high) / 2
+            low, high = low / middle, high / middle
+            return low, high, f"consumption x{low:.2f}-{high:.2f} from catalog range"
+    spread = DEFAULT_CONSUMPTION_SPREAD
+    return 1 - spread, 1 + spread, f"consumption +-{spread:.0%} (no catalog range)"
+
+
+def simulate_trip(
+    context: CalcContext,
+    payload: TripCalcRequest,
+    maintenance_eur: float,
+    insurance_eur: float,
+    depreciation_eur: float,
+) -> UncertaintyResult:
+    """
+    p5/p50/p95 por componente con `payload.uncertainty.samples` muestras (misma `seed`, mismo resultado).
+
+    El kernel da litros y kWh con el consumo de la peticion y multiplicador 1; como la energia es
+    lineal en consumo, ruta y precio, cada muestra solo escala esos dos valores. Se llama despues de
+    `compute_energy`, que ya ha validado los datos.
+    """
+
+    options = payload.uncertainty
+    samples = options.samples
+    rng = np.random.default_rng(options.seed)
+    vehicle, _ = vehicle_params(context, payload)
+    base = energy_cost(vehicle, payload.trip_km, 1.0, 1.0, 1.0)
+    assumptions: list[str] = []
+
+    route_low, route_mode, route_high = ROUTE_MULTIPLIER_RANGES[payload.route_type]
+    factor = rng.triangular(route_low, route_mode, route_high, samples)
+    assumptions.append(
+        f"route multiplier triangular {route_low}-{route_high}, mode {route_mode} "
+        f"(fixed assumption for {payload.route_type} routes, not derived from stored data)"
+    )
+    consumption_low, consumption_high, consumption_note = consumption_factor_range(context)
+    factor *= rng.triangular(consumption_low, 1.0, consumption_high, samples)
+    assumptions.append(consumption_note)
+
+    energy = np.zeros(samples)
+    if base.fuel_liters:
+        fuel_type = "gasoline" if vehicle.powertrain_type == "phev" else vehicle.powertrain_type
+        price = context.fuel.lookup(fuel_type, payload.province, payload.municipality).price_eur_per_unit
+        spread = context.fuel.spread(fuel_type, payload.province, payload.municipality)
+        if spread is not None and spread[1] > spread[0]:
+            sigma = (spread[1] - spread[0]) / _P10_P90_SIGMAS
+            prices = np.maximum(rng.normal(price, sigma, samples), 0.0)
+            assumptions.append(f"{fuel_type} price normal {price:.3f} +- {sigma:.3f} eur/l from station p10-p90")
+        else:
+            prices = price
+            assumptions.append(f"{fuel_type} price fixed {price:.3f} eur/l (no station spread)")
+        energy += base.fuel_liters * prices
+    if base.electric_kwh:
+        energy += base.electric_kwh * payload.electricity_price_eur_per_kwh
+        assumptions.append("electricity price fixed (user input)")
+    energy *= factor
+    assumptions.append(
+        "maintenance, insurance and depreciation not sampled: zero-width ranges at the point estimate"
+    )
+
+    fixed = maintenance_eur + insurance_eur + depreciation_eur
+    energy_range, total_range = _percentiles(np.vstack((energy, energy + fixed)))
+    return UncertaintyResult(
+        samples=samples,
+        energy=energy_range,
+        maintenance=_fixed(maintenance_eur),
+        insurance=_fixed(insurance_eur),
+        depreciation=_fixed(depreciation_eur),
+        total=total_range,
+        assumptions=assumptions,
+    )
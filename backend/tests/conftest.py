@@ -0,0 +1,303 @@
+"""
+Base temporal sembrada y comprobacion de planes de consulta, compartidas por los tests y por
+`backend/benchmarks/query_plans.py` (que las ejecuta a mayor escala desde la linea de comandos).
+"""
+
+from __future__ import annotations
+
+import re
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.db import Base, EngineProfile, make_engine
+from backend.migrations import run_migrations
+from backend.models import (
+    DepreciationModel,
+    FuelPrice,
+    FuelStation,
+    FuelStationPrice,
+    InsurancePolicy,
+    MaintenanceEvent,
+    MaintenanceTemplate,
+    User,
+    UserVehicle,
+    VehicleCatalog,
+)
+from backend.schemas import InsuranceInput, MaintenanceInput, TripCalcRequest, UncertaintyInput, VehicleInput
+from backend.services.bulk_load import bulk_insert
+from backend.services.catalog_search import find_catalog_vehicles, rebuild_catalog_fts
+from backend.services.fuel_snapshot import load_fuel_snapshot
+from backend.services.maintenance_aggregates import rebuild_maintenance_aggregates
+from backend.services.rate_tables import build_rate_tables
+
+POWERTRAINS = ("gasoline", "diesel", "hev", "phev", "bev")
+SEGMENTS = ("compact", "suv", "sedan", "van", "generic")
+# "SCAN tabla" sin indice: recorrido completo. Las busquedas por indice salen como SEARCH o "USING ... INDEX".
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?! USING)")
+# Maximo de SELECT por camino: el calculo de un viaje solo consulta el vehiculo guardado con su agregado.
+STATEMENT_BUDGETS = {
+    "POST /api/calc/trip": 1,
+    "POST /api/calc/trip (no saved vehicle)": 0,
+    "POST /api/calc/trip (uncertainty)": 1,
+    "POST /api/calc/trips:batch": 2,
+    "GET /api/maintenance-events": 1,
+    "GET /api/insurance-policies": 1,
+    "GET /api/catalog/vehicles": 2,
+    "GET /api/catalog/vehicles (short token)": 2,
+}
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    statements: int = 0
+    budget: int | None = None
+    full_scans: list[str] = field(default_factory=list)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.statements > self.budget
+
+
+def seed(session: Session, scale: int) -> None:
+    """
+    Rellena cada tabla con `scale` filas o mas, para que un recorrido completo no salga barato.
+    """
+
+    now = datetime.utcnow()
+    session.add(User(name="plans"))
+    session.flush()
+    vehicles = max(scale // 10, 10)
+    bulk_insert(
+        session,
+        UserVehicle,
+        (
+            {
+                "user_id": 1,
+                "powertrain_type": POWERTRAINS[i % len(POWERTRAINS)],
+                "segment": SEGMENTS[i % len(SEGMENTS)],
+                "current_km": 50000.0,
+                "annual_km": 15000.0,
+                "market_value_eur": 15000.0,
+                "consumption_l_per_100km": 6.0,
+                "created_at": now,
+            }
+            for i in range(vehicles)
+        ),
+    )
+    bulk_insert(
+        session,
+        MaintenanceEvent,
+        (
+            {
+                "vehicle_id": 1 + i % vehicles,
+                "category": "service",
+                "event_date": date(2020, 1, 1) + timedelta(days=i % 1500),
+                "odometer_km": 1000.0 * (i % 90),
+                "cost_eur": 100.0,
+            }
+            for i in range(scale)
+        ),
+    )
+    bulk_insert(
+        session,
+        InsurancePolicy,
+        (
+            {
+                "user_id": 1,
+                "vehicle_id": 1 + i % vehicles,
+                "cost_amount": 400.0,
+                "cost_period": "annual",
+                "created_at": now - timedelta(days=i),
+            }
+            for i in range(scale)
+        ),
+    )
+    bulk_insert(
+        session,
+        FuelPrice,
+        (
+            {
+                "fuel_type": ("gasoline", "diesel")[i % 2],
+                "price_eur_per_unit": 1.5,
+                "unit": "eur/l",
+                "source": "plans",
+                "fetched_at": now - timedelta(hours=i // 2),
+            }
+            for i in range(scale)
+        ),
+    )
+    bulk_insert(session, FuelStation, ({"id": str(i), "updated_at": now} for i in range(scale // 10)))
+    bulk_insert(
+        session,
+        FuelStationPrice,
+        (
+            {
+                "station_id": str(i % (scale // 10)),
+                "fuel": "Gasoleo A",
+                "price_eur_per_unit": 1.4,
+                "fetched_at": now - timedelta(days=i // (scale // 10)),
+            }
+            for i in range(scale)
+        ),
+    )
+    bulk_insert(
+        session,
+        MaintenanceTemplate,
+        (
+            {"powertrain_type": p, "segment": s, "category": "service", "cost_eur": 200.0, "every_km": 15000.0}
+            for p in POWERTRAINS
+            for s in SEGMENTS
+        ),
+    )
+    bulk_insert(
+        session,
+        DepreciationModel,
+        (
+            {
+                "powertrain_type": p,
+                "segment": s,
+                "base_value_eur": 25000.0,
+                "annual_rate": 0.12,
+                "km_rate": 0.02,
+                "min_residual_pct": 0.2,
+            }
+            for p in POWERTRAINS
+            for s in SEGMENTS
+        ),
+    )
+    bulk_insert(
+        session,
+        VehicleCatalog,
+        (
+            {"brand": f"BRAND{i % 50}", "model": f"M{i}", "variant": f"V{i}", "source": "plans", "updated_at": now}
+            for i in range(scale)
+        ),
+    )
+    rebuild_maintenance_aggregates(session)
+    session.commit()
+
+
+def _trip(vehicle_id: int | None = 7, uncertainty: UncertaintyInput | None = None) -> TripCalcRequest:
+    return TripCalcRequest(
+        trip_km=300,
+        trip_days=2,
+        vehicle_id=vehicle_id,
+        vehicle=VehicleInput(
+            powertrain_type="gasoline", consumption_l_per_100km=6.0, segment="compact", catalog_vehicle_id=17
+        ),
+        insurance=InsuranceInput(cost_amount=400, cost_period="annual"),
+        maintenance=MaintenanceInput(use_real_costs=True),
+        uncertainty=uncertainty,
+    )
+
+
+def hot_paths() -> dict[str, Callable[[Session], object]]:
+    """
+    Consultas por peticion (las cargas completas de snapshots al arrancar quedan fuera a proposito).
+    """
+
+    from backend.main import calculate_trips, compute_trip, list_insurance, list_maintenance_events
+    from backend.schemas import TripBatchRequest
+
+    return {
+        "POST /api/calc/trip": lambda session: compute_trip(session, _trip()),
+        "POST /api/calc/trip (no saved vehicle)": lambda session: compute_trip(session, _trip(None)),
+        "POST /api/calc/trip (uncertainty)": lambda session: compute_trip(
+            session, _trip(uncertainty=UncertaintyInput(samples=1000, seed=0))
+        ),
+        "POST /api/calc/trips:batch": lambda session: calculate_trips(
+            TripBatchRequest(items=[_trip(7), _trip(8), _trip(None)]), db=session
+        ),
+        "GET /api/maintenance-events": lambda session: list_maintenance_events(7, db=session),
+        "GET /api/insurance-policies": lambda session: list_insurance(7, db=session),
+        "GET /api/catalog/vehicles": lambda session: find_catalog_vehicles(session, "BRAND7 M17", 20),
+        "GET /api/catalog/vehicles (short token)": lambda session: find_catalog_vehicles(session, "BRAND7 m1", 20),
+    }
+
+
+@contextmanager
+def captured_selects(session: Session) -> Iterator[list[tuple[str, object]]]:
+    """
+    Lista (sentencia, parametros) de los SELECT que ejecuta `session` dentro del bloque.
+    """
+
+    captured: list[tuple[str, object]] = []
+    connection = session.connection()
+
+    def capture(_conn, _cursor, statement, parameters, _context, executemany) -> None:
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        yield captured
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+
+@contextmanager
+def scratch_database(rows: int) -> Iterator[sessionmaker]:
+    """
+    Base SQLite temporaria con el esquema migrado, `seed(rows)` y los snapshots cargados.
+    """
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = make_engine(f"sqlite:///{Path(workdir) / 'plans.db'}", EngineProfile())
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        factory = sessionmaker(bind=engine, autoflush=False)
+        with factory() as session:
+            seed(session, rows)
+            rebuild_catalog_fts(session)
+            load_fuel_snapshot(session)
+            build_rate_tables(session)
+        try:
+            yield factory
+        finally:
+            engine.dispose()
+
+
+def check_plans(factory: sessionmaker, paths: dict[str, Callable[[Session], object]]) -> list[PlanCheck]:
+    """
+    Ejecuta cada camino capturando su SQL y pasa cada sentencia por EXPLAIN QUERY PLAN.
+    """
+
+    tables = set(Base.metadata.tables)
+    checks: list[PlanCheck] = []
+    for name, call in paths.items():
+        with factory() as session:
+            # Snapshots recien cargados: la comprobacion periodica de `data_versions` no es del camino.
+            load_fuel_snapshot(session)
+            build_rate_tables(session)
+            with captured_selects(session) as captured:
+                call(session)
+            check = PlanCheck(name=name, statements=len(captured), budget=STATEMENT_BUDGETS.get(name))
+            cursor = session.connection().connection.dbapi_connection.cursor()
+            for statement, parameters in captured:
+                for row in cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall():
+                    detail = row[-1]
+                    match = _FULL_SCAN.match(detail)
+                    if match and match.group(1) in tables:
+                        check.full_scans.append(f"{detail}  <-  {' '.join(statement.split())[:160]}")
+            cursor.close()
+        checks.append(check)
+    return checks
+
+
+# Filas por tabla grande: suficientes para sembrar todos los caminos, pocas para que la suite sea rapida.
+PLAN_ROWS = 1000
+
+
+@pytest.fixture(scope="session")
+def plans_db():
+    with scratch_database(PLAN_ROWS) as factory:
+        yield factory
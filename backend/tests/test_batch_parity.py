@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import pytest
+from pydantic import ValidationError
+
+from backend.schemas import (
+    InsuranceInput,
+    MaintenanceInput,
+    TripBatchRequest,
+    TripCalcRequest,
+    UncertaintyInput,
+    VehicleInput,
+)
+from backend.services.batch_calc import TripResult, calculate_trips_batch
+from backend.services.calc import (
+    compute_depreciation,
+    compute_energy,
+    compute_insurance,
+    compute_maintenance,
+    load_calc_context,
+)
+from backend.services.rate_tables import build_rate_tables
+
+# Un item por rama de las formulas: cada powertrain, vehiculo guardado, valor de mercado y los dos modos de seguro.
+ITEMS = [
+    TripCalcRequest(
+        trip_km=300,
+        trip_days=2,
+        vehicle_id=7,
+        vehicle=VehicleInput(powertrain_type="gasoline", segment="compact", year=2018, current_km=90000),
+        insurance=InsuranceInput(cost_amount=400, cost_period="annual"),
+        maintenance=MaintenanceInput(use_real_costs=True),
+    ),
+    TripCalcRequest(
+        trip_km=120,
+        trip_days=1,
+        route_type="city",
+        vehicle=VehicleInput(powertrain_type="diesel", consumption_l_per_100km=5.1, annual_km=22000),
+        insurance=InsuranceInput(cost_amount=45, cost_period="monthly", mode="per_km"),
+    ),
+    TripCalcRequest(
+        trip_km=450,
+        trip_days=3,
+        route_type="highway",
+        electricity_price_eur_per_kwh=0.21,
+        vehicle=VehicleInput(powertrain_type="bev", consumption_kwh_per_100km=16.5, market_value_eur=21000),
+    ),
+    TripCalcRequest(
+        trip_km=80,
+        trip_days=1,
+        electricity_price_eur_per_kwh=0.18,
+        vehicle=VehicleInput(
+            powertrain_type="phev",
+            consumption_l_per_100km=5.5,
+            consumption_kwh_per_100km=18.0,
+            phev_electric_share=0.6,
+            year=2021,
+        ),
+        insurance=InsuranceInput(cost_amount=600, cost_period="annual", mode="per_km", annual_km=9000),
+    ),
+    TripCalcRequest(
+        trip_km=200,
+        trip_days=1,
+        vehicle=VehicleInput(powertrain_type="bev", consumption_kwh_per_100km=15.0),
+    ),
+]
+
+
+def _single(context, payload: TripCalcRequest) -> TripResult | str:
+    try:
+        energy = compute_energy(context, payload)
+    except ValueError as exc:
+        return str(exc)
+    return TripResult(
+        energy=energy,
+        maintenance=compute_maintenance(context, payload),
+        insurance=compute_insurance(payload),
+        depreciation=compute_depreciation(context, payload),
+    )
+
+
+def test_batch_matches_single_trip(plans_db):
+    with plans_db() as session:
+        build_rate_tables(session)
+        batch = calculate_trips_batch(session, ITEMS)
+        single = [_single(load_calc_context(session, payload), payload) for payload in ITEMS]
+    # El ultimo item no trae precio de electricidad: mismo mensaje de error por los dos caminos.
+    assert single[-1] == "Missing electricity_price_eur_per_kwh"
+    assert batch == single
+
+
+def test_batch_rejects_uncertainty_items():
+    item = ITEMS[1].model_copy(update={"uncertainty": UncertaintyInput(seed=1)})
+    with pytest.raises(ValidationError, match=r"uncertainty is not supported in batch items \(items \[1\]\)"):
+        TripBatchRequest(items=[ITEMS[0], item])
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.tests.conftest import captured_selects
+from backend.schemas import InsuranceInput, MaintenanceInput, TripCalcRequest, UncertaintyInput, VehicleInput
+from backend.services.calc import (
+    compute_depreciation,
+    compute_energy,
+    compute_insurance,
+    compute_maintenance,
+    load_calc_context,
+)
+from backend.services.fuel_snapshot import load_fuel_snapshot
+from backend.services.rate_tables import build_rate_tables
+
+
+def _payload(vehicle_id: int | None, uncertainty: UncertaintyInput | None = None) -> TripCalcRequest:
+    return TripCalcRequest(
+        trip_km=300,
+        trip_days=2,
+        vehicle_id=vehicle_id,
+        vehicle=VehicleInput(
+            powertrain_type="gasoline", consumption_l_per_100km=6.0, segment="compact", catalog_vehicle_id=17
+        ),
+        insurance=InsuranceInput(cost_amount=400, cost_period="annual"),
+        maintenance=MaintenanceInput(use_real_costs=True),
+        uncertainty=uncertainty,
+    )
+
+
+@pytest.mark.parametrize(
+    ("vehicle_id", "uncertainty", "selects", "maintenance_source"),
+    [
+        (7, None, 1, "user events"),
+        (None, None, 0, "template estimates"),
+        # El rango de consumo del catalogo va en la misma consulta que el vehiculo guardado.
+        (7, UncertaintyInput(samples=1000, seed=0), 1, "user events"),
+    ],
+)
+def test_trip_calculation_select_count(plans_db, vehicle_id, uncertainty, selects, maintenance_source):
+    payload = _payload(vehicle_id, uncertainty)
+    with plans_db() as session:
+        load_fuel_snapshot(session)
+        build_rate_tables(session)
+        with captured_selects(session) as captured:
+            context = load_calc_context(session, payload)
+            compute_energy(context, payload)
+            maintenance = compute_maintenance(context, payload)
+            compute_insurance(payload)
+            compute_depreciation(context, payload)
+    assert len(captured) == selects
+    # La consulta unica trae tambien el agregado: el mantenimiento sale del historial sin otra consulta.
+    assert maintenance.source == maintenance_source
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from backend.services.catalog_search import find_catalog_vehicles
+
+
+def test_short_tokens_still_filter_mixed_queries(plans_db):
+    with plans_db() as session:
+        rows = find_catalog_vehicles(session, "BRAND7 m1", 20)
+        everything = find_catalog_vehicles(session, "BRAND7", 20)
+    # "m1" es demasiado corto para el trigram: se exige como prefijo de palabra, no se descarta.
+    assert rows
+    assert len(rows) < len(everything)
+    assert all(row.brand == "BRAND7" and row.model.lower().startswith("m1") for row in rows)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from backend.models import FuelPrice
+from backend.services import fuel_snapshot
+from backend.services.data_versions import FUEL_PRICES, bump_data_version
+from backend.services.fuel_snapshot import get_fuel_snapshot, load_fuel_snapshot
+
+
+def test_fuel_snapshot_reloads_prices_written_by_another_process(plans_db, monkeypatch):
+    with plans_db() as session:
+        before = load_fuel_snapshot(session)
+    # Otro proceso (el ETL, seed.py u otro worker) guarda un precio y sube la version en la misma transaccion.
+    with plans_db() as writer:
+        writer.add(
+            FuelPrice(
+                fuel_type="diesel",
+                price_eur_per_unit=1.234,
+                unit="eur/l",
+                source="other process",
+                fetched_at=datetime.utcnow(),
+            )
+        )
+        bump_data_version(writer, FUEL_PRICES)
+        writer.commit()
+    with plans_db() as session:
+        assert get_fuel_snapshot(session) is before
+        monkeypatch.setattr(fuel_snapshot._CHECK, "ttl_seconds", 0.0)
+        after = get_fuel_snapshot(session)
+    assert after.version > before.version
+    assert after.get("diesel").price_eur_per_unit == 1.234
+    # La version nueva queda marcada: la siguiente comprobacion no vuelve a cargar.
+    with plans_db() as session:
+        assert get_fuel_snapshot(session) is after
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+
+import httpx
+
+from backend.services.fuel_prices import download_station_report
+from backend.services.http_client import AsyncHttpClient
+
+STATIONS = 3000
+
+
+def _payload() -> bytes:
+    record = {
+        "IDEESS": "0",
+        "Rótulo": "STATION",
+        "C.P.": "28001",
+        "Municipio": "Madrid",
+        "Provincia": "MADRID",
+        "Latitud": "40,4",
+        "Longitud (WGS84)": "-3,7",
+        "Precio Gasolina 95 E5": "1,599",
+        "Precio Gasoleo A": "1,499",
+    }
+    stations = [{**record, "IDEESS": str(index)} for index in range(STATIONS)]
+    return json.dumps({"Fecha": "01/01/2026 10:00:00", "ListaEESSPrecio": stations, "ResultadoConsulta": "OK"}).encode()
+
+
+def test_refresh_report_measures_this_download():
+    body = _payload()
+    client = AsyncHttpClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+
+    async def run():
+        try:
+            return await download_station_report(client)
+        finally:
+            await client.aclose()
+
+    report = asyncio.run(run())
+    assert report.stations == STATIONS
+    assert report.source_date == "01/01/2026 10:00:00"
+    # Crecimiento del RSS durante esta descarga, no el pico historico del proceso.
+    if sys.platform.startswith("linux"):
+        assert 0.0 <= report.peak_rss_delta_mb < 200.0
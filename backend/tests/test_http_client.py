@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import httpx
+
+from backend.services.http_client import AsyncHttpClient, BackgroundLoop
+from backend.vehicle_data import NHTSAClient, VehicleSpec
+
+
+def test_sync_recalls_reuse_one_loop_and_pool():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"results": [{"Component": "BRAKES"}]})
+
+    loop = BackgroundLoop()
+    client = NHTSAClient(http=AsyncHttpClient(transport=httpx.MockTransport(handler)), loop=loop)
+    try:
+        vehicle = VehicleSpec(make="PORSCHE", model="PANAMERA", year=2018)
+        assert client.fetch_recalls(vehicle) == [{"Component": "BRAKES"}]
+        pool = client.http._client
+        assert client.fetch_recalls(vehicle) == [{"Component": "BRAKES"}]
+        # Mismo httpx.AsyncClient en la segunda llamada: no se abre un pool nuevo por llamada.
+        assert client.http._client is pool
+        assert len(requests) == 2
+        client.close()
+        assert client.http._client is None
+    finally:
+        loop.close()
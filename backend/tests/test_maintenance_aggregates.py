@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base
+from backend.models import MaintenanceEvent, VehicleMaintenanceAggregate
+from backend.services.maintenance_aggregates import apply_maintenance_event, rebuild_maintenance_aggregates
+
+EVENTS = [
+    (1, 120.0, 30000.0),
+    (1, 80.0, None),
+    (2, 60.0, 15000.0),
+    (1, 300.0, 21000.0),
+    (2, 45.0, 18000.0),
+]
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def _aggregates(session) -> list[tuple]:
+    agg = VehicleMaintenanceAggregate
+    stmt = select(
+        agg.vehicle_id, agg.total_cost_eur, agg.event_count, agg.odometer_count, agg.min_odometer_km, agg.max_odometer_km
+    ).order_by(agg.vehicle_id)
+    return [tuple(row) for row in session.execute(stmt)]
+
+
+def test_upserted_aggregates_match_a_rebuild(session):
+    # El primer evento de cada vehiculo entra por el INSERT del upsert; los siguientes por DO UPDATE.
+    for vehicle_id, cost, odometer in EVENTS:
+        event = MaintenanceEvent(vehicle_id=vehicle_id, category="service", cost_eur=cost, odometer_km=odometer)
+        session.add(event)
+        session.flush()
+        apply_maintenance_event(session, event)
+    applied = _aggregates(session)
+
+    rebuild_maintenance_aggregates(session)
+    assert applied == _aggregates(session)
+    assert applied[0] == (1, 500.0, 3, 2, 21000.0, 30000.0)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.tests.conftest import check_plans, hot_paths
+
+PATHS = hot_paths()
+
+
+@pytest.fixture(scope="module")
+def checks(plans_db):
+    return {check.name: check for check in check_plans(plans_db, PATHS)}
+
+
+@pytest.mark.parametrize("name", list(PATHS))
+def test_hot_path_has_no_full_scan(checks, name):
+    assert checks[name].full_scans == []
+
+
+@pytest.mark.parametrize("name", list(PATHS))
+def test_hot_path_within_statement_budget(checks, name):
+    check = checks[name]
+    assert not check.over_budget, f"{check.statements} SELECTs, budget {check.budget}"
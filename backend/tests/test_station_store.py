@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base
+from backend.models import FuelStationPrice
+from backend.services.station_snapshot import Station
+from backend.services.station_store import load_station_snapshot_from_db, persist_stations
+
+
+def _station(station_id: str, prices: dict[str, float]) -> Station:
+    return Station(
+        id=station_id,
+        label=f"Station {station_id}",
+        address=None,
+        postal_code="28001",
+        municipality="Madrid",
+        province="Madrid",
+        schedule=None,
+        latitude=40.4,
+        longitude=-3.7,
+        prices=prices,
+    )
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def test_removed_fuels_and_stations_leave_the_rebuilt_snapshot(session):
+    first = datetime.utcnow() - timedelta(hours=2)
+    persist_stations(
+        session, (_station("1", {"Gasoleo A": 1.5, "Gasolina 95 E5": 1.6}), _station("2", {"Gasoleo A": 1.4})), first
+    )
+    # Segunda carga sin cambios de precio: la estacion 1 deja el diesel y la 2 desaparece.
+    second = first + timedelta(hours=1)
+    _, written = persist_stations(session, (_station("1", {"Gasolina 95 E5": 1.6}),), second)
+    session.commit()
+
+    assert written == 2
+    removals = session.execute(
+        select(FuelStationPrice.station_id, FuelStationPrice.fuel).where(FuelStationPrice.price_eur_per_unit.is_(None))
+    ).all()
+    assert sorted(removals) == [("1", "Gasoleo A"), ("2", "Gasoleo A")]
+
+    snapshot = load_station_snapshot_from_db(session)
+    assert [(station.id, station.prices) for station in snapshot.stations] == [("1", {"Gasolina 95 E5": 1.6})]
+    # La antiguedad es la de la ultima carga aunque no cambiara ningun precio.
+    assert snapshot.fetched_at == second
+
+    # Si la estacion vuelve a vender el combustible, se guarda aunque el precio sea el de antes.
+    back = (_station("1", {"Gasoleo A": 1.5, "Gasolina 95 E5": 1.6}),)
+    _, written = persist_stations(session, back, second + timedelta(hours=1))
+    assert written == 1
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from backend.main import quote_trip
+from backend.schemas import TripCalcRequest, UncertaintyInput, VehicleInput
+from backend.services.calc import load_calc_context
+from backend.services.quote_cache import QUOTE_CACHE
+
+
+def _payload(seed: int | None) -> TripCalcRequest:
+    return TripCalcRequest(
+        trip_km=250,
+        trip_days=1,
+        vehicle=VehicleInput(powertrain_type="gasoline", consumption_l_per_100km=6.5),
+        uncertainty=UncertaintyInput(samples=2000, seed=seed),
+    )
+
+
+def _quote(plans_db, payload: TripCalcRequest):
+    with plans_db() as session:
+        return quote_trip(load_calc_context(session, payload), payload)
+
+
+def test_unseeded_draws_skip_the_quote_cache(plans_db):
+    hits = QUOTE_CACHE.stats().hits
+    first = _quote(plans_db, _payload(None))
+    second = _quote(plans_db, _payload(None))
+    assert QUOTE_CACHE.stats().hits == hits
+    assert first.uncertainty.energy != second.uncertainty.energy
+
+    seeded = _quote(plans_db, _payload(7))
+    assert _quote(plans_db, _payload(7)).uncertainty == seeded.uncertainty
+    assert QUOTE_CACHE.stats().hits == hits + 1
+
+
+def test_uncertainty_assumptions_state_fixed_ranges_and_zero_widths(plans_db):
+    uncertainty = _quote(plans_db, _payload(3)).uncertainty
+    assumptions = " | ".join(uncertainty.assumptions)
+    assert "fixed assumption for mixed routes, not derived from stored data" in assumptions
+    assert "zero-width ranges at the point estimate" in assumptions
+    assert uncertainty.maintenance.p5 == uncertainty.maintenance.p95
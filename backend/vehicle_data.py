@@ -8,7 +8,11 @@ from pathlib import Path
 from typing import Any, Iterable
 
 import pandas as pd
-import requests
+
+try:
+    from .services.http_client import HTTP_CLIENT, SYNC_LOOP, AsyncHttpClient, BackgroundLoop
+except ImportError:  # ejecutado desde backend/ (cli.py, examples)
+    from services.http_client import HTTP_CLIENT, SYNC_LOOP, AsyncHttpClient, BackgroundLoop
 
 
 @dataclass(frozen=True)
@@ -22,26 +26,42 @@ class NHTSAClient:
     """
     Cliente mínimo para endpoints públicos de NHTSA.
 
+    `fetch_recalls` (sincrono) corre en `SYNC_LOOP`: el pool de `http` sigue abierto entre llamadas.
+    Desde codigo asincrono, usar `fetch_recalls_async` directamente.
+
     Docs: https://vpic.nhtsa.dot.gov/api/
     """
 
-    def __init__(self, base_url: str = "https://api.nhtsa.gov", timeout_s: int = 30) -> None:
+    def __init__(
+        self,
+        base_url: str = "https://api.nhtsa.gov",
+        timeout_s: int = 30,
+        http: AsyncHttpClient = HTTP_CLIENT,
+        loop: BackgroundLoop = SYNC_LOOP,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.timeout_s = timeout_s
-
-    def fetch_recalls(self, vehicle: VehicleSpec) -> list[dict[str, Any]]:
-        url = (
-            f"{self.base_url}/recalls/recallsByVehicle"
-            f"?make={vehicle.make}&model={vehicle.model}&modelYear={vehicle.year}"
+        self.http = http
+        self.loop = loop
+
+    async def fetch_recalls_async(self, vehicle: VehicleSpec) -> list[dict[str, Any]]:
+        response = await self.http.get(
+            f"{self.base_url}/recalls/recallsByVehicle",
+            params={"make": vehicle.make, "model": vehicle.model, "modelYear": vehicle.year},
+            timeout=self.timeout_s,
         )
-        response = requests.get(url, timeout=self.timeout_s)
-        response.raise_for_status()
         payload: dict[str, Any] = response.json()
         results = payload.get("results")
         if not isinstance(results, list):
             return []
         return [r for r in results if isinstance(r, dict)]
 
+    def fetch_recalls(self, vehicle: VehicleSpec) -> list[dict[str, Any]]:
+        return self.loop.run(lambda: self.fetch_recalls_async(vehicle))
+
+    def close(self) -> None:
+        self.loop.run(self.http.aclose)
+
 
 def _to_snake_case(text: str) -> str:
     cleaned = re.sub(r"[^0-9a-zA-Z]+", "_", text).strip("_")